@@ -1,10 +1,10 @@
 import streamlit as st
 import streamlit as st
-import sqlite3
 import pandas as pd
 from datetime import datetime
 import hashlib
 import re
+import metrics
 
 # Function to hash passwords
 def hash_password(password):
@@ -15,30 +15,28 @@ def is_valid_email(email):
     return re.match(pattern, email) is not None
 
 # Function to create a new user
-def create_user(conn, username, password, email):
-    try:
-        c = conn.cursor()
-        hashed_pw = hash_password(password)
-        c.execute("INSERT INTO users (username, password, email) VALUES (?, ?, ?)", 
-                 (username, hashed_pw, email))
-        conn.commit()
-        return c.lastrowid  # Return the user ID
-    except sqlite3.IntegrityError:
-        return None  # User already exists
+@metrics.timed("db")
+def create_user(store, username, password, email):
+    # Returns the user ID, or None if the user already exists
+    return store.create_user(username, hash_password(password), email)
 
 # Function to verify user credentials
-def verify_user(conn, username, password):
-    c = conn.cursor()
-    hashed_pw = hash_password(password)
-    c.execute("SELECT id FROM users WHERE username = ? AND password = ?", (username, hashed_pw))
-    result = c.fetchone()
-    return result[0] if result else None  # Return user ID if found
+@metrics.timed("db")
+def verify_user(store, username, password):
+    return store.find_user(username, hash_password(password))  # Return user ID if found
 
-def auth_page(conn):
+# Set the password of a bulk-imported user from their one-time invite token
+@metrics.timed("db")
+def redeem_invite(store, token, password):
+    # Returns the user ID, or None for an unknown, used or expired invite
+    return store.redeem_invite(hashlib.sha256(token.encode()).hexdigest(), hash_password(password))
+
+@metrics.timed("page", "auth")
+def auth_page(store):
     st.title("Women's Nutrition Tracker 🌿")
     st.write("Track your nutrition needs based on your specific profile")
 
-    tab1, tab2 = st.tabs(["Login", "Signup"])
+    tab1, tab2, tab3 = st.tabs(["Login", "Signup", "Have an invite?"])
 
     # Login Tab
     with tab1:
@@ -48,7 +46,7 @@ def auth_page(conn):
 
         if st.button("Login", key="login_btn"):
             if username and password:
-                user_id = verify_user(conn, username, password)
+                user_id = verify_user(store, username, password)
                 if user_id:
                     st.session_state.logged_in = True
                     st.session_state.user_id = user_id
@@ -79,8 +77,27 @@ def auth_page(conn):
             elif not is_valid_email(new_email):
                 st.error("Please enter a valid email address")
             else:
-                user_id = create_user(conn, new_username, new_password, new_email)
+                user_id = create_user(store, new_username, new_password, new_email)
                 if user_id:
                     st.success("Account created successfully! You can now login.")
                 else:
                     st.error("Username or email already exists")
+
+    # Invite Tab (users imported by bulk_import.py set their password here)
+    with tab3:
+        st.header("Accept Your Invite")
+        invite_token = st.text_input("Invite code", key="invite_token")
+        invite_password = st.text_input("New password", type="password", key="invite_password")
+        invite_confirm = st.text_input("Confirm password", type="password", key="invite_confirm")
+
+        if st.button("Set Password", key="invite_btn"):
+            if not invite_token or not invite_password:
+                st.warning("Please enter your invite code and a new password")
+            elif invite_password != invite_confirm:
+                st.error("Passwords do not match")
+            elif len(invite_password) < 6:
+                st.error("Password must be at least 6 characters long")
+            elif redeem_invite(store, invite_token.strip(), invite_password):
+                st.success("Your password is set! You can now login with your username.")
+            else:
+                st.error("This invite code is invalid, expired or has already been used")
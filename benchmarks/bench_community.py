@@ -0,0 +1,99 @@
+"""
+Feed latency benchmark for the community page.
+
+Fills a scratch SQLite database with synthetic posts (community.py generate)
+and times a feed page, all life stages and one, at the first page and at a
+page deep into the feed reached through the keyset cursor: uncached, cached,
+and the way a page would be read with OFFSET and like/comment counts taken
+with COUNT(*) for every post on every render.
+
+Usage:
+    python benchmarks/bench_community.py [--posts 200000] [--repeats 20] [--depth 2000]
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache_backend import LocalCache  # noqa: E402
+from community import PAGE_SIZE, Community, generate_posts  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+
+def p50_ms(func, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def add_reactions(store, posts, count, seed=0):
+    """Reaction and comment rows for the COUNT(*) comparison."""
+    rng = random.Random(seed)
+    store.executemany("INSERT OR IGNORE INTO community_reactions (post_id, user_key) VALUES (?, ?)",
+                      [(rng.randint(1, posts), f"user:{n}") for n in range(count)])
+    store.executemany("INSERT INTO community_comments (post_id, user_key, author, body) VALUES (?, ?, ?, ?)",
+                      [(rng.randint(1, posts), f"user:{n}", "Member", "Thanks for sharing!") for n in range(count)])
+
+
+def offset_page(store, life_stage, page):
+    """A feed page read with OFFSET, counting likes and comments per post."""
+    where, params = ("WHERE life_stage = ?", [life_stage]) if life_stage else ("", [])
+    posts = store.query(f"""SELECT id, author, life_stage, title, body, created_at FROM community_posts {where}
+                            ORDER BY id DESC LIMIT ? OFFSET ?""", (*params, PAGE_SIZE, page * PAGE_SIZE))
+    for post in posts:
+        post["like_count"] = store.query_one("SELECT COUNT(*) AS n FROM community_reactions WHERE post_id = ?",
+                                             (post["id"],))["n"]
+        post["comment_count"] = store.query_one("SELECT COUNT(*) AS n FROM community_comments WHERE post_id = ?",
+                                                (post["id"],))["n"]
+    return posts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--posts", type=int, default=200_000)
+    parser.add_argument("--reactions", type=int, default=500_000, help="likes and comments, each")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--depth", type=int, default=2000, help="page number for the deep page timing")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStorage(str(Path(tmp) / "community.db"))
+        start = time.perf_counter()
+        generate_posts(store, args.posts)
+        add_reactions(store, args.posts, args.reactions)
+        print(f"loaded {args.posts} posts, {args.reactions} likes and comments in {time.perf_counter() - start:.1f}s")
+
+        uncached = Community(store, LocalCache(max_entries=1))
+        cached = Community(store, LocalCache())
+        print(f"{'feed':>14} {'page':>5} {'uncached':>10} {'cached':>10} {'offset+count':>13}")
+        for life_stage in (None, "Pregnancy"):
+            cursors = {0: None}
+            cursor = None
+            for page in range(1, args.depth):
+                _, cursor = uncached.feed(life_stage, after=cursor)
+                if cursor is None:
+                    break
+                cursors[page] = cursor
+            for page, cursor in cursors.items():
+                if page not in (0, max(cursors)):
+                    continue
+                keyset = p50_ms(lambda: uncached.feed(life_stage, after=cursor), args.repeats)
+                cached.feed(life_stage, after=cursor)
+                hit = p50_ms(lambda: cached.feed(life_stage, after=cursor), args.repeats)
+                offset = p50_ms(lambda: offset_page(store, life_stage, page), args.repeats)
+                print(f"{life_stage or 'all stages':>14} {page + 1:>5} {keyset:7.2f} ms {hit:7.2f} ms "
+                      f"{offset:10.2f} ms")
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
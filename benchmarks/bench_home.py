@@ -0,0 +1,74 @@
+"""
+Time-to-first-paint benchmark for the home.py landing page.
+
+Runs the landing page through Streamlit's AppTest harness and measures how
+long the script takes to produce its first complete render, once cold (first
+run in a fresh process, which fills the st.cache_resource caches) and then
+warm (every later rerun). Exits non-zero when a budget is exceeded.
+
+Usage:
+    python benchmarks/bench_home.py [--runs 20] [--cold-budget-ms 1500] [--warm-budget-ms 150]
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+# home.py imports the app's modules (community, auth, ...) from the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+HOME_SCRIPT = str(Path(__file__).resolve().parent.parent / "home.py")
+
+# First-paint budgets for the landing page, in milliseconds
+COLD_BUDGET_MS = 1500
+WARM_BUDGET_MS = 150
+
+
+def time_first_paint(timeout=30):
+    """Render the landing page once and return the elapsed time in ms."""
+    at = AppTest.from_file(HOME_SCRIPT, default_timeout=timeout)
+    start = time.perf_counter()
+    at.run()
+    elapsed = (time.perf_counter() - start) * 1000
+    if at.exception:
+        raise RuntimeError(f"home.py raised during render: {at.exception[0].value}")
+    return elapsed
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="number of warm renders to sample")
+    parser.add_argument("--cold-budget-ms", type=float, default=COLD_BUDGET_MS)
+    parser.add_argument("--warm-budget-ms", type=float, default=WARM_BUDGET_MS,
+                        help="budget for the p95 of warm renders")
+    args = parser.parse_args(argv)
+
+    cold = time_first_paint()
+    warm = [time_first_paint() for _ in range(args.runs)]
+    warm_p50 = statistics.median(warm)
+    warm_p95 = percentile(warm, 95)
+
+    print(f"cold first paint: {cold:8.1f} ms (budget {args.cold_budget_ms:.0f} ms)")
+    print(f"warm first paint: p50 {warm_p50:8.1f} ms, p95 {warm_p95:8.1f} ms (budget {args.warm_budget_ms:.0f} ms)")
+
+    failures = []
+    if cold > args.cold_budget_ms:
+        failures.append(f"cold first paint {cold:.1f} ms exceeds {args.cold_budget_ms:.0f} ms")
+    if warm_p95 > args.warm_budget_ms:
+        failures.append(f"warm p95 {warm_p95:.1f} ms exceeds {args.warm_budget_ms:.0f} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
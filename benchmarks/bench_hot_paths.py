@@ -0,0 +1,268 @@
+"""
+Micro-benchmarks for the calculation and data-access hot paths.
+
+Pure calculations (calorie, macro, water and BMI math, rule-based tips and
+prompt building) are timed once. Data-access functions (get_profile,
+save_profile, create_user, verify_user) are timed against synthetic SQLite
+databases of each requested size, which are generated on first use and kept
+in the data directory for later runs.
+
+Every run is appended to a JSON history keyed by git commit, and the medians
+are compared with the most recent run from a different commit.
+
+Usage:
+    python benchmarks/bench_hot_paths.py [--sizes 1k,100k,1m] [-k get_profile]
+                                         [--compare-to COMMIT] [--no-save]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from auth import create_user, hash_password, verify_user
+from dashboard import generate_nutrition_prompt
+from dashboard1 import calculate_bmi, get_personalized_tips
+from database import init_db
+from dri import get_reference_intakes
+from storage import SQLiteStorage
+from profile_model import Profile, calculate_calories, calculate_macros, water_intake
+from profile_page import get_profile, save_profile
+
+HISTORY_PATH = REPO_ROOT / ".benchmarks" / "history.json"
+DATA_DIR = Path(tempfile.gettempdir()) / "nutriomen-bench"
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+DB_CASES = ("get_profile", "save_profile", "create_user", "verify_user")
+
+SAMPLE_PROFILE = {
+    "user_id": 1, "full_name": "Bench User", "age": 29, "education": "Master's",
+    "height": 165.0, "weight": 61.5, "menstruation_date": "2025-01-10",
+    "is_regular_cycle": 0, "diseases": "PCOS", "food_allergies": "Peanuts",
+    "is_pregnant": 1, "pregnancy_week": 20,
+}
+
+
+def synthetic_profile(rng, user_id):
+    pregnant = rng.random() < 0.1
+    return (
+        user_id, f"User {user_id}", rng.randint(18, 80), rng.choice(["High School", "Bachelor's", "Master's", "PhD", "Other"]),
+        round(rng.uniform(150, 185), 1), round(rng.uniform(45, 110), 1),
+        (date(2025, 1, 1) + timedelta(days=rng.randint(0, 60))).isoformat(), int(rng.random() < 0.8),
+        rng.choice(["", "", "", "PCOS", "Anemia", "Hypothyroidism"]), rng.choice(["", "", "Lactose", "Gluten", "Peanuts"]),
+        int(pregnant), rng.randint(1, 42) if pregnant else 0,
+    )
+
+
+def build_database(path, users, batch=50_000):
+    """Create a database with `users` users, each with a profile."""
+    conn = init_db(str(path))
+    rng = random.Random(users)
+    with conn:
+        for start in range(1, users + 1, batch):
+            ids = range(start, min(start + batch, users + 1))
+            conn.executemany(
+                "INSERT INTO users (id, username, password, email) VALUES (?, ?, ?, ?)",
+                ((i, f"user{i}", hash_password(f"password{i}"), f"user{i}@example.com") for i in ids))
+            conn.executemany(
+                """INSERT INTO profiles (
+                    user_id, full_name, age, education, height, weight,
+                    menstruation_date, is_regular_cycle, diseases,
+                    food_allergies, is_pregnant, pregnancy_week
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (synthetic_profile(rng, i) for i in ids))
+    return conn
+
+
+def open_database(label):
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    path = DATA_DIR / f"users_{label}.db"
+    if path.exists():
+        return SQLiteStorage(str(path))
+    print(f"building {label} user database at {path} ...", flush=True)
+    start = time.perf_counter()
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.unlink(missing_ok=True)
+    build_database(tmp_path, SIZES[label]).close()
+    os.replace(tmp_path, path)
+    print(f"  built in {time.perf_counter() - start:.1f}s", flush=True)
+    return SQLiteStorage(str(path))
+
+
+def measure(func, rounds=7, min_time=0.2):
+    """Time `func` pytest-benchmark style: calibrate a loop count, then sample several rounds."""
+    timer = timeit.Timer(func)
+    loops, _ = timer.autorange()
+    loops = max(1, int(loops * min_time / 0.2))
+    per_call = [t / loops for t in timer.repeat(repeat=rounds, number=loops)]
+    return {
+        "min": min(per_call),
+        "median": statistics.median(per_call),
+        "mean": statistics.mean(per_call),
+        "stddev": statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+        "ops": 1 / statistics.median(per_call),
+        "loops": loops,
+        "rounds": rounds,
+    }
+
+
+def pure_cases():
+    bmi, _ = calculate_bmi(SAMPLE_PROFILE["weight"], SAMPLE_PROFILE["height"])
+    intakes = get_reference_intakes()
+    ages, weeks = [18 + i % 60 for i in range(10_000)], [i % 43 if i % 10 == 0 else 0 for i in range(10_000)]
+    return {
+        "calculate_calories": lambda: calculate_calories(29, 22.6),
+        "calculate_macros": lambda: calculate_macros(2000),
+        "water_intake": lambda: water_intake(61.5),
+        "calculate_bmi": lambda: calculate_bmi(61.5, 165.0),
+        "get_personalized_tips": lambda: get_personalized_tips(SAMPLE_PROFILE, bmi),
+        "generate_nutrition_prompt": lambda: generate_nutrition_prompt(Profile.from_dict(SAMPLE_PROFILE)),
+        "reference_intakes": lambda: intakes.targets(29, 20),
+        "reference_intakes_batch_10k": lambda: intakes.batch(ages, weeks),
+    }
+
+
+def db_cases(store, users, run_tag):
+    rng = random.Random(0)
+    created = []
+
+    def bench_get_profile():
+        get_profile(store, rng.randint(1, users))
+
+    def bench_save_profile():
+        profile = dict(SAMPLE_PROFILE, user_id=rng.randint(1, users))
+        save_profile(store, profile)
+
+    def bench_create_user():
+        name = f"bench_{run_tag}_{len(created)}"
+        created.append(name)
+        create_user(store, name, "password", f"{name}@example.com")
+
+    def bench_verify_user():
+        n = rng.randint(1, users)
+        verify_user(store, f"user{n}", f"password{n}")
+
+    def cleanup():
+        with store.connection() as conn:
+            conn.executemany("DELETE FROM users WHERE username = ?", ((name,) for name in created))
+
+    cases = dict(zip(DB_CASES, (bench_get_profile, bench_save_profile, bench_create_user, bench_verify_user)))
+    return cases, cleanup
+
+
+def git_commit():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return sha, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def load_history(path):
+    if path.exists():
+        with open(path) as f:
+            return json.load(f)
+    return []
+
+
+def baseline_run(history, commit, compare_to=None):
+    for run in reversed(history):
+        if compare_to is not None:
+            if run["commit"].startswith(compare_to):
+                return run
+        elif run["commit"] != commit:
+            return run
+    return None
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark calculation and data-access hot paths.")
+    parser.add_argument("--sizes", default="1k,100k,1m", help=f"comma-separated database sizes from {list(SIZES)}")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--history", type=Path, default=HISTORY_PATH)
+    parser.add_argument("--compare-to", default=None, help="commit to compare with (default: latest other commit)")
+    parser.add_argument("--no-save", action="store_true", help="don't append this run to the history")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes {unknown}, choose from {list(SIZES)}")
+
+    results = {}
+    for name, func in pure_cases().items():
+        if args.filter in name:
+            results[name] = measure(func, rounds=args.rounds)
+
+    run_tag = datetime.now().strftime("%Y%m%d%H%M%S")
+    for label in sizes:
+        store = None
+        cleanup = None
+        try:
+            for name in DB_CASES:
+                if args.filter not in name:
+                    continue
+                if store is None:
+                    store = open_database(label)
+                    cases, cleanup = db_cases(store, SIZES[label], run_tag)
+                results[f"{name}[{label}]"] = measure(cases[name], rounds=args.rounds)
+        finally:
+            if cleanup is not None:
+                cleanup()
+            if store is not None:
+                store.close()
+
+    commit, dirty = git_commit()
+    history = load_history(args.history)
+    baseline = baseline_run(history, commit, args.compare_to)
+
+    header = f"{'benchmark':<34}{'median':>12}{'min':>12}{'stddev':>12}{'ops/s':>14}"
+    if baseline:
+        header += f"{'vs ' + baseline['commit']:>16}"
+    print(header)
+    for name, stats in results.items():
+        line = (f"{name:<34}{format_time(stats['median']):>12}{format_time(stats['min']):>12}"
+                f"{format_time(stats['stddev']):>12}{stats['ops']:>14,.0f}")
+        if baseline and name in baseline["results"]:
+            change = stats["median"] / baseline["results"][name]["median"] - 1
+            line += f"{change:>+15.1%} "
+        print(line)
+
+    if not args.no_save:
+        history.append({
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "results": results,
+        })
+        args.history.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.history, "w") as f:
+            json.dump(history, f, indent=1)
+        print(f"saved to {args.history}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Image loading benchmark for a content page: serial fetches versus the prefetcher.
+
+Starts a local stand-in for the Unsplash API and its image CDN, each request
+delayed by --latency-ms, serving full-size (2400x1600) JPEGs. Then loads
+--images images the way a page would have (fetch_unsplash_image and the
+download, one after the other on the script thread) and with image_prefetch
+(concurrent fetches, thumbnails at --width), cold and then from the cache.
+Reports wall time and the bytes a page would send to the browser.
+
+Usage:
+    python benchmarks/bench_image_prefetch.py [--images 12] [--latency-ms 80] [--width 640]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+
+def full_size_jpeg():
+    from PIL import Image
+    with Image.open(REPO_ROOT / "assets" / "hero.jpg") as image:
+        image = image.convert("RGB").resize((2400, 1600), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def start_server(latency, image):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            url = urlparse(self.path)
+            if url.path == "/photos/random":
+                query = parse_qs(url.query)["query"][0]
+                host = f"http://127.0.0.1:{self.server.server_port}"
+                body, kind = json.dumps({"urls": {"regular": f"{host}/img/{query}.jpg"}}).encode(), "application/json"
+            else:
+                body, kind = image, "image/jpeg"
+            self.send_response(200)
+            self.send_header("Content-Type", kind)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=12)
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="delay per API and CDN request")
+    parser.add_argument("--width", type=int, default=640, help="thumbnail width")
+    args = parser.parse_args(argv)
+
+    server = start_server(args.latency_ms / 1000, full_size_jpeg())
+    os.environ["NUTRIOMEN_UNSPLASH_URL"] = f"http://127.0.0.1:{server.server_port}"
+
+    import requests
+    from cache_backend import LocalCache
+    from image_api import fetch_unsplash_image
+    from image_prefetch import FORMAT, ImagePrefetcher
+
+    queries = [f"healthy food {i}" for i in range(args.images)]
+
+    start = time.perf_counter()
+    shipped = 0
+    for query in queries:
+        url, _ = fetch_unsplash_image(query)
+        shipped += len(requests.get(url, timeout=10).content)
+    serial = time.perf_counter() - start
+    print(f"{'serial, full size':>24}: {serial * 1000:8.0f} ms  {shipped / 1024:8.0f} KiB to the browser")
+
+    prefetcher = ImagePrefetcher(cache=LocalCache())
+    for label in ("prefetch, cold", "prefetch, cached"):
+        start = time.perf_counter()
+        images = prefetcher.images(queries, args.width)
+        elapsed = time.perf_counter() - start
+        shipped = sum(len(blob) for blob in images.values() if blob)
+        missing = sum(blob is None for blob in images.values())
+        print(f"{label:>24}: {elapsed * 1000:8.0f} ms  {shipped / 1024:8.0f} KiB to the browser"
+              f"  ({FORMAT} {args.width}px{f', {missing} missing' if missing else ''})")
+    prefetcher.close()
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""
+Rerun-time benchmark for the nutrition page's widgets.
+
+Serves the app with `streamlit run` and drives it over the websocket the
+browser uses, for a user with a profile (scratch SQLite database, stub LLM).
+Each interaction (the mood slider, the diet selectbox, the activity level
+selectbox and a chat message) is sent several times the way the browser
+sends it, and timed from the rerun request to the server's "script finished"
+message, Streamlit's own rerun cost included.
+
+"before" is the page as it was before it was split into fragments (the tree
+at --baseline, exported with git archive), where every interaction reruns
+the whole page. "after" is the current page, where the browser asks for a
+rerun of just the fragment the widget belongs to. Rendering in the browser
+and the network are in neither number.
+
+Usage:
+    python benchmarks/bench_nutrition_rerun.py [--repeats 10] [--baseline REV]
+"""
+import argparse
+import asyncio
+import io
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.websocket import websocket_connect
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+PROFILE = {
+    "full_name": "Bench User", "age": 29, "education": "Bachelor's", "height": 165.0, "weight": 61.5,
+    "menstruation_date": "2026-01-01", "is_regular_cycle": True, "diseases": "", "food_allergies": "",
+    "is_pregnant": False, "pregnancy_week": 0,
+}
+
+# Logs the bench user in on the session's first run, then runs the app as `streamlit run` would
+LAUNCHER = """
+import runpy
+import sys
+
+sys.path.insert(0, {tree!r})
+import streamlit as st
+
+if "user_id" not in st.session_state:
+    from storage import get_storage
+    store = get_storage()
+    user_id = store.find_user("bench", "x") or store.create_user("bench", "x", "bench@example.com")
+    store.save_profile(dict({profile!r}, user_id=user_id))
+    st.session_state.update(logged_in=True, user_id=user_id, username="bench", page="nutrition")
+runpy.run_path({app!r}, run_name="__main__")
+"""
+
+
+def interactions():
+    """(name, (element type, label), widget state setter(state, i)) for each widget on the page."""
+    moods = ["Happy", "Neutral", "Stressed", "Tired"]
+    diets = ["Balanced", "Vegan", "Keto", "Low-Carb", "High-Protein"]
+    levels = ["Sedentary", "Lightly Active", "Moderately Active", "Very Active"]
+    return [
+        ("mood slider", ("slider", "How do you feel today?"),
+         lambda state, i: state.double_array_value.data.extend([i % len(moods)])),
+        ("diet selectbox", ("selectbox", "Diet Preference"),
+         lambda state, i: setattr(state, "int_value", i % len(diets))),
+        ("activity level", ("selectbox", "Activity Level"),
+         lambda state, i: setattr(state, "int_value", i % len(levels))),
+        ("chat message", ("chat_input", None),
+         lambda state, i: setattr(state.string_trigger_value, "data", f"How much iron do I need? ({i})")),
+    ]
+
+
+def baseline_revision() -> str:
+    """The commit before nutrition_advise.py first used fragments (partial_rerun)."""
+    commits = subprocess.run(["git", "-C", str(REPO_ROOT), "log", "--reverse", "--format=%H", "-S", "partial_rerun",
+                              "--", "nutrition_advise.py"], check=True, capture_output=True, text=True).stdout.split()
+    if not commits:
+        raise SystemExit("no commit introduces partial_rerun in nutrition_advise.py; pass --baseline")
+    return f"{commits[0]}^"
+
+
+def export_tree(revision: str, dest: Path) -> Path:
+    archive = subprocess.run(["git", "-C", str(REPO_ROOT), "archive", "--format=tar", revision],
+                             check=True, capture_output=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(dest)
+    return dest
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class AppSession:
+    """A `streamlit run` server for one tree, and one browser session on it."""
+
+    def __init__(self, tree: Path, workdir: Path):
+        workdir.mkdir(parents=True, exist_ok=True)
+        launcher = workdir / "launch.py"
+        launcher.write_text(LAUNCHER.format(tree=str(tree), profile=PROFILE, app=str(tree / "profile_women.py")))
+        self.port = free_port()
+        env = dict(os.environ, NUTRIOMEN_LLM_BACKEND="stub", NUTRIOMEN_STUB_LATENCY="fixed:50",
+                   NUTRIOMEN_LLM_LOG=str(workdir / "llm_calls.jsonl"))
+        self.server = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", str(launcher), "--server.headless=true",
+             f"--server.port={self.port}", "--server.fileWatcherType=none", "--browser.gatherUsageStats=false"],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.ws = None
+        # (element type, label) -> (widget id, fragment id) from the last full run
+        self.widgets = {}
+        # Widget values the session has set; the browser sends them all with every rerun
+        self.states = {}
+
+    async def connect(self, timeout: float = 30) -> None:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.ws = await websocket_connect(f"ws://127.0.0.1:{self.port}/_stcore/stream")
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.2)
+
+    async def rerun(self, trigger=None, fragment_id: str = "") -> float:
+        """Send a rerun, as the browser does after a widget change; returns the seconds until it finished."""
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.fragment_id = fragment_id
+        states = list(self.states.values()) + ([trigger] if trigger is not None else [])
+        msg.rerun_script.widget_states.widgets.extend(states)
+        start = time.perf_counter()
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.ws.read_message())
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                element_type = element.WhichOneof("type")
+                widget = getattr(element, element_type)
+                if getattr(widget, "id", ""):
+                    label = getattr(widget, "label", None) if element_type != "chat_input" else None
+                    self.widgets[(element_type, label)] = (widget.id, forward.delta.fragment_id)
+            elif kind == "script_finished":
+                return time.perf_counter() - start
+
+    async def interact(self, widget, set_value, i: int, fragment: bool) -> float:
+        widget_id, fragment_id = self.widgets[widget]
+        state = WidgetState(id=widget_id)
+        set_value(state, i)
+        if state.HasField("string_trigger_value"):
+            # Triggers (a sent chat message) only last one run
+            return await self.rerun(state, fragment_id if fragment else "")
+        self.states[widget_id] = state
+        return await self.rerun(fragment_id=fragment_id if fragment else "")
+
+    def close(self) -> None:
+        if self.ws is not None:
+            self.ws.close()
+        self.server.terminate()
+        self.server.wait()
+
+
+async def measure(tree: Path, workdir: Path, repeats: int, fragment: bool):
+    """Median rerun time per interaction, in ms."""
+    session = AppSession(tree, workdir)
+    try:
+        await session.connect()
+        await session.rerun()
+        await session.rerun()  # warm: caches filled, modules imported
+        results = {}
+        for name, widget, set_value in interactions():
+            if widget not in session.widgets:
+                raise RuntimeError(f"no {widget[0]} {widget[1] or ''!r} on the page")
+            times = [await session.interact(widget, set_value, i + 1, fragment) for i in range(repeats)]
+            results[name] = statistics.median(times) * 1000
+        return results
+    finally:
+        session.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=10, help="reruns per interaction")
+    parser.add_argument("--baseline", help="git revision of the unsplit page (default: the commit before "
+                                           "nutrition_advise.py used fragments)")
+    args = parser.parse_args(argv)
+
+    baseline = args.baseline or baseline_revision()
+    with tempfile.TemporaryDirectory(prefix="nutriomen-rerun-") as tmp:
+        tmp = Path(tmp)
+        old_tree = export_tree(baseline, tmp / "baseline")
+        before = asyncio.run(measure(old_tree, tmp / "before", args.repeats, fragment=False))
+        after = asyncio.run(measure(REPO_ROOT, tmp / "after", args.repeats, fragment=True))
+
+    print(f"before: {baseline}, full page reruns; after: this tree, fragment reruns (p50 of {args.repeats})")
+    print(f"{'interaction':>16} {'before':>10} {'after':>10} {'saved':>7}")
+    for name in before:
+        print(f"{name:>16} {before[name]:7.1f} ms {after[name]:7.1f} ms {1 - after[name] / before[name]:6.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
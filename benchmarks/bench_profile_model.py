@@ -0,0 +1,111 @@
+"""
+Memory and render-path benchmark for the Profile record.
+
+Compares profiles as dicts (built by zipping cursor.description, as storage
+did before) with Profile records built by the sqlite3 row_factory:
+
+- memory per profile held in memory, measured with tracemalloc;
+- size of the encoded cache entry (cache_backend.encode);
+- reading one profile from a scratch SQLite database;
+- the derived metrics one nutrition page render needs (BMI three times,
+  category, days since period, calorie/macro/water targets), recomputed from
+  the dict each time versus read from the record's memoized attributes.
+
+Usage:
+    python benchmarks/bench_profile_model.py [--profiles 20000]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache_backend import encode  # noqa: E402
+from profile_model import COLUMNS, Profile, calculate_calories, calculate_macros, water_intake  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+
+def synthetic_row(rng, user_id):
+    return (user_id, user_id, f"User {user_id}", rng.randint(18, 80), "Bachelor's",
+            round(rng.uniform(150, 185), 1), round(rng.uniform(45, 110), 1),
+            (date(2026, 1, 1) + timedelta(days=rng.randint(0, 60))).isoformat(), 1, "", "Peanuts", 0, 0,
+            "2026-01-01 00:00:00")
+
+
+def render_from_dict(profile):
+    """What one render computed before: BMI in three places, each target from scratch."""
+    bmi = profile['weight'] / ((profile['height'] / 100) ** 2)
+    category = "Underweight" if bmi < 18.5 else "Normal weight" if bmi < 25 else "Overweight" if bmi < 30 else "Obese"
+    days = (datetime.now() - datetime.strptime(profile['menstruation_date'], '%Y-%m-%d')).days
+    calories = calculate_calories(profile['age'], bmi)
+    macros, water = calculate_macros(calories), water_intake(profile['weight'])
+    for _ in range(2):
+        bmi = profile['weight'] / ((profile['height'] / 100) ** 2)
+    days = (datetime.now() - datetime.strptime(profile['menstruation_date'], '%Y-%m-%d')).days
+    return category, days, macros, water
+
+
+def render_from_record(profile):
+    for _ in range(3):
+        profile.bmi
+    profile.days_since_period
+    return profile.bmi_category, profile.days_since_period, profile.macros, profile.water
+
+
+def held_bytes(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return after - before
+
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profiles", type=int, default=20_000)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    rows = [synthetic_row(rng, i + 1) for i in range(args.profiles)]
+
+    dict_bytes = held_bytes(lambda: [dict(zip(COLUMNS, row)) for row in rows]) / len(rows)
+    record_bytes = held_bytes(lambda: [Profile(*row) for row in rows]) / len(rows)
+    print(f"{'':>22} {'dict':>10} {'Profile':>10}")
+    print(f"{'memory / profile':>22} {dict_bytes:8.0f} B {record_bytes:8.0f} B")
+
+    as_dict, as_record = dict(zip(COLUMNS, rows[0])), Profile(*rows[0])
+    print(f"{'cache entry':>22} {len(encode(as_dict)):8d} B {len(encode(as_record)):8d} B")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStorage(str(Path(tmp) / "profiles.db"))
+        store.executemany("INSERT INTO users (id, username, password, email) VALUES (?, ?, 'x', ?)",
+                          [(i, f"u{i}", f"u{i}@example.com") for i in range(1, 1001)])
+        store.executemany(f"INSERT INTO profiles ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                          rows[:1000])
+        ids = [rng.randint(1, 1000) for _ in range(1000)]
+        it = iter(ids * 1000)
+        old = per_call_us(lambda: store.query_one("SELECT * FROM profiles WHERE user_id = ?", (next(it),)), 1000)
+        new = per_call_us(lambda: store.get_profile(next(it)), 1000)
+        print(f"{'get_profile':>22} {old:7.1f} us {new:7.1f} us")
+        store.close()
+
+    # A fresh record per render, as each render decodes its own copy from the cache
+    old = per_call_us(lambda: render_from_dict(as_dict), 20_000)
+    new = per_call_us(lambda: render_from_record(Profile(*rows[0])), 20_000)
+    print(f"{'derived metrics/render':>22} {old:7.1f} us {new:7.1f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
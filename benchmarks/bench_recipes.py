@@ -0,0 +1,81 @@
+"""
+Search latency benchmark for the recipe catalog.
+
+Fills a scratch SQLite database with synthetic recipes (recipes.py generate)
+and times the first page of typical searches (diet, tags, ingredients and
+nutrient ranges such as protein >= 25 g and iron >= 5 mg), and a page deep
+into the results reached through the keyset cursor.
+
+Usage:
+    python benchmarks/bench_recipes.py [--recipes 100000] [--repeats 20]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from recipes import RecipeStore, synthetic_recipes  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+SEARCHES = {
+    "newest": {},
+    "diet": {"diets": ["Vegan"]},
+    "two diets": {"diets": ["Vegan", "Vegetarian"]},
+    "tag + diet": {"tags": ["breakfast"], "diets": ["High-Protein"]},
+    "2 ingredients": {"ingredients": ["spinach", "lemon"]},
+    "protein>=25, iron>=5": {"min_nutrients": {"protein_g": 25, "iron_mg": 5}},
+    "tag + protein + iron": {"tags": ["dinner"], "min_nutrients": {"protein_g": 25, "iron_mg": 5}},
+    "ingredient + iron, <500 kcal": {"ingredients": ["spinach"], "min_nutrients": {"iron_mg": 5},
+                                     "max_nutrients": {"calories": 500}},
+}
+
+
+def p50_ms(func, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--depth", type=int, default=50, help="page number for the deep page timing")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = RecipeStore(SQLiteStorage(str(Path(tmp) / "recipes.db")))
+        start = time.perf_counter()
+        batch = []
+        for recipe in synthetic_recipes(args.recipes):
+            batch.append(recipe)
+            if len(batch) == 5000:
+                catalog.add_recipes(batch)
+                batch = []
+        if batch:
+            catalog.add_recipes(batch)
+        print(f"loaded {catalog.count()} recipes in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'search':>30} {'first page':>11} {f'page {args.depth}':>10} {'hits/page':>10}")
+        for name, search in SEARCHES.items():
+            rows, cursor = catalog.search(**search)
+            first = p50_ms(lambda: catalog.search(**search), args.repeats)
+            for _ in range(args.depth - 1):
+                if cursor is None:
+                    break
+                _, cursor = catalog.search(after=cursor, **search)
+            deep = f"{p50_ms(lambda: catalog.search(after=cursor, **search), args.repeats):7.2f} ms" if cursor else "-"
+            print(f"{name:>30} {first:8.2f} ms {deep:>10} {len(rows):>10}")
+        catalog.store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Delivery benchmark for the reminder service.
+
+Fills a scratch SQLite database with water and meal schedules for --users
+users (reminders.py generate), then replays a day on a simulated clock in
+--tick-seconds steps, delivering everything due at each tick the way the
+worker thread does. Reports startup (loading the heap), delivery throughput,
+the slowest tick, and the cost of a tick with nothing due next to polling
+the schedules table for due rows.
+
+Usage:
+    python benchmarks/bench_reminders.py [--users 100000] [--tick-seconds 60]
+"""
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from reminders import ReminderService, generate_schedules  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--tick-seconds", type=int, default=60)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStorage(str(Path(tmp) / "reminders.db"))
+        start_of_day = (int(time.time()) // 86400 + 1) * 86400
+        clock = [float(start_of_day)]
+        service = ReminderService(store, clock=lambda: clock[0])
+        generate_schedules(service, args.users)
+
+        restarted = ReminderService(store, clock=lambda: clock[0])
+        start = time.perf_counter()
+        schedules = restarted.load()
+        load_s = time.perf_counter() - start
+        tracemalloc.start()
+        measured = ReminderService(store)
+        measured.load()
+        heap_mb = tracemalloc.get_traced_memory()[0] / 2**20
+        tracemalloc.stop()
+        del measured
+        print(f"{schedules} schedules for {args.users} users loaded in {load_s * 1000:.0f} ms ({heap_mb:.0f} MiB)")
+
+        delivered, busiest, slowest, idle = 0, 0, 0.0, []
+        start = time.perf_counter()
+        while clock[0] < start_of_day + 86400:
+            clock[0] += args.tick_seconds
+            tick = time.perf_counter()
+            count = 0
+            while True:
+                batch = restarted.run_due()
+                count += batch
+                if batch < restarted.batch_size:
+                    break
+            elapsed = time.perf_counter() - tick
+            if count:
+                delivered += count
+                busiest = max(busiest, count)
+                slowest = max(slowest, elapsed)
+            else:
+                idle.append(elapsed)
+        day_s = time.perf_counter() - start
+        print(f"one day: {delivered} reminders delivered in {day_s:.1f}s of work "
+              f"({delivered / day_s:,.0f}/s), busiest tick {busiest} in {slowest * 1000:.0f} ms")
+
+        idle_us = sorted(idle)[len(idle) // 2] * 1e6 if idle else 0.0
+        start = time.perf_counter()
+        for _ in range(20):
+            store.query("SELECT user_id, kind FROM reminder_schedules WHERE next_fire_at <= ?", (clock[0] - 3600,))
+        poll_ms = (time.perf_counter() - start) / 20 * 1000
+        print(f"tick with nothing due: {idle_us:.1f} us (heap) vs {poll_ms:.1f} ms (polling the table)")
+        print(f"inbox rows: {store.query_one('SELECT COUNT(*) AS n FROM reminder_inbox')['n']}")
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
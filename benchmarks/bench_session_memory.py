@@ -0,0 +1,93 @@
+"""
+Per-session memory benchmark for chat state.
+
+Simulates many sessions holding a long conversation and measures, with
+tracemalloc, how much memory each session keeps: once with the old layout
+(a growing list of {"role", "content"} dicts per session) and once with
+session_store's capped ring buffer, which spills older turns and long answers
+to a scratch SQLite database. Exits non-zero when the ring buffer's
+per-session memory exceeds the budget.
+
+Usage:
+    python benchmarks/bench_session_memory.py [--sessions 500] [--turns 200] [--budget-kb 64]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from session_store import SessionStore  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+BUDGET_KB = 64
+
+
+def conversation(rng, turns):
+    """Alternating questions and answers; about one answer in five is a long markdown reply."""
+    for i in range(turns):
+        if i % 2 == 0:
+            yield "user", f"Question {i}: what should I eat for more iron and protein this week?"
+        elif rng.random() < 0.2:
+            yield "assistant", "## Plan\n" + "- lentils, spinach and citrus for iron absorption\n" * 60
+        else:
+            yield "assistant", f"Answer {i}: pair iron-rich foods with vitamin C and keep protein at each meal."
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = build()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held, after - before, peak - before
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=200, help="turns per session")
+    parser.add_argument("--budget-kb", type=float, default=BUDGET_KB, help="ring buffer memory budget per session")
+    args = parser.parse_args(argv)
+
+    def dict_lists():
+        rng = random.Random(0)
+        sessions = {}
+        for s in range(args.sessions):
+            sessions[f"s{s}"] = [{"role": role, "content": text} for role, text in conversation(rng, args.turns)]
+        return sessions
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStorage(str(Path(tmp) / "sessions.db"))
+        user_id = store.create_user("bench", "x", "bench@example.com")
+
+        def ring_buffers():
+            rng = random.Random(0)
+            registry = SessionStore(store)
+            for s in range(args.sessions):
+                history = registry.history(f"s{s}", user_id)
+                for role, text in conversation(rng, args.turns):
+                    history.append(role, text)
+            return registry
+
+        results = {}
+        for name, build in (("list of dicts", dict_lists), ("ring buffer", ring_buffers)):
+            held, current, peak = measure(build)
+            results[name] = current / args.sessions
+            print(f"{name:>14}: {current / args.sessions / 1024:8.1f} KiB/session  "
+                  f"(total {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB)")
+            del held
+
+    ratio = results["list of dicts"] / max(1, results["ring buffer"])
+    print(f"reduction: {ratio:.1f}x")
+    if results["ring buffer"] / 1024 > args.budget_kb:
+        print(f"FAIL: ring buffer uses more than {args.budget_kb} KiB per session", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Concurrent-user load test for the profile_women.py app.
+
+Each simulated user drives its own AppTest session through the app: sign up,
+log in, save a profile, open the dashboard and ask for advice, open the
+nutrition page and send a chat message. Users run concurrently in a process
+pool (AppTest sessions are not safe to drive from several threads of one
+process) against one shared SQLite database in a scratch directory, with the
+LLM pointed at the local stub backend (see llm_backends.StubBackend) so the
+run measures the app's own overhead and resilience without a live API.
+
+Reports throughput, error rate and p50/p95/p99 latency per step, and exits
+non-zero when a configured budget is exceeded.
+
+Usage:
+    python benchmarks/load_test.py --users 50 --concurrency 10 --llm-latency lognormal:300:0.5 \\
+        --budget login=250 --budget chat=1500 --max-error-rate 0.01
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from streamlit.testing.v1 import AppTest
+
+from metrics import Histogram
+
+APP_SCRIPT = str(REPO_ROOT / "profile_women.py")
+STEPS = ["open", "signup", "login", "profile", "dashboard", "nutrition", "chat"]
+
+# Steps that end in st.experimental_rerun. AppTest keeps widgets from the
+# interrupted run in its element tree, so the session is carried over to a
+# fresh AppTest (outside the timed step) before the next interaction.
+RERUN_STEPS = {"login", "profile"}
+SESSION_KEYS = ("logged_in", "user_id", "username", "page")
+
+class StepFailed(Exception):
+    pass
+
+
+def button(at, label):
+    for candidate in at.button:
+        if candidate.label == label:
+            return candidate
+    raise StepFailed(f"no button labelled {label!r}")
+
+
+def check(at, step):
+    if at.exception:
+        raise StepFailed(f"{step}: {at.exception[0].message}")
+    if at.error:
+        raise StepFailed(f"{step}: {at.error[0].value}")
+
+
+class SimulatedUser:
+    """One user's session, timing every step of the journey."""
+
+    def __init__(self, index, run_id, timeout):
+        self.username = f"load_{run_id}_{index}"
+        self.timeout = timeout
+        self.at = None
+        # (step, seconds, error message or None) for every step attempted
+        self.samples = []
+
+    def step(self, name, action):
+        start = time.perf_counter()
+        try:
+            action()
+            check(self.at, name)
+        except Exception as e:
+            self.samples.append((name, time.perf_counter() - start, f"{type(e).__name__}: {e}"))
+            return False
+        self.samples.append((name, time.perf_counter() - start, None))
+        return True
+
+    def open(self, session=None):
+        self.at = AppTest.from_file(APP_SCRIPT, default_timeout=self.timeout)
+        for key, value in (session or {}).items():
+            self.at.session_state[key] = value
+        self.at.run()
+
+    def resync(self):
+        self.open({key: self.at.session_state[key] for key in SESSION_KEYS})
+
+    def signup(self):
+        at = self.at
+        at.text_input(key="signup_username").input(self.username)
+        at.text_input(key="signup_email").input(f"{self.username}@example.com")
+        at.text_input(key="signup_password").input("load-test-pw")
+        at.text_input(key="confirm_password").input("load-test-pw")
+        at.button(key="signup_btn").click().run()
+
+    def login(self):
+        at = self.at
+        at.text_input(key="login_username").input(self.username)
+        at.text_input(key="login_password").input("load-test-pw")
+        at.button(key="login_btn").click().run()
+        if not at.session_state.logged_in:
+            raise StepFailed("login: not logged in")
+
+    def profile(self):
+        at = self.at
+        button(at, "My Profile").click().run()
+        at.text_input[0].input(f"Load User {self.username}")
+        button(at, "Save Profile").click().run()
+        if at.session_state.page != "dashboard":
+            raise StepFailed("profile: not saved")
+
+    def dashboard(self):
+        button(self.at, "Get Nutrition Advice").click().run()
+
+    def nutrition(self):
+        button(self.at, "Nutrition Advice").click().run()
+
+    def chat(self):
+        self.at.chat_input[0].set_value("What should I eat during my period?").run()
+
+    def run(self):
+        for name in STEPS:
+            if not self.step(name, getattr(self, name)):
+                # Later steps depend on earlier ones, so abandon the journey
+                return False
+            if name in RERUN_STEPS:
+                self.resync()
+        return True
+
+
+def init_worker(workdir, stub_env):
+    """Point a worker process at the shared scratch database and the stub LLM."""
+    os.chdir(workdir)
+    os.environ.update(stub_env)
+    os.environ["NUTRIOMEN_LLM_LOG"] = os.path.join(workdir, f"llm_calls.{os.getpid()}.jsonl")
+    # Import the page modules up front so the first journey doesn't pay for it
+    import auth, dashboard, nutrition_advise, profile_page  # noqa: F401
+
+
+def run_user(index, run_id, timeout):
+    user = SimulatedUser(index, run_id, timeout)
+    completed = user.run()
+    return completed, user.samples
+
+
+class Results:
+    def __init__(self):
+        self.histograms = {name: Histogram() for name in STEPS}
+        self.errors = {name: 0 for name in STEPS}
+        self.error_messages = []
+
+    def add(self, samples):
+        for step, seconds, error in samples:
+            self.histograms[step].record(seconds)
+            if error is not None:
+                self.errors[step] += 1
+                self.error_messages.append(f"{step}: {error}")
+
+
+def parse_budgets(values):
+    budgets = {}
+    for value in values:
+        step, _, ms = value.partition("=")
+        if step not in STEPS or not ms:
+            raise ValueError(f"budget must be STEP=P95_MS with STEP in {STEPS}, got {value!r}")
+        budgets[step] = float(ms)
+    return budgets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent users against profile_women.py.")
+    parser.add_argument("--users", type=int, default=20, help="total simulated users")
+    parser.add_argument("--concurrency", type=int, default=5, help="users active at the same time")
+    parser.add_argument("--llm-latency", default="fixed:300",
+                        help="stub LLM time to first token in ms, e.g. 300, uniform:100-400, lognormal:300:0.5")
+    parser.add_argument("--llm-token-rate", type=float, default=200, help="stub LLM streamed tokens per second")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of stub LLM calls that fail")
+    parser.add_argument("--llm-429-rate", type=float, default=0.0, help="share of stub LLM calls rate limited")
+    parser.add_argument("--timeout", type=float, default=60, help="per-rerun AppTest timeout in seconds")
+    parser.add_argument("--budget", action="append", default=[], metavar="STEP=P95_MS",
+                        help="fail when a step's p95 latency exceeds the budget (repeatable)")
+    parser.add_argument("--max-error-rate", type=float, default=None,
+                        help="fail when the share of failed steps exceeds this (0.0 - 1.0)")
+    args = parser.parse_args(argv)
+    try:
+        budgets = parse_budgets(args.budget)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # The app opens nutrition_database.db relative to the working directory
+    workdir = tempfile.mkdtemp(prefix="nutriomen-load-")
+    run_id = uuid.uuid4().hex[:8]
+    results = Results()
+    completed = 0
+
+    # AppTest swaps out sys.modules["__main__"] while a script runs, so worker
+    # functions are referenced through this module's importable name
+    import load_test
+
+    stub_env = {
+        "NUTRIOMEN_LLM_BACKEND": "stub",
+        "NUTRIOMEN_STUB_LATENCY": args.llm_latency,
+        "NUTRIOMEN_STUB_TOKEN_RATE": str(args.llm_token_rate),
+        "NUTRIOMEN_STUB_ERROR_RATE": str(args.llm_error_rate),
+        "NUTRIOMEN_STUB_429_RATE": str(args.llm_429_rate),
+    }
+    with ProcessPoolExecutor(max_workers=args.concurrency, initializer=load_test.init_worker,
+                             initargs=(workdir, stub_env)) as pool:
+        # Start every worker before timing begins
+        list(pool.map(time.sleep, [0.1] * args.concurrency))
+        start = time.perf_counter()
+        futures = [pool.submit(load_test.run_user, i, run_id, args.timeout) for i in range(args.users)]
+        for future in futures:
+            user_completed, samples = future.result()
+            completed += user_completed
+            results.add(samples)
+        wall = time.perf_counter() - start
+
+    total_steps = sum(h.count for h in results.histograms.values())
+    total_errors = sum(results.errors.values())
+    error_rate = total_errors / total_steps if total_steps else 0.0
+
+    print(f"users: {args.users}, concurrency: {args.concurrency}, wall time: {wall:.1f}s, db: {workdir}")
+    print(f"throughput: {completed / wall:.2f} journeys/s, {total_steps / wall:.1f} steps/s")
+    print(f"completed journeys: {completed}/{args.users}, error rate: {error_rate:.2%}")
+    print(f"{'step':>10}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name in STEPS:
+        hist = results.histograms[name]
+        print(f"{name:>10}{hist.count:>8}{results.errors[name]:>8}"
+              f"{hist.percentile(0.5) * 1000:>10.1f}{hist.percentile(0.95) * 1000:>10.1f}"
+              f"{hist.percentile(0.99) * 1000:>10.1f}")
+    for message in results.error_messages[:10]:
+        print(f"  error: {message}")
+
+    failures = []
+    for step, budget_ms in budgets.items():
+        p95_ms = results.histograms[step].percentile(0.95) * 1000
+        if p95_ms > budget_ms:
+            failures.append(f"{step} p95 {p95_ms:.1f} ms exceeds {budget_ms:.0f} ms")
+    if args.max_error_rate is not None and error_rate > args.max_error_rate:
+        failures.append(f"error rate {error_rate:.2%} exceeds {args.max_error_rate:.2%}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
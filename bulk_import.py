@@ -0,0 +1,305 @@
+"""
+Bulk import of users and profiles from a clinic CSV.
+
+The CSV is streamed in chunks. Worker processes validate each row against
+the same rules as the signup and profile forms and hash passwords. Rows
+without a password get a one-time invite token instead. The main process
+inserts accepted rows with executemany in large transactions, and writes
+rejected rows, with the reason, to a reject file.
+
+Expected columns (header row required):
+    username, email, password (optional), full_name, age, education, height,
+    weight, menstruation_date, is_regular_cycle, diseases, food_allergies,
+    is_pregnant, pregnancy_week
+
+Usage:
+    python bulk_import.py clinic.csv [--db nutrition_database.db] [--rejects rejects.csv]
+                          [--invites invites.csv] [--workers 4] [--chunk-size 5000]
+                          [--commit-every 50000]
+"""
+import argparse
+import csv
+import hashlib
+import os
+import secrets
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from auth import hash_password, is_valid_email
+from database import DB_PATH, init_db
+
+# Value ranges of the profile form (profile_page.profile_page)
+EDUCATION_LEVELS = ["High School", "Bachelor's", "Master's", "PhD", "Other"]
+AGE_RANGE = (18, 100)
+HEIGHT_RANGE = (120.0, 220.0)
+WEIGHT_RANGE = (30.0, 200.0)
+PREGNANCY_WEEKS = (1, 42)
+INVITE_DAYS = 30
+
+REQUIRED_COLUMNS = ["username", "email", "full_name", "age", "height", "weight"]
+TRUE_VALUES = {"1", "true", "yes", "y"}
+FALSE_VALUES = {"0", "false", "no", "n", ""}
+
+
+class RowError(ValueError):
+    pass
+
+
+def _number(row, column, cast, bounds):
+    try:
+        # csv.DictReader fills the fields of a short row with None
+        value = cast((row.get(column) or "").strip())
+    except ValueError:
+        raise RowError(f"{column} is not a number")
+    if not bounds[0] <= value <= bounds[1]:
+        raise RowError(f"{column} must be between {bounds[0]} and {bounds[1]}")
+    return value
+
+
+def _flag(row, column):
+    value = (row.get(column) or "").strip().lower()
+    if value in TRUE_VALUES:
+        return 1
+    if value in FALSE_VALUES:
+        return 0
+    raise RowError(f"{column} must be yes/no or 1/0")
+
+
+def validate(row):
+    """Return (user, profile) tuples ready to insert, or raise RowError."""
+    for column in REQUIRED_COLUMNS:
+        if not (row.get(column) or "").strip():
+            raise RowError(f"{column} is required")
+    username = row["username"].strip()
+    email = row["email"].strip()
+    if not is_valid_email(email):
+        raise RowError("invalid email")
+
+    age = _number(row, "age", int, AGE_RANGE)
+    height = _number(row, "height", float, HEIGHT_RANGE)
+    weight = _number(row, "weight", float, WEIGHT_RANGE)
+    education = (row.get("education") or "").strip() or "Other"
+    if education not in EDUCATION_LEVELS:
+        raise RowError(f"education must be one of {EDUCATION_LEVELS}")
+    menstruation_date = (row.get("menstruation_date") or "").strip() or None
+    if menstruation_date:
+        try:
+            menstruation_date = datetime.strptime(menstruation_date, "%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            raise RowError("menstruation_date must be YYYY-MM-DD")
+    is_pregnant = _flag(row, "is_pregnant")
+    pregnancy_week = _number(row, "pregnancy_week", int, PREGNANCY_WEEKS) if is_pregnant else 0
+
+    password = row.get("password") or ""
+    invite = None
+    if password:
+        if len(password) < 6:
+            raise RowError("password must be at least 6 characters")
+        password_hash = hash_password(password)
+    else:
+        # No password: the user signs in through a one-time invite, and the
+        # stored value can never match a hash_password() digest
+        invite = secrets.token_urlsafe(24)
+        password_hash = "!invite"
+
+    user = (username, password_hash, email)
+    profile = (row["full_name"].strip(), age, education, height, weight, menstruation_date,
+               _flag(row, "is_regular_cycle") if (row.get("is_regular_cycle") or "").strip() else 1,
+               (row.get("diseases") or "").strip(), (row.get("food_allergies") or "").strip(),
+               is_pregnant, pregnancy_week)
+    return user, profile, invite
+
+
+def process_chunk(chunk):
+    """Worker: validate and hash a chunk of (line, row) pairs."""
+    accepted, rejected = [], []
+    for line, row in chunk:
+        try:
+            accepted.append((line, *validate(row)))
+        except RowError as e:
+            rejected.append((line, row, str(e)))
+        except Exception as e:
+            # Anything else is still one bad row, not a reason to abort the import
+            rejected.append((line, row, f"invalid row ({type(e).__name__}: {e})"))
+    return accepted, rejected
+
+
+def read_chunks(reader, chunk_size):
+    chunk = []
+    # Line 1 is the header
+    for line, row in enumerate(reader, 2):
+        chunk.append((line, row))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Importer:
+    """Inserts validated rows in large transactions, rejecting duplicates."""
+
+    def __init__(self, conn, commit_every):
+        self.conn = conn
+        self.commit_every = commit_every
+        self.usernames = set()
+        self.emails = set()
+        self.pending = 0
+        self.inserted = 0
+        self._next_id = None
+
+    def _begin(self):
+        # Hold the write lock for the whole transaction so the user ids assigned below stay ours
+        self.conn.execute("BEGIN IMMEDIATE")
+        seq = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'users'").fetchone()
+        max_id = self.conn.execute("SELECT MAX(id) FROM users").fetchone()[0]
+        self._next_id = max(seq[0] if seq else 0, max_id or 0) + 1
+
+    def _existing(self, column, values):
+        found = set()
+        values = list(values)
+        for i in range(0, len(values), 500):
+            batch = values[i:i + 500]
+            found.update(row[0] for row in self.conn.execute(
+                f"SELECT {column} FROM users WHERE {column} IN ({','.join('?' * len(batch))})", batch))
+        return found
+
+    def insert(self, accepted):
+        """Insert a chunk of accepted rows; return (invites, rejects) for rows that made it or didn't."""
+        if self._next_id is None:
+            self._begin()
+        taken_usernames = self._existing("username", (user[0] for _, user, _, _ in accepted))
+        taken_emails = self._existing("email", (user[2] for _, user, _, _ in accepted))
+
+        users, profiles, invites, rejects = [], [], [], []
+        for line, user, profile, invite in accepted:
+            username, _, email = user
+            if username in taken_usernames or username in self.usernames:
+                rejects.append((line, "username already exists"))
+                continue
+            if email in taken_emails or email in self.emails:
+                rejects.append((line, "email already registered"))
+                continue
+            self.usernames.add(username)
+            self.emails.add(email)
+            user_id = self._next_id
+            self._next_id += 1
+            users.append((user_id, *user))
+            profiles.append((user_id, *profile))
+            if invite:
+                invites.append((user_id, username, email, invite))
+
+        self.conn.executemany("INSERT INTO users (id, username, password, email) VALUES (?, ?, ?, ?)", users)
+        self.conn.executemany(
+            """INSERT INTO profiles (
+                user_id, full_name, age, education, height, weight,
+                menstruation_date, is_regular_cycle, diseases,
+                food_allergies, is_pregnant, pregnancy_week
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", profiles)
+        self.conn.executemany(
+            f"INSERT INTO invites (user_id, token_hash, expires_at) VALUES (?, ?, datetime('now', '+{INVITE_DAYS} days'))",
+            ((user_id, hashlib.sha256(token.encode()).hexdigest()) for user_id, _, _, token in invites))
+        self.inserted += len(users)
+        self.pending += len(users)
+        if self.pending >= self.commit_every:
+            self.commit()
+        return invites, rejects
+
+    def commit(self):
+        if self._next_id is not None:
+            self.conn.commit()
+            self._next_id = None
+            self.pending = 0
+
+    def rollback(self):
+        if self._next_id is not None:
+            self.conn.rollback()
+            self._next_id = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import users and profiles from a CSV file.")
+    parser.add_argument("csv", help="CSV file to import")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--rejects", default=None, help="reject file (default: <csv>.rejects.csv)")
+    parser.add_argument("--invites", default=None, help="invite token file (default: <csv>.invites.csv)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows per validation task")
+    parser.add_argument("--commit-every", type=int, default=50_000, help="rows per transaction")
+    args = parser.parse_args(argv)
+
+    base = os.path.splitext(args.csv)[0]
+    rejects_path = args.rejects or f"{base}.rejects.csv"
+    invites_path = args.invites or f"{base}.invites.csv"
+
+    conn = init_db(args.db)
+    # Transactions are managed explicitly by the importer
+    conn.isolation_level = None
+    importer = Importer(conn, args.commit_every)
+    start = time.perf_counter()
+    total = rejected_count = invited = 0
+
+    with open(args.csv, newline="", encoding="utf-8-sig") as source, \
+            open(rejects_path, "w", newline="") as rejects_file, \
+            open(invites_path, "w", newline="") as invites_file:
+        reader = csv.DictReader(source)
+        missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+        if missing:
+            print(f"CSV is missing columns: {missing}", file=sys.stderr)
+            return 1
+        # Passwords are never copied to the reject file
+        reject_columns = ["line", "reason"] + [c for c in reader.fieldnames if c != "password"]
+        rejects = csv.DictWriter(rejects_file, reject_columns, extrasaction="ignore")
+        rejects.writeheader()
+        invites = csv.writer(invites_file)
+        invites.writerow(["username", "email", "invite_token"])
+
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            # Keep a bounded number of chunks in flight so memory doesn't grow with the file
+            in_flight = deque()
+            chunks = read_chunks(reader, args.chunk_size)
+            rows_by_line = {}
+            try:
+                while True:
+                    while len(in_flight) < args.workers * 2:
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            break
+                        for line, row in chunk:
+                            rows_by_line[line] = row
+                        in_flight.append(pool.submit(process_chunk, chunk))
+                    if not in_flight:
+                        break
+                    accepted, invalid = in_flight.popleft().result()
+                    new_invites, duplicates = importer.insert(accepted)
+                    for line, row, reason in invalid:
+                        rejects.writerow(dict(row, line=line, reason=reason))
+                    for line, reason in duplicates:
+                        rejects.writerow(dict(rows_by_line[line], line=line, reason=reason))
+                    for _, username, email, token in new_invites:
+                        invites.writerow([username, email, token])
+                    for line, *_ in accepted:
+                        rows_by_line.pop(line, None)
+                    for line, *_ in invalid:
+                        rows_by_line.pop(line, None)
+                    total += len(accepted) + len(invalid)
+                    rejected_count += len(invalid) + len(duplicates)
+                    invited += len(new_invites)
+                importer.commit()
+            except BaseException:
+                importer.rollback()
+                raise
+
+    elapsed = time.perf_counter() - start
+    print(f"{total} rows in {elapsed:.1f}s ({total / elapsed * 60 if elapsed else 0:,.0f} rows/min): "
+          f"{importer.inserted} imported, {invited} invites, {rejected_count} rejected")
+    print(f"rejects: {rejects_path}")
+    print(f"invites: {invites_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,629 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import pickle
+import socket
+import socketserver
+import ssl
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import metrics
+
+try:
+    import msgpack
+except ImportError:  # optional dependency; values fall back to pickle
+    msgpack = None
+
+# Key/value cache shared by app replicas.
+#
+# Cache is the interface: values live under a namespace ("profile", "llm",
+# "image", ...) with an optional TTL. LocalCache is an in-process LRU bounded
+# by entries and bytes. RedisCache talks the Redis protocol (RESP) to any
+# Redis-compatible server, so every replica sees the same entries; RespServer
+# is a small in-process stand-in for running that path without Redis.
+# TwoTierCache puts a short-lived LocalCache (near) in front of a shared cache
+# (far) so hot keys don't cost a network round trip on every read.
+#
+# Values are stored encoded: bytes and str as they are, other plain data
+# (numbers, lists, dicts with str keys) as msgpack when it's installed or
+# JSON, anything else pickled; zlib-compressed above COMPRESS_MIN_BYTES.
+# Unpickling runs code, so pickles read from a shared server must carry an
+# HMAC made with $NUTRIOMEN_CACHE_SECRET; unsigned or forged ones are misses,
+# and without a secret objects that need pickling aren't shared at all. Hits
+# and misses are counted per namespace and tier.
+
+logger = logging.getLogger("cache_backend")
+
+COMPRESS_MIN_BYTES = 1024
+KEY_PREFIX = "nutriomen"
+
+# First byte of an encoded value: the format, plus flags; signed values have their HMAC-SHA256 next
+_MSGPACK, _PICKLE, _BYTES, _TEXT, _JSON = 0x01, 0x02, 0x03, 0x04, 0x05
+_SIGNED, _COMPRESSED = 0x40, 0x80
+_FLAGS = _SIGNED | _COMPRESSED
+_MAC_BYTES = 32
+_SCALARS = (str, int, float, bool, type(None))
+
+
+class UnsafeValue(ValueError):
+    """An encoded value that must not be unpickled: unsigned from an untrusted cache, or forged."""
+
+
+def _mac(secret: bytes, data: bytes) -> bytes:
+    return hmac.new(secret, data, hashlib.sha256).digest()
+
+
+def _plain(value: Any) -> bool:
+    """Whether JSON gives the value back as it was (tuples aside): exact built-in types, str dict keys."""
+    kind = type(value)
+    if kind in _SCALARS:
+        return True
+    if kind in (list, tuple):
+        return all(map(_plain, value))
+    if kind is dict:
+        return all(type(k) is str and _plain(v) for k, v in value.items())
+    return False
+
+
+def _serialize(value: Any) -> Tuple[int, bytes]:
+    if type(value) is bytes:
+        return _BYTES, value
+    if type(value) is str:
+        return _TEXT, value.encode()
+    if msgpack is not None:
+        try:
+            return _MSGPACK, msgpack.packb(value, use_bin_type=True)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    elif _plain(value):
+        return _JSON, json.dumps(value, separators=(",", ":")).encode()
+    return _PICKLE, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def encode(value: Any, secret: Optional[bytes] = None) -> bytes:
+    """
+    Serialize a value compactly: bytes and str as they are, plain data as
+    msgpack or JSON, anything else pickled; compressed if large. Pickles are
+    signed with `secret` when one is given.
+    """
+    kind, data = _serialize(value)
+    if len(data) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            kind, data = kind | _COMPRESSED, compressed
+    if kind & ~_FLAGS == _PICKLE and secret:
+        kind |= _SIGNED
+        return bytes([kind]) + _mac(secret, bytes([kind]) + data) + data
+    return bytes([kind]) + data
+
+
+def decode(blob: bytes, secret: Optional[bytes] = None, trusted: bool = True) -> Any:
+    """
+    Deserialize an encoded value. Pickles from an untrusted cache are only
+    loaded with a valid signature; anything else raises UnsafeValue.
+    """
+    kind, data = blob[0], blob[1:]
+    form = kind & ~_FLAGS
+    if kind & _SIGNED:
+        mac, data = data[:_MAC_BYTES], data[_MAC_BYTES:]
+        if not secret or not hmac.compare_digest(mac, _mac(secret, bytes([kind]) + data)):
+            raise UnsafeValue("bad signature")
+    elif form == _PICKLE and not trusted:
+        raise UnsafeValue("unsigned pickle from a shared cache")
+    if kind & _COMPRESSED:
+        data = zlib.decompress(data)
+    if form == _BYTES:
+        return data
+    if form == _TEXT:
+        return data.decode()
+    # Tuples come back as lists from msgpack and JSON
+    if form == _JSON:
+        return json.loads(data)
+    if form == _MSGPACK:
+        return msgpack.unpackb(data, raw=False)
+    return pickle.loads(data)
+
+
+def _is_unsigned_pickle(blob: bytes) -> bool:
+    return blob[0] & ~_FLAGS == _PICKLE and not blob[0] & _SIGNED
+
+
+def _record(namespace: str, tier: str, hit: bool) -> None:
+    metrics.inc("cache_requests_total", namespace=namespace, tier=tier, result="hit" if hit else "miss")
+
+
+class Cache:
+    """Interface implemented by every cache backend."""
+    name = "base"
+    # Whether only this process can write the entries; pickles from anywhere else must be signed
+    trusted = True
+    secret: Optional[bytes] = None
+
+    def get_raw(self, namespace: str, key: str) -> Tuple[Optional[bytes], Optional[float]]:
+        """The encoded value and its remaining TTL in seconds (None: no expiry), or (None, None)."""
+        raise NotImplementedError
+
+    def set_raw(self, namespace: str, key: str, blob: bytes, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self, namespace: str) -> None:
+        """Drop every entry of a namespace."""
+        raise NotImplementedError
+
+    def _decode(self, namespace: str, blob: Optional[bytes]) -> Any:
+        """The value of a blob, or None for a miss or a value that must not be loaded."""
+        if blob is None:
+            return None
+        try:
+            return decode(blob, self.secret, self.trusted)
+        except UnsafeValue as e:
+            logger.warning(f"Ignoring cached {namespace} value: {e}")
+            metrics.inc("cache_rejected_total", namespace=namespace, tier=self.name)
+            return None
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        blob, _ = self.get_raw(namespace, key)
+        value = self._decode(namespace, blob)
+        _record(namespace, self.name, value is not None)
+        return default if value is None else value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        blob = encode(value, self.secret)
+        if not self.trusted and _is_unsigned_pickle(blob):
+            # No other replica would load it
+            metrics.inc("cache_unshareable_total", namespace=namespace, tier=self.name)
+            return
+        self.set_raw(namespace, key, blob, ttl)
+
+    def get_or_set(self, namespace: str, key: str, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Cached value, or compute(), cache and return it. None results are not cached."""
+        blob, _ = self.get_raw(namespace, key)
+        value = self._decode(namespace, blob)
+        _record(namespace, self.name, value is not None)
+        if value is not None:
+            return value
+        value = compute()
+        if value is not None:
+            self.set(namespace, key, value, ttl)
+        return value
+
+
+class LocalCache(Cache):
+    """In-process LRU bounded by entry count and total encoded size."""
+    name = "local"
+
+    def __init__(self, max_entries: int = 10_000, max_bytes: int = 64 << 20, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        # (namespace, key) -> (blob, expires_at or None)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_raw(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None, None
+            blob, expires_at = entry
+            now = self._clock()
+            if expires_at is not None and expires_at <= now:
+                self._remove((namespace, key))
+                return None, None
+            self._entries.move_to_end((namespace, key))
+            return blob, None if expires_at is None else expires_at - now
+
+    def set_raw(self, namespace, key, blob, ttl=None):
+        if len(blob) > self.max_bytes:
+            return
+        expires_at = None if ttl is None else self._clock() + ttl
+        with self._lock:
+            self._remove((namespace, key))
+            self._entries[(namespace, key)] = (blob, expires_at)
+            self._bytes += len(blob)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                metrics.inc("cache_evictions_total", namespace=oldest[0], tier=self.name)
+            metrics.set_gauge("cache_bytes", self._bytes, tier=self.name)
+
+    def _remove(self, entry_key) -> None:
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._remove((namespace, key))
+
+    def clear(self, namespace):
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == namespace]:
+                self._remove(entry_key)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RespError(Exception):
+    """The server answered with a RESP error."""
+
+
+class _RespConnection:
+    """One socket speaking RESP2."""
+
+    def __init__(self, host: str, port: int, timeout: float, tls: bool = False):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if tls:
+            # rediss://: the server's certificate is verified against the system CAs
+            self.sock = ssl.create_default_context().wrap_socket(self.sock, server_hostname=host)
+        self.reader = self.sock.makefile("rb")
+
+    def pipeline(self, *commands) -> List[Any]:
+        """Send several commands in one write and read their replies in order."""
+        parts = []
+        for args in commands:
+            parts.append(b"*%d\r\n" % len(args))
+            for arg in args:
+                if not isinstance(arg, bytes):
+                    arg = str(arg).encode()
+                parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self.sock.sendall(b"".join(parts))
+        replies, error = [], None
+        for _ in commands:
+            try:
+                replies.append(self._read())
+            except RespError as e:
+                # Keep reading so the connection stays in sync
+                error = error or e
+        if error:
+            raise error
+        return replies
+
+    def command(self, *args) -> Any:
+        return self.pipeline(args)[0]
+
+    def _read(self) -> Any:
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise RespError(f"unexpected reply {line!r}")
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisCache(Cache):
+    """
+    Shared cache on a Redis-compatible server, through a small pool of RESP connections.
+
+    Keys are "nutriomen:<namespace>:<key>"; TTLs are set with PX so the
+    server expires entries. Connection errors are logged and count as misses,
+    so the app keeps working (uncached) when the server is down.
+    """
+    name = "redis"
+    trusted = False
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", max_connections: int = 8, timeout: float = 0.5,
+                 secret: Optional[bytes] = None):
+        parsed = urlparse(url)
+        self.tls = parsed.scheme == "rediss"
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.secret = secret
+        self.password = parsed.password
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self.timeout = timeout
+        self._idle: List[_RespConnection] = []
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+
+    def _connect(self) -> _RespConnection:
+        conn = _RespConnection(self.host, self.port, self.timeout, tls=self.tls)
+        try:
+            if self.password:
+                conn.command("AUTH", self.password)
+            if self.db:
+                conn.command("SELECT", self.db)
+        except Exception:
+            # Wrong password or database: the connection is useless
+            conn.close()
+            raise
+        return conn
+
+    def pipeline(self, *commands) -> List[Any]:
+        with self._slots:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._connect()
+            try:
+                replies = conn.pipeline(*commands)
+            except RespError:
+                # Every reply was read, so the connection is still in sync
+                with self._lock:
+                    self._idle.append(conn)
+                raise
+            except Exception:
+                # The connection may be half-read; never hand it out again
+                conn.close()
+                raise
+            with self._lock:
+                self._idle.append(conn)
+            return replies
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{KEY_PREFIX}:{namespace}:{key}"
+
+    def _safe(self, namespace: str, *commands) -> Optional[List[Any]]:
+        try:
+            return self.pipeline(*commands)
+        except (OSError, ConnectionError, RespError) as e:
+            logger.warning(f"Cache {commands[0][0]} failed: {e}")
+            metrics.inc("cache_errors_total", namespace=namespace, tier=self.name)
+            return None
+
+    def get_raw(self, namespace, key):
+        # Value and TTL in one round trip
+        replies = self._safe(namespace, ("GET", self._key(namespace, key)), ("PTTL", self._key(namespace, key)))
+        if not replies or replies[0] is None:
+            return None, None
+        blob, pttl = replies
+        return blob, None if pttl < 0 else pttl / 1000
+
+    def set_raw(self, namespace, key, blob, ttl=None):
+        if ttl is None:
+            self._safe(namespace, ("SET", self._key(namespace, key), blob))
+        else:
+            self._safe(namespace, ("SET", self._key(namespace, key), blob, "PX", max(1, int(ttl * 1000))))
+
+    def delete(self, namespace, key):
+        self._safe(namespace, ("DEL", self._key(namespace, key)))
+
+    def clear(self, namespace):
+        cursor = b"0"
+        while True:
+            replies = self._safe(namespace, ("SCAN", cursor, "MATCH", self._key(namespace, "*"), "COUNT", 500))
+            if not replies:
+                return
+            cursor, keys = replies[0]
+            if keys:
+                self._safe(namespace, ("DEL", *keys))
+            if cursor in (b"0", 0, "0"):
+                return
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._idle:
+                conn.close()
+            self._idle.clear()
+
+
+class TwoTierCache(Cache):
+    """
+    A near LocalCache in front of a far shared cache.
+
+    Reads try near first and fill it from far for at most `near_ttl` seconds,
+    which bounds how long a replica can serve a value another replica has
+    since changed. Writes and deletes go to both tiers.
+    """
+    name = "two_tier"
+
+    def __init__(self, near: LocalCache, far: Cache, near_ttl: float = 5.0):
+        self.near = near
+        self.far = far
+        self.near_ttl = near_ttl
+        # Near entries are copies of far ones, so they are checked the same way
+        self.trusted = far.trusted
+        self.secret = far.secret
+
+    def get_raw(self, namespace, key):
+        blob, remaining = self.near.get_raw(namespace, key)
+        _record(namespace, self.near.name, blob is not None)
+        if blob is not None:
+            return blob, remaining
+        blob, remaining = self.far.get_raw(namespace, key)
+        _record(namespace, self.far.name, blob is not None)
+        if blob is not None:
+            self.near.set_raw(namespace, key, blob, self.near_ttl if remaining is None else min(self.near_ttl, remaining))
+        return blob, remaining
+
+    def set_raw(self, namespace, key, blob, ttl=None):
+        self.far.set_raw(namespace, key, blob, ttl)
+        self.near.set_raw(namespace, key, blob, self.near_ttl if ttl is None else min(self.near_ttl, ttl))
+
+    def delete(self, namespace, key):
+        self.far.delete(namespace, key)
+        self.near.delete(namespace, key)
+
+    def clear(self, namespace):
+        self.far.clear(namespace)
+        self.near.clear(namespace)
+
+
+class RespServer:
+    """
+    In-process stand-in for a Redis server: GET, SET (EX/PX), DEL, PTTL, SCAN,
+    DBSIZE, FLUSHDB, PING. Enough for RedisCache, for local runs and benchmarks.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+        store = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                # Replies to pipelined commands are written one by one; don't let Nagle hold them back
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def handle(self):
+                while True:
+                    try:
+                        args = store._read_command(self.rfile)
+                    except (ConnectionError, ValueError):
+                        return
+                    if args is None:
+                        return
+                    self.wfile.write(store._dispatch(args))
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler, bind_and_activate=False)
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._server.server_bind()
+        self._server.server_activate()
+        self.host, self.port = self._server.server_address[:2]
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    def start(self) -> "RespServer":
+        threading.Thread(target=self._server.serve_forever, name="resp-server", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def _read_command(rfile) -> Optional[List[bytes]]:
+        line = rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command, as typed into telnet
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(rfile.readline()[1:-2])
+            args.append(rfile.read(length + 2)[:-2])
+        return args
+
+    def _live(self, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def _dispatch(self, args: List[bytes]) -> bytes:
+        name = args[0].upper()
+        with self._lock:
+            if name == b"PING":
+                return b"+PONG\r\n"
+            if name == b"GET":
+                entry = self._live(args[1])
+                return b"$-1\r\n" if entry is None else b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+            if name == b"SET":
+                expires_at = None
+                options = [a.upper() for a in args[3:]]
+                if b"PX" in options:
+                    expires_at = time.monotonic() + int(args[3 + options.index(b"PX") + 1]) / 1000
+                elif b"EX" in options:
+                    expires_at = time.monotonic() + int(args[3 + options.index(b"EX") + 1])
+                self._data[args[1]] = (args[2], expires_at)
+                return b"+OK\r\n"
+            if name == b"DEL":
+                return b":%d\r\n" % sum(self._data.pop(key, None) is not None for key in args[1:])
+            if name == b"PTTL":
+                entry = self._live(args[1])
+                if entry is None:
+                    return b":-2\r\n"
+                return b":-1\r\n" if entry[1] is None else b":%d\r\n" % int((entry[1] - time.monotonic()) * 1000)
+            if name == b"SCAN":
+                # Single pass: everything matching is returned with cursor 0
+                pattern = args[args.index(b"MATCH") + 1] if b"MATCH" in args else b"*"
+                prefix = pattern.rstrip(b"*")
+                keys = [k for k in list(self._data) if k.startswith(prefix) and self._live(k)]
+                return b"*2\r\n$1\r\n0\r\n*%d\r\n" % len(keys) + b"".join(b"$%d\r\n%s\r\n" % (len(k), k) for k in keys)
+            if name == b"DBSIZE":
+                return b":%d\r\n" % len(self._data)
+            if name in (b"FLUSHDB", b"FLUSHALL"):
+                self._data.clear()
+                return b"+OK\r\n"
+            if name in (b"SELECT", b"AUTH"):
+                return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % args[0]
+
+
+def cache_from_url(url: Optional[str] = None) -> Cache:
+    """
+    A cache for $NUTRIOMEN_CACHE_URL: empty or "local" for an in-process LRU,
+    redis://host:port/db (rediss:// for TLS) for a shared cache (two-tier
+    unless $NUTRIOMEN_CACHE_NEAR_TTL is 0), signed with $NUTRIOMEN_CACHE_SECRET.
+    """
+    url = url if url is not None else os.getenv("NUTRIOMEN_CACHE_URL", "")
+    local = LocalCache(max_entries=int(os.getenv("NUTRIOMEN_CACHE_ENTRIES", "10000")),
+                       max_bytes=int(os.getenv("NUTRIOMEN_CACHE_MB", "64")) << 20)
+    if url in ("", "local"):
+        return local
+    if not url.startswith(("redis://", "rediss://")):
+        raise ValueError(f"unsupported cache URL {url!r}")
+    secret = os.getenv("NUTRIOMEN_CACHE_SECRET", "").encode() or None
+    if secret is None:
+        logger.warning("NUTRIOMEN_CACHE_SECRET is not set: objects that need pickling (profiles, rows with "
+                       "dates) won't be shared; bytes, text and plain lists, dicts and numbers still are")
+    far = RedisCache(url, secret=secret)
+    near_ttl = float(os.getenv("NUTRIOMEN_CACHE_NEAR_TTL", "5"))
+    return TwoTierCache(local, far, near_ttl) if near_ttl > 0 else far
+
+
+_cache: Optional[Cache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Cache:
+    """Process-wide cache, from $NUTRIOMEN_CACHE_URL."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = cache_from_url()
+                logger.info(f"Using {_cache.name} cache")
+    return _cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the stand-in RESP server for local multi-replica testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    server = RespServer(args.host, args.port)
+    print(f"serving {server.url}")
+    server._server.serve_forever()
@@ -1,8 +1,9 @@
+import os
 import streamlit as st
-import openai
+from llm_helper import LLMHelper
 
-# Set up OpenAI API
-openai.api_key = "your_api_key_here"
+# The chatbot uses OpenAI by default; NUTRIOMEN_CHAT_BACKEND selects another backend (e.g. "stub")
+llm_helper = LLMHelper(os.getenv("NUTRIOMEN_CHAT_BACKEND", "openai"))
 
 # Title
 st.title("🥗 AI-Powered Nutrition Chatbot for Women")
@@ -31,13 +32,7 @@ if user_input:
 
     # AI Response
     prompt = f"You are a nutritionist guiding a {age}-year-old {diet_preference} woman whose goal is {goal}. {user_input}"
-    response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[{"role": "system", "content": "You are an expert nutritionist giving diet advice for women."},
-                  {"role": "user", "content": prompt}]
-    )
-
-    bot_reply = response["choices"][0]["message"]["content"]
+    bot_reply = llm_helper.get_response(prompt)
 
     # Append bot response to chat history
     chat_history.append({"role": "assistant", "content": bot_reply})
@@ -0,0 +1,221 @@
+import argparse
+import random
+import sys
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+from cache_backend import Cache, get_cache
+from storage import Storage, get_storage
+
+# Community posts, comments and likes.
+#
+# Feeds (all posts, or one life stage) are keyset-paginated on the post id,
+# newest first, through the primary key or the (life_stage, id) index, so a
+# page costs the same however many posts there are and however deep it is.
+# Like and comment counts live on the post row and are updated in the same
+# transaction as the reaction or comment, instead of being counted per render.
+#
+# Reads go through the "community" cache namespace in two layers: a feed page
+# is cached as its list of post ids, keyed by a feed version that changes
+# when a post is added; posts are cached one by one and dropped when they get
+# a like or a comment. A render is then a few cache reads, plus one query for
+# whichever posts on the page aren't cached. A write also leaves a short-lived
+# marker for the post, so a reader whose query raced the write doesn't keep
+# the old counts cached for POST_TTL.
+
+LIFE_STAGES = ["Adolescence", "Adult", "Pregnancy", "Postpartum", "Perimenopause", "Menopause", "Post-menopause"]
+PAGE_SIZE = 20
+FEED_TTL = 60
+POST_TTL = 300
+# How long a write marks its post as not to be cached from a read that may predate it
+RECENT_WRITE_TTL = 10
+POST_COLUMNS = "id, author, life_stage, title, body, like_count, comment_count, created_at"
+
+
+class Community:
+    """Posts, comments and reactions in the app database, with a cached read path."""
+
+    def __init__(self, store: Optional[Storage] = None, cache: Optional[Cache] = None):
+        self.store = store or get_storage()
+        self._cache = cache
+
+    @property
+    def cache(self) -> Cache:
+        return self._cache or get_cache()
+
+    # Writes
+
+    def add_post(self, user_key: str, author: str, life_stage: str, title: str, body: str) -> int:
+        if life_stage not in LIFE_STAGES:
+            raise ValueError(f"unknown life stage {life_stage!r}")
+        with self.store.connection() as conn:
+            post_id = self.store._insert(conn.cursor(), """
+                INSERT INTO community_posts (user_key, author, life_stage, title, body) VALUES (?, ?, ?, ?, ?)""",
+                (user_key, author, life_stage, title, body))
+        self._bump_feed_version()
+        metrics.inc("community_posts_total", life_stage=life_stage)
+        return post_id
+
+    def add_comment(self, post_id: int, user_key: str, author: str, body: str) -> int:
+        with self.store.connection() as conn:
+            cursor = conn.cursor()
+            comment_id = self.store._insert(cursor, """
+                INSERT INTO community_comments (post_id, user_key, author, body) VALUES (?, ?, ?, ?)""",
+                (post_id, user_key, author, body))
+            self.store._execute(cursor, "UPDATE community_posts SET comment_count = comment_count + 1 WHERE id = ?",
+                                (post_id,))
+        self._invalidate_post(post_id)
+        return comment_id
+
+    def like(self, post_id: int, user_key: str) -> bool:
+        """Like a post; returns False if this user already liked it."""
+        with self.store.connection() as conn:
+            cursor = self.store._execute(conn.cursor(), """
+                INSERT INTO community_reactions (post_id, user_key) VALUES (?, ?)
+                ON CONFLICT (post_id, user_key) DO NOTHING""", (post_id, user_key))
+            if cursor.rowcount != 1:
+                return False
+            self.store._execute(cursor, "UPDATE community_posts SET like_count = like_count + 1 WHERE id = ?",
+                                (post_id,))
+        self._invalidate_post(post_id)
+        return True
+
+    def unlike(self, post_id: int, user_key: str) -> bool:
+        """Take a like back; returns False if there was none."""
+        with self.store.connection() as conn:
+            cursor = self.store._execute(conn.cursor(),
+                                         "DELETE FROM community_reactions WHERE post_id = ? AND user_key = ?",
+                                         (post_id, user_key))
+            if cursor.rowcount != 1:
+                return False
+            self.store._execute(cursor, "UPDATE community_posts SET like_count = like_count - 1 WHERE id = ?",
+                                (post_id,))
+        self._invalidate_post(post_id)
+        return True
+
+    # Reads
+
+    @metrics.timed("db", "community_feed")
+    def feed(self, life_stage: Optional[str] = None, after: Optional[int] = None,
+             limit: int = PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        A page of posts, newest first, from every life stage or just one.
+        Returns the posts and the cursor for the next page (None on the last
+        page); pass it as `after`.
+        """
+        key = f"feed:{self._feed_version()}:{life_stage or '*'}:{after or ''}:{limit}"
+        ids, next_cursor = self.cache.get_or_set("community", key, lambda: self._feed_ids(life_stage, after, limit),
+                                                 ttl=FEED_TTL)
+        return self.posts(ids), next_cursor
+
+    def _feed_ids(self, life_stage: Optional[str], after: Optional[int], limit: int) -> List:
+        where, params = [], []
+        if life_stage:
+            where.append("life_stage = ?")
+            params.append(life_stage)
+        if after is not None:
+            where.append("id < ?")
+            params.append(after)
+        sql = "SELECT id FROM community_posts"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows = self.store.query(sql + " ORDER BY id DESC LIMIT ?", (*params, limit + 1))
+        ids = [row["id"] for row in rows]
+        return [ids[:limit], ids[limit - 1] if len(ids) > limit else None]
+
+    def posts(self, ids: Sequence[int]) -> List[Dict[str, Any]]:
+        """Posts by id, in the given order, from the cache where possible."""
+        found = {}
+        for post_id in ids:
+            post = self.cache.get("community", f"post:{post_id}")
+            if post is not None:
+                found[post_id] = post
+        missing = [post_id for post_id in ids if post_id not in found]
+        if missing:
+            rows = self.store.query(f"SELECT {POST_COLUMNS} FROM community_posts WHERE id IN "
+                                    f"({', '.join('?' * len(missing))})", missing)
+            for row in rows:
+                found[row["id"]] = row
+                self.cache.set("community", f"post:{row['id']}", row, ttl=POST_TTL)
+                # Checked after the set: a write that committed after our query either deletes
+                # the entry itself or has left its marker by now
+                if self.cache.get("community", f"written:{row['id']}") is not None:
+                    self.cache.delete("community", f"post:{row['id']}")
+        return [found[post_id] for post_id in ids if post_id in found]
+
+    def comments(self, post_id: int, after: Optional[int] = None,
+                 limit: int = PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """A page of a post's comments, oldest first, and the cursor for the next page."""
+        rows = self.store.query("""SELECT id, author, body, created_at FROM community_comments
+                                   WHERE post_id = ? AND id > ? ORDER BY id LIMIT ?""",
+                                (post_id, after or 0, limit + 1))
+        return rows[:limit], rows[limit - 1]["id"] if len(rows) > limit else None
+
+    def liked(self, user_key: str, post_ids: Sequence[int]) -> set:
+        """Which of `post_ids` this user has liked."""
+        if not post_ids:
+            return set()
+        rows = self.store.query(f"""SELECT post_id FROM community_reactions
+                                    WHERE user_key = ? AND post_id IN ({', '.join('?' * len(post_ids))})""",
+                                (user_key, *post_ids))
+        return {row["post_id"] for row in rows}
+
+    def _invalidate_post(self, post_id: int) -> None:
+        self.cache.set("community", f"written:{post_id}", 1, ttl=RECENT_WRITE_TTL)
+        self.cache.delete("community", f"post:{post_id}")
+
+    def _feed_version(self) -> str:
+        version = self.cache.get("community", "feed_version")
+        if version is None:
+            version = self._bump_feed_version()
+        return version
+
+    def _bump_feed_version(self) -> str:
+        # Cached feed pages are keyed by this, so a new post makes every cached page stale at once
+        version = uuid.uuid4().hex[:12]
+        self.cache.set("community", "feed_version", version)
+        return version
+
+
+_community: Optional[Community] = None
+_community_lock = threading.Lock()
+
+
+def get_community() -> Community:
+    global _community
+    if _community is None:
+        with _community_lock:
+            if _community is None:
+                _community = Community()
+    return _community
+
+
+def generate_posts(store: Storage, count: int, batch_size: int = 10_000, seed: int = 0) -> None:
+    """Synthetic posts with like and comment counts already set, inserted in batches."""
+    rng = random.Random(seed)
+    insert = """INSERT INTO community_posts (user_key, author, life_stage, title, body, like_count, comment_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?)"""
+    for start in range(0, count, batch_size):
+        store.executemany(insert, [
+            (f"user:{rng.randint(1, 50_000)}", f"Member {n % 5000}", rng.choice(LIFE_STAGES), f"Post {n}",
+             "Sharing what has been working for me lately.", int(rng.expovariate(0.2)), int(rng.expovariate(0.5)))
+            for n in range(start, min(count, start + batch_size))])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Community tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    generate = sub.add_parser("generate", help="add synthetic posts (for load testing)")
+    generate.add_argument("--posts", type=int, default=100_000)
+    generate.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    generate_posts(get_storage(), args.posts, args.batch_size)
+    print(f"{args.posts} posts added")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
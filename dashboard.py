@@ -1,47 +1,22 @@
-import os
 import streamlit as st
 import sqlite3
-from datetime import datetime
-from langchain_groq import ChatGroq
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-class LLMHelper:
-    """Helper class to interact with ChatGroq's Llama3 model."""
-    def __init__(self):
-        self.llm = ChatGroq(groq_api_key=os.getenv("GROQ_API_KEY"), model_name="llama3-8b-8192")
-    
-    def get_response(self, prompt):
-        """Send the prompt to ChatGroq and return the response."""
-        response = self.llm.invoke(prompt)
-        return response.content  # Extract and return the response content
-
-def get_profile(conn, user_id):
-    c = conn.cursor()
-    c.execute("SELECT * FROM profiles WHERE user_id = ?", (user_id,))
-    result = c.fetchone()
-    
-    if result:
-        columns = [desc[0] for desc in c.description]
-        profile = {columns[i]: result[i] for i in range(len(columns))}
-        return profile
-    return None
+from datetime import time
+import metrics
+import jobs
+import reminders
+from dashboard1 import get_personalized_tips
+from profile_page import get_profile
+from streamlit_compat import fragment, rerun
 
 def generate_nutrition_prompt(profile):
     """Generate a prompt for the LLM based on the user's profile data."""
     
-    # Calculate BMI
-    bmi = profile['weight'] / ((profile['height'] / 100) ** 2)
+    bmi = profile.bmi
     bmi_status = "Underweight" if bmi < 18.5 else "Normal" if bmi < 25 else "Overweight" if bmi < 30 else "Obese"
     
     # Format menstruation information
     if profile['menstruation_date']:
-        # Fix: Calculate days since period without calling .date()
-        menstruation_date = datetime.strptime(profile['menstruation_date'], '%Y-%m-%d')
-        days_since_period = (datetime.now() - menstruation_date).days
-        period_info = f"Last menstruation started {days_since_period} days ago. Has a {'regular' if profile['is_regular_cycle'] else 'irregular'} cycle."
+        period_info = f"Last menstruation started {profile.days_since_period} days ago. Has a {'regular' if profile['is_regular_cycle'] else 'irregular'} cycle."
     else:
         period_info = "No menstruation data provided."
     
@@ -70,17 +45,78 @@ def generate_nutrition_prompt(profile):
     
     return prompt
 
-def dashboard_page(conn):
+def show_reminders(user_id):
+    """Reminders the user hasn't dismissed yet, checked again every minute while the page is open."""
+    def inbox():
+        for reminder in reminders.get_reminders().inbox(user_id):
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                st.info(("💧 " if reminder['kind'] == "water" else "🍽️ ") + reminder['message'])
+            with col2:
+                if st.button("Done", key=f"reminder_done_{reminder['kind']}"):
+                    reminders.get_reminders().dismiss(user_id, reminder['kind'])
+                    rerun()
+    
+    if fragment is None:
+        inbox()
+    else:
+        # Only this fragment reruns while polling, not the whole page
+        fragment(run_every=60)(inbox)()
+
+def reminder_settings(user_id, profile):
+    service = reminders.get_reminders()
+    current = service.schedules(user_id)
+    water = current.get("water")
+    start = water or current.get("meal")
+    intervals = [60, 90, 120, 180]
+    window = (time(start.start_minute // 60, start.start_minute % 60), time(start.end_minute // 60, start.end_minute % 60)) \
+        if start else (time(8, 0), time(20, 0))
+    # Reminders follow the user's time zone, DST included; the browser's isn't available to the server
+    zones = reminders.timezones()
+    zone = (start and start.timezone) or reminders.local_timezone() or "UTC"
+    
+    with st.expander("Hydration and meal reminders"):
+        with st.form("reminder_settings"):
+            want_water = st.checkbox(f"Remind me to drink water (about {profile.water / 1000:.1f} L a day)",
+                                     value=water is not None)
+            every = st.selectbox("Every", intervals, format_func=lambda m: f"{m // 60} h {m % 60:02d} min",
+                                 index=intervals.index(water.interval_minutes) if water and water.interval_minutes in intervals
+                                 else intervals.index(reminders.DEFAULTS["water"][0]))
+            want_meals = st.checkbox("Remind me to eat regular meals", value="meal" in current)
+            col1, col2 = st.columns(2)
+            with col1:
+                window_start = st.time_input("From", window[0])
+            with col2:
+                window_end = st.time_input("Until", window[1])
+            timezone = st.selectbox("Your time zone", zones, index=zones.index(zone) if zone in zones else 0)
+            
+            if st.form_submit_button("Save reminders"):
+                if window_end <= window_start:
+                    st.error("The reminder window must end after it starts.")
+                    return
+                hours = {"start": window_start.strftime("%H:%M"), "end": window_end.strftime("%H:%M"),
+                         "timezone": timezone}
+                if want_water:
+                    service.schedule_water(user_id, profile.water, interval_minutes=every, **hours)
+                else:
+                    service.cancel(user_id, "water")
+                if want_meals:
+                    service.schedule(user_id, "meal", **hours)
+                else:
+                    service.cancel(user_id, "meal")
+                st.success("Reminders saved.")
+
+@metrics.timed("page", "dashboard")
+def dashboard_page(store):
     st.title(f"Welcome, {st.session_state.username}! 👋")
     
     # Get user profile to check if it's complete
-    profile = get_profile(conn, st.session_state.user_id)
+    profile = get_profile(store, st.session_state.user_id)
     
     if profile:
         st.write("Your nutrition profile is set up! Here's a summary:")
         
-        # Calculate BMI
-        bmi = profile['weight'] / ((profile['height'] / 100) ** 2)
+        bmi = profile.bmi
         bmi_status = "Underweight" if bmi < 18.5 else "Normal" if bmi < 25 else "Overweight" if bmi < 30 else "Obese"
         
         # Display key metrics
@@ -97,54 +133,36 @@ def dashboard_page(conn):
         
         st.write("Visit the profile section to update your information.")
         
+        show_reminders(st.session_state.user_id)
+        reminder_settings(st.session_state.user_id, profile)
+        
         # Show personalized nutrition tips
         st.subheader("Personalized Nutrition Tips")
         
-        # Check if we should use the LLM for tips
-        if "llm_tips" not in st.session_state:
-            st.session_state.llm_tips = None
+        # LLM tips are generated by the background job queue, so the page never waits on the LLM
+        queue = jobs.get_queue()
         
         # Add a refresh button to get new LLM-generated tips
         if st.button("Get Nutrition Advice"):
-            with st.spinner("Generating personalized nutrition tips..."):
-                try:
-                    # Initialize the LLM helper
-                    llm_helper = LLMHelper()
-                    
-                    # Generate the prompt based on the user's profile
-                    prompt = generate_nutrition_prompt(profile)
-                    
-                    # Get the response from the LLM
-                    llm_response = llm_helper.get_response(prompt)
-                    
-                    # Store the response in session state
-                    st.session_state.llm_tips = llm_response
-                except Exception as e:
-                    st.error(f"Error generating nutrition tips: {e}")
-                    st.session_state.llm_tips = None
+            queue.enqueue(st.session_state.user_id, "dashboard_tips", generate_nutrition_prompt(profile), force=True)
         
-        # Display LLM-generated tips if available
-        if st.session_state.llm_tips:
-            st.markdown(st.session_state.llm_tips)
+        job = queue.latest(st.session_state.user_id, "dashboard_tips")
+        if job and job['status'] in jobs.PENDING:
+            jobs.show_pending(job['id'], "Generating personalized nutrition tips...")
+        elif job and job['status'] == 'failed':
+            if job['error'].startswith(("CircuitOpenError", "DeadlineExceeded")):
+                st.warning("AI tips are temporarily unavailable, showing standard tips for your profile instead.")
+            else:
+                st.error(f"Error generating nutrition tips: {job['error']}")
+        
+        # Display the latest LLM-generated tips if available
+        llm_tips = queue.latest_result(st.session_state.user_id, "dashboard_tips")
+        if llm_tips:
+            st.markdown(llm_tips)
             st.caption("Tips generated by AI based on your profile data")
         else:
-            # Fallback to basic tips if LLM isn't used or fails
-            tips = []
-            
-            if profile['is_pregnant']:
-                tips.append("- Ensure adequate folic acid intake for healthy fetal development")
-                tips.append("- Increase calcium consumption for bone health")
-            
-            if profile['age'] > 50:
-                tips.append("- Consider vitamin D and calcium supplements for bone health")
-            
-            if bmi < 18.5:
-                tips.append("- Focus on nutrient-dense foods to reach a healthy weight")
-            elif bmi > 25:
-                tips.append("- Consider balanced portion control while maintaining nutrient intake")
-            
-            if profile['is_regular_cycle'] == 0:
-                tips.append("- Iron-rich foods may help with irregular menstruation")
+            # Fallback to rule-based tips if LLM isn't used or fails
+            tips = get_personalized_tips(profile, bmi)
             
             if tips:
                 for tip in tips:
@@ -0,0 +1,198 @@
+import sqlite3
+
+DB_PATH = 'nutrition_database.db'
+
+# Initialize connection to SQLite database
+def init_db(path=DB_PATH):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    
+    # Create users table if it doesn't exist
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Create profile table if it doesn't exist
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            full_name TEXT NOT NULL,
+            age INTEGER NOT NULL,
+            education TEXT,
+            height REAL NOT NULL,
+            weight REAL NOT NULL,
+            menstruation_date TEXT,
+            is_regular_cycle BOOLEAN,
+            diseases TEXT,
+            food_allergies TEXT,
+            is_pregnant BOOLEAN,
+            pregnancy_week INTEGER,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    # Background LLM generations (see jobs.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            prompt TEXT NOT NULL,
+            prompt_hash TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_user_kind ON jobs (user_id, kind, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+    
+    # One-time sign-in tokens for users created by bulk_import.py without a password
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS invites (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            token_hash TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP,
+            used_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_profiles_user ON profiles (user_id)")
+    
+    # Chat turns spilled out of a session's in-memory history (see session_store.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            session_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (session_id, seq),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    # Recipe catalog; recipe_terms is its inverted index (see recipes.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS recipes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            diet TEXT NOT NULL,
+            servings INTEGER NOT NULL,
+            minutes INTEGER,
+            ingredients TEXT NOT NULL,
+            tags TEXT NOT NULL,
+            instructions TEXT,
+            image_query TEXT,
+            calories REAL,
+            protein_g REAL,
+            carbs_g REAL,
+            fat_g REAL,
+            fiber_g REAL,
+            iron_mg REAL,
+            calcium_mg REAL,
+            folate_ug REAL,
+            vitamin_c_mg REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS recipe_terms (
+            term TEXT NOT NULL,
+            recipe_id INTEGER NOT NULL,
+            PRIMARY KEY (term, recipe_id)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS recipe_term_counts (
+            term TEXT PRIMARY KEY,
+            recipes INTEGER NOT NULL
+        )
+    ''')
+    
+    # Community posts, comments and reactions; like and comment counts are kept
+    # on the post row (see community.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS community_posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_key TEXT NOT NULL,
+            author TEXT NOT NULL,
+            life_stage TEXT NOT NULL,
+            title TEXT NOT NULL,
+            body TEXT NOT NULL,
+            like_count INTEGER NOT NULL DEFAULT 0,
+            comment_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_community_posts_stage ON community_posts (life_stage, id)")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS community_comments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_id INTEGER NOT NULL,
+            user_key TEXT NOT NULL,
+            author TEXT NOT NULL,
+            body TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (post_id) REFERENCES community_posts (id)
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_community_comments_post ON community_comments (post_id, id)")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS community_reactions (
+            post_id INTEGER NOT NULL,
+            user_key TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (post_id, user_key)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Hydration and meal reminders (see reminders.py); times are Unix seconds.
+    # A cancelled schedule keeps its row with no next_fire_at, and updated_at
+    # lets the worker pick up changes made by other processes. The inbox keeps
+    # the latest undismissed reminder of each kind per user.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS reminder_schedules (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            interval_minutes INTEGER NOT NULL,
+            start_minute INTEGER NOT NULL,
+            end_minute INTEGER NOT NULL,
+            utc_offset_minutes INTEGER NOT NULL DEFAULT 0,
+            timezone TEXT,
+            amount_ml INTEGER,
+            next_fire_at INTEGER,
+            updated_at INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, kind),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_reminder_schedules_updated ON reminder_schedules (updated_at)")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS reminder_inbox (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            message TEXT NOT NULL,
+            fire_at INTEGER NOT NULL,
+            PRIMARY KEY (user_id, kind)
+        ) WITHOUT ROWID
+    ''')
+    
+    conn.commit()
+    return conn
@@ -0,0 +1,144 @@
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+from profile_model import PREGNANCY_CALORIES
+
+# Dietary reference intakes for women and girls.
+#
+# Every combination of age band, pregnancy week (0 = not pregnant, 1-42),
+# lactation stage and menopausal stage is worked out once into a numpy grid
+# of shape (age bands, 43, lactation stages, menopause stages, nutrients).
+# Looking up a profile's targets is then a handful of array indexes, and a
+# batch of profiles is one fancy-indexing operation.
+#
+# Values are the US/Canadian RDAs (AIs where no RDA exists) for females; see
+# BASE_INTAKES, PREGNANCY_INTAKES and LACTATION_INTAKES. Pregnancy and
+# lactation only change energy by stage; micronutrient targets are the same
+# for every week. Iron follows menstruation: 18 mg while menstruating from
+# age 19, 8 mg after menopause, whatever the age band.
+
+NUTRIENTS = ("iron_mg", "folate_ug", "calcium_mg", "vitamin_d_ug", "iodine_ug", "vitamin_b12_ug",
+             "choline_mg", "zinc_mg", "magnesium_mg", "vitamin_c_mg", "vitamin_a_ug", "extra_kcal")
+LABELS = {"iron_mg": ("Iron", "mg"), "folate_ug": ("Folate", "µg DFE"), "calcium_mg": ("Calcium", "mg"),
+          "vitamin_d_ug": ("Vitamin D", "µg"), "iodine_ug": ("Iodine", "µg"), "vitamin_b12_ug": ("Vitamin B12", "µg"),
+          "choline_mg": ("Choline", "mg"), "zinc_mg": ("Zinc", "mg"), "magnesium_mg": ("Magnesium", "mg"),
+          "vitamin_c_mg": ("Vitamin C", "mg"), "vitamin_a_ug": ("Vitamin A", "µg RAE"),
+          "extra_kcal": ("Extra energy", "kcal")}
+
+# First age of each band
+AGE_BANDS = (1, 4, 9, 14, 19, 31, 51, 71)
+MAX_AGE = 120
+MAX_PREGNANCY_WEEK = 42
+LACTATION_STAGES = ("none", "0-6 months", "7-12 months")
+MENOPAUSE_STAGES = ("premenopausal", "perimenopausal", "postmenopausal")
+
+# Non-pregnant, non-lactating intakes per age band (extra_kcal 0)
+BASE_INTAKES = {
+    1:  (7, 150, 700, 15, 90, 0.9, 200, 3, 80, 15, 300),
+    4:  (10, 200, 1000, 15, 90, 1.2, 250, 5, 130, 25, 400),
+    9:  (8, 300, 1300, 15, 120, 1.8, 375, 8, 240, 45, 600),
+    14: (15, 400, 1300, 15, 150, 2.4, 400, 9, 360, 65, 700),
+    19: (18, 400, 1000, 15, 150, 2.4, 425, 8, 310, 75, 700),
+    31: (18, 400, 1000, 15, 150, 2.4, 425, 8, 320, 75, 700),
+    51: (8, 400, 1200, 15, 150, 2.4, 425, 8, 320, 75, 700),
+    71: (8, 400, 1200, 20, 150, 2.4, 425, 8, 320, 75, 700),
+}
+# Pregnancy and lactation intakes are given for ages 14-18, 19-30 and 31-50;
+# younger and older bands use the nearest of these
+PREGNANCY_INTAKES = {
+    14: (27, 600, 1300, 15, 220, 2.6, 450, 12, 400, 80, 750),
+    19: (27, 600, 1000, 15, 220, 2.6, 450, 11, 350, 85, 770),
+    31: (27, 600, 1000, 15, 220, 2.6, 450, 11, 360, 85, 770),
+}
+LACTATION_INTAKES = {
+    14: (10, 500, 1300, 15, 290, 2.8, 550, 13, 360, 115, 1200),
+    19: (9, 500, 1000, 15, 290, 2.8, 550, 12, 310, 120, 1300),
+    31: (9, 500, 1000, 15, 290, 2.8, 550, 12, 320, 120, 1300),
+}
+LACTATION_CALORIES = (0, 330, 400)
+POSTMENOPAUSAL_IRON = 8
+POSTMENOPAUSAL_CALCIUM = 1200
+
+
+def _cell(band: int, week: int, lactation: int, menopause: int) -> np.ndarray:
+    """Targets for one combination of stages; pregnancy takes precedence over lactation and menopause."""
+    start = AGE_BANDS[band]
+    reproductive = min(max(start, 14), 31)
+    if week:
+        values = PREGNANCY_INTAKES[reproductive] + (PREGNANCY_CALORIES[0 if week <= 13 else 1 if week <= 26 else 2],)
+        return np.array(values, dtype=np.float64)
+    if lactation:
+        return np.array(LACTATION_INTAKES[reproductive] + (LACTATION_CALORIES[lactation],), dtype=np.float64)
+    values = np.array(BASE_INTAKES[start] + (0,), dtype=np.float64)
+    if start >= 19:
+        postmenopausal = MENOPAUSE_STAGES[menopause] == "postmenopausal"
+        values[NUTRIENTS.index("iron_mg")] = POSTMENOPAUSAL_IRON if postmenopausal else 18
+        if postmenopausal:
+            values[NUTRIENTS.index("calcium_mg")] = max(values[NUTRIENTS.index("calcium_mg")], POSTMENOPAUSAL_CALCIUM)
+    return values
+
+
+class ReferenceIntakes:
+    """Micronutrient targets looked up from the precomputed grid."""
+
+    def __init__(self):
+        shape = (len(AGE_BANDS), MAX_PREGNANCY_WEEK + 1, len(LACTATION_STAGES), len(MENOPAUSE_STAGES), len(NUTRIENTS))
+        self.grid = np.empty(shape, dtype=np.float64)
+        for band in range(shape[0]):
+            for week in range(shape[1]):
+                for lactation in range(shape[2]):
+                    for menopause in range(shape[3]):
+                        self.grid[band, week, lactation, menopause] = _cell(band, week, lactation, menopause)
+        self.grid.flags.writeable = False
+        # Age in whole years -> age band
+        self.age_index = np.searchsorted(AGE_BANDS, np.arange(MAX_AGE + 1), side="right").clip(1) - 1
+
+    @staticmethod
+    def default_menopause(age: int) -> int:
+        """Menopausal stage assumed when none is given: postmenopausal from 51."""
+        return MENOPAUSE_STAGES.index("postmenopausal" if age >= 51 else "premenopausal")
+
+    def vector(self, age: int, pregnancy_week: int = 0, lactation: int = 0,
+               menopause: Optional[int] = None) -> np.ndarray:
+        """Targets for one person, in NUTRIENTS order (a read-only view into the grid)."""
+        age = min(max(int(age), 0), MAX_AGE)
+        if menopause is None:
+            menopause = self.default_menopause(age)
+        week = min(max(int(pregnancy_week or 0), 0), MAX_PREGNANCY_WEEK)
+        return self.grid[self.age_index[age], week, lactation, menopause]
+
+    def targets(self, age: int, pregnancy_week: int = 0, lactation: int = 0,
+                menopause: Optional[int] = None) -> Dict[str, float]:
+        return dict(zip(NUTRIENTS, self.vector(age, pregnancy_week, lactation, menopause).tolist()))
+
+    def for_profile(self, profile) -> Dict[str, float]:
+        return self.targets(profile['age'], profile['pregnancy_week'] if profile['is_pregnant'] else 0)
+
+    def batch(self, ages, pregnancy_weeks=None, lactation=None, menopause=None) -> np.ndarray:
+        """
+        Targets for many people at once: an array of shape (n, len(NUTRIENTS)).
+        Arguments are array-likes of the same length; omitted stages default as in vector().
+        """
+        ages = np.clip(np.asarray(ages, dtype=np.int64), 0, MAX_AGE)
+        weeks = np.zeros_like(ages) if pregnancy_weeks is None else \
+            np.clip(np.asarray(pregnancy_weeks, dtype=np.int64), 0, MAX_PREGNANCY_WEEK)
+        lactation = np.zeros_like(ages) if lactation is None else np.asarray(lactation, dtype=np.int64)
+        if menopause is None:
+            menopause = np.where(ages >= 51, MENOPAUSE_STAGES.index("postmenopausal"),
+                                 MENOPAUSE_STAGES.index("premenopausal"))
+        return self.grid[self.age_index[ages], weeks, lactation, np.asarray(menopause, dtype=np.int64)]
+
+
+_intakes: Optional[ReferenceIntakes] = None
+_intakes_lock = threading.Lock()
+
+
+def get_reference_intakes() -> ReferenceIntakes:
+    global _intakes
+    if _intakes is None:
+        with _intakes_lock:
+            if _intakes is None:
+                _intakes = ReferenceIntakes()
+    return _intakes
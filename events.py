@@ -0,0 +1,41 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+# Minimal in-process publish/subscribe.
+#
+# Lets data-layer functions like save_profile announce a change without knowing
+# what reacts to it. Handlers run synchronously in the publishing thread, so
+# they should only schedule work, never do it.
+
+logger = logging.getLogger("events")
+
+PROFILE_CHANGED = "profile_changed"
+
+_handlers: Dict[str, List[Callable[..., Any]]] = defaultdict(list)
+_lock = threading.Lock()
+
+
+def subscribe(event: str, handler: Callable[..., Any]) -> None:
+    """Call `handler(**payload)` every time `event` is published. Subscribing twice is a no-op."""
+    with _lock:
+        if handler not in _handlers[event]:
+            _handlers[event].append(handler)
+
+
+def unsubscribe(event: str, handler: Callable[..., Any]) -> None:
+    with _lock:
+        if handler in _handlers[event]:
+            _handlers[event].remove(handler)
+
+
+def publish(event: str, **payload: Any) -> None:
+    """Notify every subscriber of `event`. A failing handler is logged and doesn't affect the others."""
+    with _lock:
+        handlers = list(_handlers[event])
+    for handler in handlers:
+        try:
+            handler(**payload)
+        except Exception as e:
+            logger.error(f"Handler {getattr(handler, '__name__', handler)} for {event} failed: {e}")
@@ -0,0 +1,225 @@
+"""
+Export profiles and app tables to partitioned Parquet.
+
+Rows are streamed from SQLite with fetchmany in bounded batches, converted
+to Arrow record batches and appended to one Parquet writer per partition, so
+memory use depends on the batch size rather than the table size. Profiles
+get derived columns (BMI, BMI status, daily calories, macros, water and
+micronutrient reference intakes) computed in the same pass with the app's
+own formulas.
+
+Output layout (Hive-style partitions, readable by pandas, Spark, DuckDB...):
+
+    OUT/profiles/age_band=30-39/part-0.parquet
+    OUT/jobs/part-0.parquet
+
+Usage:
+    python export_parquet.py --out export/ [--db nutrition_database.db] [--batch-size 10000]
+                             [--partition-by age_band|bmi_status|is_pregnant|none]
+                             [--tables profiles,jobs] [--include-pii]
+"""
+import argparse
+import os
+import resource
+import shutil
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, only needed for exports
+    pa = pc = pq = None
+
+from database import DB_PATH
+from dri import NUTRIENTS, get_reference_intakes
+from profile_model import calculate_calories, calculate_macros, water_intake
+
+# Exported next to profiles when they exist in the database
+EXTRA_TABLES = ("jobs", "chat_messages", "meals", "meal_plans")
+# Free-text columns that identify a person; left out unless --include-pii
+PII_COLUMNS = {"full_name", "username", "email", "password"}
+# Free text that carries a user's health details (prompts embed the profile,
+# chat turns are the user's own questions); also left out unless --include-pii
+TABLE_PII_COLUMNS = {
+    "jobs": {"prompt", "result"},
+    "chat_messages": {"content"},
+}
+PARTITIONS = ("age_band", "bmi_status", "is_pregnant", "none")
+
+SQLITE_TYPES = {"INTEGER": "int64", "INT": "int64", "REAL": "float64", "FLOAT": "float64",
+                "BOOLEAN": "bool", "BLOB": "binary"}
+
+
+def arrow_type(declared):
+    """Arrow type for a SQLite declared column type (anything unknown is exported as text)."""
+    return pa.type_for_alias(SQLITE_TYPES.get((declared or "").upper(), "string"))
+
+
+def table_columns(conn, table):
+    return [(row[1], row[2]) for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def bmi_status(bmi):
+    return "Underweight" if bmi < 18.5 else "Normal" if bmi < 25 else "Overweight" if bmi < 30 else "Obese"
+
+
+def age_band(age):
+    low = (age // 10) * 10
+    return f"{low}-{low + 9}"
+
+
+DERIVED_FIELDS = [
+    ("bmi", "float64"), ("bmi_status", "string"), ("age_band", "string"),
+    ("calories", "int64"), ("carbohydrates_g", "float64"), ("proteins_g", "float64"),
+    ("fats_g", "float64"), ("water_ml", "float64"),
+] + [(nutrient, "float64") for nutrient in NUTRIENTS]
+
+
+def derive(row):
+    """Derived metrics for one profile row (a dict), using the nutrition page's formulas."""
+    bmi = row["weight"] / ((row["height"] / 100) ** 2) if row["height"] else None
+    if bmi is None:
+        return {"bmi": None, "bmi_status": None, "age_band": age_band(row["age"]), "calories": None,
+                "carbohydrates_g": None, "proteins_g": None, "fats_g": None, "water_ml": water_intake(row["weight"])}
+    calories = calculate_calories(row["age"], bmi)
+    macros = calculate_macros(calories)
+    return {
+        "bmi": round(bmi, 2), "bmi_status": bmi_status(bmi), "age_band": age_band(row["age"]),
+        "calories": calories, "carbohydrates_g": round(macros["Carbohydrates"], 1),
+        "proteins_g": round(macros["Proteins"], 1), "fats_g": round(macros["Fats"], 1),
+        "water_ml": water_intake(row["weight"]),
+    }
+
+
+class PartitionedWriter:
+    """One ParquetWriter per partition value, opened on first use."""
+
+    def __init__(self, directory, schema, partition_by=None):
+        self.directory = Path(directory)
+        self.schema = schema
+        self.partition_by = partition_by
+        self._writers = {}
+        self.rows = 0
+
+    def _writer(self, value):
+        writer = self._writers.get(value)
+        if writer is None:
+            directory = self.directory
+            if self.partition_by:
+                directory = directory / f"{self.partition_by}={value}"
+            directory.mkdir(parents=True, exist_ok=True)
+            writer = self._writers[value] = pq.ParquetWriter(directory / "part-0.parquet", self.schema,
+                                                             compression="zstd")
+        return writer
+
+    def write(self, batch):
+        self.rows += batch.num_rows
+        if not self.partition_by:
+            self._writer(None).write_batch(batch)
+            return
+        table = pa.Table.from_batches([batch])
+        column = table.column(self.partition_by)
+        for value in column.unique().to_pylist():
+            mask = pc.is_null(column) if value is None else pc.equal(column, value)
+            self._writer(value).write_table(table.filter(mask))
+
+    @property
+    def files(self):
+        return len(self._writers)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+
+
+def export_table(conn, table, out_dir, batch_size, partition_by=None, include_pii=False):
+    """Stream one table to Parquet; profiles also get their derived columns. Returns (rows, files)."""
+    excluded = set() if include_pii else PII_COLUMNS | TABLE_PII_COLUMNS.get(table, set())
+    columns = [(name, declared) for name, declared in table_columns(conn, table) if name not in excluded]
+    fields = [pa.field(name, arrow_type(declared)) for name, declared in columns]
+    derived = table == "profiles"
+    if derived:
+        fields += [pa.field(name, pa.type_for_alias(alias)) for name, alias in DERIVED_FIELDS]
+    schema = pa.schema(fields)
+    if partition_by and partition_by not in schema.names:
+        partition_by = None
+
+    target = Path(out_dir) / table
+    if target.exists():
+        shutil.rmtree(target)
+    writer = PartitionedWriter(target, schema, partition_by)
+    names = [name for name, _ in columns]
+    cursor = conn.execute(f"SELECT {', '.join(names)} FROM {table} ORDER BY rowid")
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            data = {name: [row[i] for row in rows] for i, name in enumerate(names)}
+            if derived:
+                extra = [derive(dict(zip(names, row))) for row in rows]
+                for name, _ in DERIVED_FIELDS[:-len(NUTRIENTS)]:
+                    data[name] = [values[name] for values in extra]
+                # Reference intakes for the whole batch in one lookup
+                weeks = [(week or 0) if pregnant else 0
+                         for week, pregnant in zip(data["pregnancy_week"], data["is_pregnant"])]
+                intakes = get_reference_intakes().batch([age or 0 for age in data["age"]], weeks)
+                for i, nutrient in enumerate(NUTRIENTS):
+                    data[nutrient] = intakes[:, i]
+            for field in schema:
+                # SQLite stores booleans as 0/1
+                if pa.types.is_boolean(field.type):
+                    data[field.name] = [None if v is None else bool(v) for v in data[field.name]]
+            writer.write(pa.RecordBatch.from_pydict(data, schema=schema))
+    finally:
+        writer.close()
+    return writer.rows, writer.files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export profiles and app tables to partitioned Parquet.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="rows fetched and written per batch")
+    parser.add_argument("--partition-by", choices=PARTITIONS, default="age_band", help="profiles partition column")
+    parser.add_argument("--tables", default=None, help="comma-separated tables (default: profiles plus any present "
+                                                       f"of {', '.join(EXTRA_TABLES)})")
+    parser.add_argument("--include-pii", action="store_true", help="also export names, contact details, "
+                                                                  "LLM prompts and results and chat messages")
+    args = parser.parse_args(argv)
+
+    if pa is None:
+        print("export_parquet needs pyarrow: pip install pyarrow", file=sys.stderr)
+        return 1
+    if not os.path.exists(args.db):
+        print(f"No database at {args.db}", file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if args.tables:
+        tables = [t.strip() for t in args.tables.split(",") if t.strip()]
+        missing = [t for t in tables if t not in existing]
+        if missing:
+            parser.error(f"no such tables: {missing}")
+    else:
+        tables = [t for t in ("profiles", *EXTRA_TABLES) if t in existing]
+
+    partition_by = None if args.partition_by == "none" else args.partition_by
+    for table in tables:
+        start = time.perf_counter()
+        rows, files = export_table(conn, table, args.out, args.batch_size,
+                                   partition_by if table == "profiles" else None, args.include_pii)
+        print(f"{table}: {rows} rows in {files} files, {time.perf_counter() - start:.1f}s")
+    conn.close()
+    # ru_maxrss is in KiB on Linux
+    print(f"peak memory: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
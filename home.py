@@ -1,8 +1,14 @@
 import streamlit as st
-from PIL import Image
 import pandas as pd
 import random
 import base64
+import re
+import uuid
+from pathlib import Path
+
+from community import LIFE_STAGES, PAGE_SIZE as POSTS_PER_PAGE, get_community
+from image_prefetch import get_prefetcher, thumbnail
+from recipes import DIETS, NUTRIENTS, PAGE_SIZE, TAGS, get_recipe_store
 
 # Set page configuration
 st.set_page_config(
@@ -12,77 +18,150 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Local asset bundle, served instead of remote placeholder images
+ASSETS_DIR = Path(__file__).parent / "assets"
+
+# Size (width, height) each bundled image is served at. The main column is
+# about 800px wide, so images are prepared at 1.5x for high-density screens.
+IMAGE_SIZES = {
+    "hero.jpg": (1200, 600),
+}
+
 # Custom CSS for styling
+CSS = """
+<style>
+    .main {
+        background-color: #fff9f9;
+    }
+    .stApp {
+        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+    }
+    h1, h2, h3 {
+        color: #ff6b6b;
+    }
+    .quote-container {
+        background: linear-gradient(135deg, #ff6b6b, #ff9a8b);
+        padding: 20px;
+        border-radius: 10px;
+        color: white;
+        text-align: center;
+        margin: 10px 0;
+    }
+    .quote-text {
+        font-style: italic;
+        font-size: 1.2em;
+    }
+    .quote-author {
+        font-weight: bold;
+        margin-top: 10px;
+    }
+    .feature-card {
+        background-color: white;
+        padding: 20px;
+        border-radius: 10px;
+        box-shadow: 0 4px 8px rgba(0,0,0,0.1);
+        margin: 10px 0;
+        text-align: center;
+        height: 100%;
+    }
+    .centered {
+        text-align: center;
+    }
+    .button-style {
+        background-color: #4ecdc4;
+        color: white;
+        padding: 0.5em 1em;
+        border-radius: 50px;
+        text-decoration: none;
+        font-weight: bold;
+        border: none;
+        cursor: pointer;
+    }
+    .stButton>button {
+        background-color: #4ecdc4;
+        color: white;
+        font-weight: bold;
+        border-radius: 50px;
+        border: none;
+        padding: 0.5em 2em;
+    }
+    .stTextInput>div>div>input {
+        border-radius: 50px;
+    }
+    .footer {
+        text-align: center;
+        margin-top: 50px;
+        padding: 20px;
+        color: #666;
+        border-top: 1px solid #eee;
+    }
+</style>
+"""
+
+QUOTES = [
+    {"text": "The food you eat can be either the safest and most powerful form of medicine or the slowest form of poison.", "author": "Ann Wigmore"},
+    {"text": "Your body is a temple, but only if you treat it as one.", "author": "Astrid Alauda"},
+    {"text": "Take care of your body. It's the only place you have to live.", "author": "Jim Rohn"},
+    {"text": "Nourishing yourself in a way that helps you blossom in the direction you want to go is attainable, and you are worth the effort.", "author": "Deborah Day"},
+    {"text": "The greatest wealth is health.", "author": "Virgil"},
+    {"text": "The journey of a thousand miles begins with a single step.", "author": "Lao Tzu"},
+    {"text": "A woman is the full circle. Within her is the power to create, nurture and transform.", "author": "Diane Mariechild"}
+]
+
+# Feature cards, one list per column
+FEATURES = [
+    [
+        ("Personalized Nutrition", "Get customized meal plans and nutrition advice based on your life stage, health goals, and unique needs."),
+        ("Expert Guidance", "Connect with registered dietitians and women's health specialists for evidence-based recommendations."),
+    ],
+    [
+        ("Delicious Recipes", "Access hundreds of nutrient-dense recipes designed specifically for women's health needs."),
+        ("Supportive Community", "Join thousands of women sharing their health journeys, challenges, and victories."),
+    ],
+]
+
+TESTIMONIALS = [
+    ("This program helped me navigate the nutritional challenges of pregnancy. I've never felt healthier or more energetic!", "Sarah, 32, Expectant Mother"),
+    ("The personalized approach to menopause nutrition has been life-changing. My symptoms have significantly reduced.", "Linda, 51, Business Owner"),
+    ("As a college athlete, I needed specific nutrition guidance. This platform delivered exactly what I needed to perform my best.", "Maya, 20, Student Athlete"),
+]
+
+def minify_css(css):
+    """Collapse the whitespace in a CSS block."""
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};:,>])\s*", r"\1", css).strip()
+
+@st.cache_resource
+def landing_content():
+    """Render the static landing page HTML once per process."""
+    return {
+        "css": minify_css(CSS),
+        "quotes": [
+            f'<div class="quote-container"><div class="quote-text">"{quote["text"]}"</div>'
+            f'<div class="quote-author">— {quote["author"]}</div></div>'
+            for quote in QUOTES
+        ],
+        "features": [
+            "".join(f'<div class="feature-card"><h3>{title}</h3><p>{text}</p></div>' for title, text in column)
+            for column in FEATURES
+        ],
+        "testimonials": [
+            f'<div class="feature-card"><p>"{text}"</p><p>— {author}</p></div>'
+            for text, author in TESTIMONIALS
+        ],
+        "footer": (
+            '<div class="footer"><p>© 2025 NourishHer. All rights reserved.</p>'
+            "<p>Created with ❤ for women's health and nutrition</p></div>"
+        ),
+    }
+
+@st.cache_resource
+def load_image(name):
+    """Load a bundled image once per process, cropped and resized to its display size."""
+    return thumbnail((ASSETS_DIR / name).read_bytes(), IMAGE_SIZES[name], "JPEG", quality=85)
+
 def local_css():
-    st.markdown("""
-    <style>
-        .main {
-            background-color: #fff9f9;
-        }
-        .stApp {
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-        }
-        h1, h2, h3 {
-            color: #ff6b6b;
-        }
-        .quote-container {
-            background: linear-gradient(135deg, #ff6b6b, #ff9a8b);
-            padding: 20px;
-            border-radius: 10px;
-            color: white;
-            text-align: center;
-            margin: 10px 0;
-        }
-        .quote-text {
-            font-style: italic;
-            font-size: 1.2em;
-        }
-        .quote-author {
-            font-weight: bold;
-            margin-top: 10px;
-        }
-        .feature-card {
-            background-color: white;
-            padding: 20px;
-            border-radius: 10px;
-            box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-            margin: 10px 0;
-            text-align: center;
-            height: 100%;
-        }
-        .centered {
-            text-align: center;
-        }
-        .button-style {
-            background-color: #4ecdc4;
-            color: white;
-            padding: 0.5em 1em;
-            border-radius: 50px;
-            text-decoration: none;
-            font-weight: bold;
-            border: none;
-            cursor: pointer;
-        }
-        .stButton>button {
-            background-color: #4ecdc4;
-            color: white;
-            font-weight: bold;
-            border-radius: 50px;
-            border: none;
-            padding: 0.5em 2em;
-        }
-        .stTextInput>div>div>input {
-            border-radius: 50px;
-        }
-        .footer {
-            text-align: center;
-            margin-top: 50px;
-            padding: 20px;
-            color: #666;
-            border-top: 1px solid #eee;
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(landing_content()["css"], unsafe_allow_html=True)
 
 local_css()
 
@@ -94,14 +173,14 @@ with st.sidebar:
     # Navigation options
     st.header("Navigation")
     nav_options = ["Home", "Personalized Plan", "Life Stages", "Recipes", "Community", "About Us"]
-    selected_nav = st.radio("", nav_options)
+    selected_nav = st.radio("Navigation", nav_options, label_visibility="collapsed")
     
     st.header("Quick Health Check")
     age = st.number_input("Age", min_value=10, max_value=100, value=30)
     
     life_stage = st.selectbox(
         "Life Stage",
-        ["Adolescence", "Adult", "Pregnancy", "Postpartum", "Perimenopause", "Menopause", "Post-menopause"]
+        LIFE_STAGES
     )
     
     health_goals = st.multiselect(
@@ -118,32 +197,17 @@ def home():
     st.markdown("<h1 class='centered'>Nutrition Personalized for Every Stage of Womanhood</h1>", unsafe_allow_html=True)
     st.markdown("<p class='centered'>From puberty to pregnancy, motherhood to menopause — we're here to support your unique nutritional needs at every step of your journey.</p>", unsafe_allow_html=True)
     
-    # Placeholder for hero image - you would replace this with a real image
+    # Hero image from the local asset bundle
+    content = landing_content()
     col1, col2, col3 = st.columns([1, 10, 1])
     with col2:
-        st.image("https://via.placeholder.com/800x400?text=Women+at+Different+Life+Stages", use_column_width=True)
+        st.image(load_image("hero.jpg"), use_column_width=True)
     
     # Motivational quote carousel
     st.markdown("<h2 class='centered'>Words That Inspire</h2>", unsafe_allow_html=True)
     
-    quotes = [
-        {"text": "The food you eat can be either the safest and most powerful form of medicine or the slowest form of poison.", "author": "Ann Wigmore"},
-        {"text": "Your body is a temple, but only if you treat it as one.", "author": "Astrid Alauda"},
-        {"text": "Take care of your body. It's the only place you have to live.", "author": "Jim Rohn"},
-        {"text": "Nourishing yourself in a way that helps you blossom in the direction you want to go is attainable, and you are worth the effort.", "author": "Deborah Day"},
-        {"text": "The greatest wealth is health.", "author": "Virgil"},
-        {"text": "The journey of a thousand miles begins with a single step.", "author": "Lao Tzu"},
-        {"text": "A woman is the full circle. Within her is the power to create, nurture and transform.", "author": "Diane Mariechild"}
-    ]
-    
     # Display random quote
-    quote = random.choice(quotes)
-    st.markdown(f"""
-    <div class="quote-container">
-        <div class="quote-text">"{quote['text']}"</div>
-        <div class="quote-author">— {quote['author']}</div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(random.choice(content["quotes"]), unsafe_allow_html=True)
     
     if st.button("Show Another Quote"):
         st.experimental_rerun()
@@ -151,37 +215,9 @@ def home():
     # Features section
     st.markdown("<h2 class='centered'>How We Support You</h2>", unsafe_allow_html=True)
     
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("""
-        <div class="feature-card">
-            <h3>Personalized Nutrition</h3>
-            <p>Get customized meal plans and nutrition advice based on your life stage, health goals, and unique needs.</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown("""
-        <div class="feature-card">
-            <h3>Expert Guidance</h3>
-            <p>Connect with registered dietitians and women's health specialists for evidence-based recommendations.</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown("""
-        <div class="feature-card">
-            <h3>Delicious Recipes</h3>
-            <p>Access hundreds of nutrient-dense recipes designed specifically for women's health needs.</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown("""
-        <div class="feature-card">
-            <h3>Supportive Community</h3>
-            <p>Join thousands of women sharing their health journeys, challenges, and victories.</p>
-        </div>
-        """, unsafe_allow_html=True)
+    for col, cards in zip(st.columns(2), content["features"]):
+        with col:
+            st.markdown(cards, unsafe_allow_html=True)
     
     # Start your journey section
     st.markdown("<h2 class='centered'>Start Your Health Journey Today</h2>", unsafe_allow_html=True)
@@ -206,7 +242,7 @@ def home():
         
         life_stage = st.selectbox(
             "Life Stage",
-            ["Adolescence", "Adult", "Pregnancy", "Postpartum", "Perimenopause", "Menopause", "Post-menopause"]
+            LIFE_STAGES
         )
         
         submitted = st.form_submit_button("Create My Plan")
@@ -216,43 +252,158 @@ def home():
     # Testimonials
     st.markdown("<h2 class='centered'>Stories from Our Community</h2>", unsafe_allow_html=True)
     
-    col1, col2, col3 = st.columns(3)
+    for col, testimonial in zip(st.columns(3), content["testimonials"]):
+        with col:
+            st.markdown(testimonial, unsafe_allow_html=True)
     
-    with col1:
-        st.markdown("""
-        <div class="feature-card">
-            <p>"This program helped me navigate the nutritional challenges of pregnancy. I've never felt healthier or more energetic!"</p>
-            <p>— Sarah, 32, Expectant Mother</p>
-        </div>
-        """, unsafe_allow_html=True)
+    # Footer
+    st.markdown(content["footer"], unsafe_allow_html=True)
+
+def recipes_page():
+    st.markdown("<h1 class='centered'>Recipes</h1>", unsafe_allow_html=True)
     
+    with st.form("recipe_search"):
+        col1, col2 = st.columns(2)
+        with col1:
+            diets = st.multiselect("Diet", DIETS)
+            tags = st.multiselect("Tags", TAGS)
+            ingredients = st.text_input("Ingredients", placeholder="e.g. spinach, lentils")
+        with col2:
+            min_protein = st.number_input("Protein at least (g per serving)", min_value=0, max_value=100, value=0)
+            min_iron = st.number_input("Iron at least (mg per serving)", min_value=0.0, max_value=30.0, value=0.0)
+            max_calories = st.number_input("Calories at most (0 for any)", min_value=0, max_value=2000, value=0)
+        if st.form_submit_button("Search"):
+            st.session_state.recipe_filters = {
+                "diets": diets, "tags": tags, "ingredients": ingredients.split(","),
+                "min_nutrients": {k: v for k, v in (("protein_g", min_protein), ("iron_mg", min_iron)) if v},
+                "max_nutrients": {"calories": max_calories} if max_calories else {},
+            }
+            # Cursors of the pages seen so far, for Previous
+            st.session_state.recipe_pages = [None]
+    
+    search = st.session_state.get("recipe_filters", {})
+    pages = st.session_state.setdefault("recipe_pages", [None])
+    results, next_cursor = get_recipe_store().search(after=pages[-1], limit=PAGE_SIZE, **search)
+    if not results:
+        st.info("No recipes match your search.")
+        return
+    
+    # Thumbnails for the whole page are fetched together; any not ready in time are left out
+    images = get_prefetcher().images({recipe["image_query"] for recipe in results if recipe["image_query"]},
+                                     320, timeout=0.5)
+    for recipe in results:
+        image_col, text_col = st.columns([1, 3])
+        with image_col:
+            if images.get(recipe["image_query"]):
+                st.image(images[recipe["image_query"]], use_column_width=True)
+        with text_col:
+            st.subheader(recipe["title"])
+            st.caption(f"{recipe['diet']} · {recipe['minutes']} min · serves {recipe['servings']} · "
+                       f"{', '.join(recipe['tags'])}")
+            cols = st.columns(4)
+            for col, nutrient in zip(cols, ("calories", "protein_g", "iron_mg", "fiber_g")):
+                label, unit = NUTRIENTS[nutrient]
+                col.metric(label, f"{recipe[nutrient]:g} {unit}")
+            with st.expander("Ingredients and method"):
+                st.write(", ".join(recipe["ingredients"]))
+                st.write(recipe["instructions"])
+    
+    col1, _, col2 = st.columns([1, 4, 1])
+    with col1:
+        if len(pages) > 1 and st.button("← Previous"):
+            pages.pop()
+            st.experimental_rerun()
     with col2:
-        st.markdown("""
-        <div class="feature-card">
-            <p>"The personalized approach to menopause nutrition has been life-changing. My symptoms have significantly reduced."</p>
-            <p>— Linda, 51, Business Owner</p>
-        </div>
-        """, unsafe_allow_html=True)
+        if next_cursor is not None and st.button("Next →"):
+            pages.append(next_cursor)
+            st.experimental_rerun()
+
+def community_page():
+    st.markdown("<h1 class='centered'>Community</h1>", unsafe_allow_html=True)
+    community = get_community()
+    # Likes and posts are tied to this browser session
+    user_key = st.session_state.setdefault("community_user", f"session:{uuid.uuid4().hex}")
     
-    with col3:
-        st.markdown("""
-        <div class="feature-card">
-            <p>"As a college athlete, I needed specific nutrition guidance. This platform delivered exactly what I needed to perform my best."</p>
-            <p>— Maya, 20, Student Athlete</p>
-        </div>
-        """, unsafe_allow_html=True)
+    with st.expander("Share something with the community"):
+        with st.form("community_post", clear_on_submit=True):
+            author = st.text_input("Your name", value=st.session_state.get("community_author", ""))
+            stage = st.selectbox("Life stage", LIFE_STAGES)
+            title = st.text_input("Title")
+            body = st.text_area("What would you like to share?")
+            if st.form_submit_button("Post"):
+                if author.strip() and title.strip() and body.strip():
+                    st.session_state.community_author = author.strip()
+                    community.add_post(user_key, author.strip(), stage, title.strip(), body.strip())
+                    st.session_state.community_pages = [None]
+                    st.success("Posted!")
+                else:
+                    st.warning("Please add your name, a title and a message.")
     
-    # Footer
-    st.markdown("""
-    <div class="footer">
-        <p>© 2025 NourishHer. All rights reserved.</p>
-        <p>Created with ❤ for women's health and nutrition</p>
-    </div>
-    """, unsafe_allow_html=True)
+    stage_filter = st.selectbox("Show posts from", ["All life stages"] + LIFE_STAGES, key="community_stage")
+    if st.session_state.get("community_pages_stage") != stage_filter:
+        st.session_state.community_pages_stage = stage_filter
+        st.session_state.community_pages = [None]
+    pages = st.session_state.setdefault("community_pages", [None])
+    posts, next_cursor = community.feed(None if stage_filter == "All life stages" else stage_filter,
+                                        after=pages[-1], limit=POSTS_PER_PAGE)
+    if not posts:
+        st.info("No posts yet. Be the first to share!")
+        return
+    
+    liked = community.liked(user_key, [post["id"] for post in posts])
+    for post in posts:
+        st.markdown(f"#### {post['title']}")
+        st.caption(f"{post['author']} · {post['life_stage']} · {str(post['created_at'])[:16]}")
+        st.write(post["body"])
+        col1, col2, _ = st.columns([1, 1, 4])
+        with col1:
+            if post["id"] in liked:
+                if st.button(f"💗 {post['like_count']}", key=f"unlike_{post['id']}"):
+                    community.unlike(post["id"], user_key)
+                    st.experimental_rerun()
+            elif st.button(f"🤍 {post['like_count']}", key=f"like_{post['id']}"):
+                community.like(post["id"], user_key)
+                st.experimental_rerun()
+        with col2:
+            if st.button(f"💬 {post['comment_count']}", key=f"comments_{post['id']}"):
+                st.session_state.community_open = None if st.session_state.get("community_open") == post["id"] \
+                    else post["id"]
+                st.session_state.community_comment_pages = [None]
+        # Comments are only loaded for the post that is open, a page at a time
+        if st.session_state.get("community_open") == post["id"]:
+            comment_pages = st.session_state.setdefault("community_comment_pages", [None])
+            for after in comment_pages:
+                comments, comments_cursor = community.comments(post["id"], after=after)
+                for comment in comments:
+                    st.markdown(f"**{comment['author']}**: {comment['body']}")
+            if comments_cursor is not None and st.button("More comments", key=f"more_comments_{post['id']}"):
+                comment_pages.append(comments_cursor)
+                st.experimental_rerun()
+            with st.form(f"comment_{post['id']}", clear_on_submit=True):
+                text = st.text_input("Add a comment")
+                if st.form_submit_button("Comment") and text.strip():
+                    community.add_comment(post["id"], user_key, st.session_state.get("community_author") or "Member",
+                                          text.strip())
+                    st.experimental_rerun()
+        st.markdown("---")
+    
+    col1, _, col2 = st.columns([1, 4, 1])
+    with col1:
+        if len(pages) > 1 and st.button("← Newer"):
+            pages.pop()
+            st.experimental_rerun()
+    with col2:
+        if next_cursor is not None and st.button("Older →"):
+            pages.append(next_cursor)
+            st.experimental_rerun()
 
 # Route to the correct page based on navigation
 if selected_nav == "Home":
     home()
+elif selected_nav == "Recipes":
+    recipes_page()
+elif selected_nav == "Community":
+    community_page()
 else:
     st.title(f"{selected_nav} Page")
     st.write("This section is under development for the hackathon.")
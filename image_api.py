@@ -1,3 +1,5 @@
+import os
+
 import openai
 import requests
 import streamlit as st
@@ -5,6 +7,7 @@ import streamlit as st
 # Set your API keys
 OPENAI_API_KEY = "your_openai_api_key"
 UNSPLASH_API_KEY = "your_unsplash_api_key"
+UNSPLASH_API_URL = os.getenv("NUTRIOMEN_UNSPLASH_URL", "https://api.unsplash.com")
 
 openai.api_key = OPENAI_API_KEY
 
@@ -21,15 +24,16 @@ def generate_ai_image(prompt: str, size="512x512"):
         return None, str(e)
 
 
-def fetch_unsplash_image(query: str):
+def fetch_unsplash_image(query: str, session=None, timeout: float = 10):
     """Fetch a random image from Unsplash based on a query."""
     if not query:
         return None, "Please enter a search term."
     
-    url = f"https://api.unsplash.com/photos/random?query={query}&client_id={UNSPLASH_API_KEY}"
+    url = f"{UNSPLASH_API_URL}/photos/random"
+    params = {"query": query, "client_id": UNSPLASH_API_KEY}
     
     try:
-        response = requests.get(url).json()
+        response = (session or requests).get(url, params=params, timeout=timeout).json()
         if "urls" in response:
             return response["urls"]["regular"], None
         else:
@@ -0,0 +1,155 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import requests
+from PIL import Image, ImageOps, features
+from requests.adapters import HTTPAdapter
+
+import metrics
+from cache_backend import Cache, get_cache
+from image_api import fetch_unsplash_image
+
+# Image prefetch and thumbnails for content pages.
+#
+# A page asks for all of its images up front (prefetch() or images()) instead
+# of calling fetch_unsplash_image once per image on the script thread. A
+# bounded pool of fetch threads resolves the queries and downloads the
+# originals over pooled connections; a second pool decodes them and encodes
+# a thumbnail at the width the page displays (WebP when Pillow supports it,
+# else JPEG). Pages then serve those bytes with st.image, never the full-size
+# remote image.
+#
+# Thumbnails are cached in the "image" namespace of the shared cache (failures
+# too, briefly, as empty entries), and concurrent requests for the same image
+# share one download.
+
+logger = logging.getLogger("image_prefetch")
+
+FETCH_WORKERS = int(os.getenv("NUTRIOMEN_IMAGE_WORKERS", "8"))
+RESIZE_WORKERS = int(os.getenv("NUTRIOMEN_IMAGE_RESIZE_WORKERS", str(min(4, os.cpu_count() or 1))))
+FETCH_TIMEOUT = 10.0
+IMAGE_TTL = 24 * 3600
+# Failed images are not retried for this long, so pages don't wait on a failing API every render
+FAILURE_TTL = 300
+FORMAT = "WEBP" if features.check("webp") else "JPEG"
+
+
+def thumbnail(data: bytes, size: Union[int, Tuple[int, int]], fmt: str = FORMAT, quality: int = 80) -> bytes:
+    """
+    Re-encode an image at display size: cropped to (width, height), or scaled
+    to a width keeping its aspect ratio. Images are never enlarged.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        width = size if isinstance(size, int) else size[0]
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, much faster than decoding in full
+        image.draft("RGB", (width, width * image.height // image.width))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    if isinstance(size, int):
+        width = min(size, image.width)
+        # reducing_gap shrinks by whole factors first, then resamples the rest
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS, reducing_gap=3.0)
+    else:
+        image = ImageOps.fit(image, size, Image.LANCZOS)
+    buffer = io.BytesIO()
+    if fmt == "WEBP":
+        image.save(buffer, format="WEBP", quality=quality, method=2)
+    else:
+        image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+class ImagePrefetcher:
+    """Resolves, downloads and resizes images in background pools; results are thumbnail bytes or None."""
+
+    def __init__(self, fetch_workers: int = FETCH_WORKERS, resize_workers: int = RESIZE_WORKERS,
+                 cache: Optional[Cache] = None, fetch=fetch_unsplash_image):
+        self._fetch = fetch
+        self._cache = cache
+        self._fetch_pool = ThreadPoolExecutor(fetch_workers, thread_name_prefix="image-fetch")
+        self._resize_pool = ThreadPoolExecutor(resize_workers, thread_name_prefix="image-resize")
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=fetch_workers, pool_maxsize=fetch_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self) -> Cache:
+        return self._cache or get_cache()
+
+    def prefetch(self, query: str, width: int, fmt: str = FORMAT) -> Future:
+        """Start fetching the image for `query` at `width` pixels; the future's result is its bytes, or None."""
+        key = f"{fmt}:{width}:{query}"
+        blob = self.cache.get("image", key)
+        if blob is not None:
+            future = Future()
+            future.set_result(blob or None)
+            return future
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = self._inflight[key] = Future()
+        self._fetch_pool.submit(self._download, key, query, width, fmt, future)
+        return future
+
+    def images(self, queries: Iterable[str], width: int, timeout: Optional[float] = FETCH_TIMEOUT,
+               fmt: str = FORMAT) -> Dict[str, Optional[bytes]]:
+        """Thumbnails for all `queries`, fetched concurrently; images not ready within `timeout` are None."""
+        futures = {query: self.prefetch(query, width, fmt) for query in queries}
+        wait(futures.values(), timeout=timeout)
+        return {query: future.result() if future.done() else None for query, future in futures.items()}
+
+    def _download(self, key: str, query: str, width: int, fmt: str, future: Future) -> None:
+        try:
+            with metrics.timer("image", "fetch"):
+                url, error = self._fetch(query, session=self._session, timeout=FETCH_TIMEOUT)
+                if error:
+                    raise LookupError(error)
+                response = self._session.get(url, timeout=FETCH_TIMEOUT)
+                response.raise_for_status()
+            metrics.inc("image_downloaded_bytes_total", len(response.content))
+            self._resize_pool.submit(self._resize, key, response.content, width, fmt, future)
+        except Exception as e:
+            self._finish(key, future, None, e)
+
+    def _resize(self, key: str, data: bytes, width: int, fmt: str, future: Future) -> None:
+        try:
+            with metrics.timer("image", "resize"):
+                blob = thumbnail(data, width, fmt)
+            self.cache.set("image", key, blob, ttl=IMAGE_TTL)
+            self._finish(key, future, blob)
+        except Exception as e:
+            self._finish(key, future, None, e)
+
+    def _finish(self, key: str, future: Future, blob: Optional[bytes], error: Optional[Exception] = None) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            logger.warning(f"Could not prefetch image {key}: {error}")
+            metrics.inc("image_errors_total")
+            self.cache.set("image", key, b"", ttl=FAILURE_TTL)
+        future.set_result(blob)
+
+    def close(self) -> None:
+        self._fetch_pool.shutdown(wait=False, cancel_futures=True)
+        self._resize_pool.shutdown(wait=False, cancel_futures=True)
+        self._session.close()
+
+
+_prefetcher: Optional[ImagePrefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> ImagePrefetcher:
+    global _prefetcher
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = ImagePrefetcher()
+    return _prefetcher
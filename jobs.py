@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import streamlit as st
+
+import llm_log
+import metrics
+import resilience
+from storage import Storage, get_storage, stale_before
+from streamlit_compat import fragment, rerun
+
+# Background LLM generation.
+#
+# Pages enqueue a generation and return immediately instead of blocking their
+# script thread under st.spinner. A process-wide worker pool runs the jobs and
+# stores results in the jobs table, so a job keeps running when the user
+# navigates away, and the next page view reads the finished result straight
+# from the database. Jobs still queued or running when the process stopped are
+# picked up again on the next start. With shared storage (PostgreSQL) every
+# replica runs the same queue; claiming a job is atomic, so each runs once.
+
+logger = logging.getLogger("jobs")
+
+PENDING = ("queued", "running")
+# On shared storage another replica may be running a job right now, so only
+# jobs running longer than this are assumed orphaned on startup
+STALE_AFTER_SECONDS = float(os.getenv("NUTRIOMEN_JOB_STALE_AFTER", "600"))
+
+
+def generate_with_llm(prompt: str) -> str:
+    from llm_helper import LLMHelper
+    return LLMHelper().get_response(prompt)
+
+
+class JobQueue:
+    """Thread-pool job runner backed by the persistent jobs table."""
+
+    def __init__(self, store: Optional[Storage] = None, workers: int = 4):
+        self.store = store or get_storage()
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-job")
+        self._lock = threading.Lock()
+        self._running = 0
+        # kind -> function(prompt) -> result text
+        self._handlers: Dict[str, Callable[[str], str]] = {}
+
+    def register(self, kind: str, handler: Callable[[str], str]) -> None:
+        """Run jobs of `kind` with `handler` instead of the LLM."""
+        self._handlers[kind] = handler
+
+    def enqueue(self, user_id: int, kind: str, prompt: str, force: bool = False) -> int:
+        """
+        Queue a generation and return its job id without waiting for it.
+
+        A job already queued or running for the same user, kind and prompt is
+        reused, as is a finished one unless `force` is set, so reruns that
+        enqueue the same work don't multiply upstream calls.
+        """
+        prompt_hash = llm_log.prompt_hash(prompt)
+        statuses = PENDING if force else PENDING + ("done",)
+        with self._lock:
+            existing = self.store.find_job(user_id, kind, prompt_hash, statuses)
+            if existing:
+                return existing
+            job_id = self.store.create_job(user_id, kind, prompt, prompt_hash)
+        metrics.inc("jobs_enqueued_total", kind=kind)
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        return self.store.get_job(job_id)
+
+    def latest(self, user_id: int, kind: str) -> Optional[Dict[str, Any]]:
+        """Most recent job of a kind for a user, whatever its status."""
+        return self.store.latest_job(user_id, kind)
+
+    def latest_result(self, user_id: int, kind: str) -> Optional[str]:
+        """Result of the most recent successful job of a kind for a user."""
+        job = self.store.latest_job(user_id, kind, status="done")
+        return job["result"] if job else None
+
+    def recover(self) -> int:
+        """Resubmit jobs left queued or running by a previous process."""
+        self.store.requeue_running(stale_before(STALE_AFTER_SECONDS) if self.store.shared else None)
+        job_ids = self.store.queued_job_ids()
+        for job_id in job_ids:
+            self._executor.submit(self._run, job_id)
+        return len(job_ids)
+
+    def _run(self, job_id: int) -> None:
+        if not self.store.claim_job(job_id):
+            return
+        job = self.get(job_id)
+        handler = self._handlers.get(job["kind"], generate_with_llm)
+        metrics.set_gauge("jobs_running", self._running_delta(1))
+        try:
+            with metrics.timer("job", job["kind"]), resilience.budget(resilience.budget_seconds("job")):
+                result = handler(job["prompt"])
+        except Exception as e:
+            logger.error(f"Job {job_id} ({job['kind']}) failed: {e}")
+            self.store.finish_job(job_id, "failed", error=f"{type(e).__name__}: {e}")
+            metrics.inc("jobs_finished_total", kind=job["kind"], status="failed")
+        else:
+            self.store.finish_job(job_id, "done", result=result)
+            metrics.inc("jobs_finished_total", kind=job["kind"], status="done")
+        finally:
+            metrics.set_gauge("jobs_running", self._running_delta(-1))
+
+    def _running_delta(self, delta: int) -> int:
+        with self._lock:
+            self._running += delta
+            return self._running
+
+    def busy(self) -> bool:
+        """Whether every worker is currently running a job."""
+        return self._running >= self.workers
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> JobQueue:
+    """Process-wide job queue, created (and recovering unfinished jobs) on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                queue = JobQueue(workers=int(os.getenv("NUTRIOMEN_JOB_WORKERS", "4")))
+                recovered = queue.recover()
+                if recovered:
+                    logger.info(f"Resumed {recovered} unfinished jobs")
+                _queue = queue
+    return _queue
+
+
+def show_pending(job_id: int, message: str) -> None:
+    """Show a placeholder while a job runs, and rerun the page once it has finished."""
+    if fragment is None:
+        st.info(message)
+        if st.button("Refresh", key=f"refresh_job_{job_id}"):
+            rerun()
+        return
+
+    # Only this fragment reruns while polling, not the whole page
+    @fragment(run_every=2)
+    def poll():
+        job = get_queue().get(job_id)
+        if job is None or job["status"] not in PENDING:
+            rerun()
+        st.info(message)
+
+    poll()
+
+
+def wait(job_id: int, timeout: float = 30.0, interval: float = 0.05) -> Optional[Dict[str, Any]]:
+    """Block until a job finishes or the timeout passes (for scripts and benchmarks)."""
+    queue = get_queue()
+    deadline = time.monotonic() + timeout
+    job = queue.get(job_id)
+    while job and job["status"] in PENDING and time.monotonic() < deadline:
+        time.sleep(interval)
+        job = queue.get(job_id)
+    return job
@@ -0,0 +1,224 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+from semantic_cache import tokenize
+
+# Local retrieval over a curated women's nutrition knowledge corpus.
+#
+# knowledge/corpus.json holds short guidance passages and common questions
+# with vetted answers. Both are indexed with BM25 in an inverted index stored
+# in SQLite next to the corpus, rebuilt automatically whenever the corpus
+# changes. Chat prompts carry only the few passages relevant to a question,
+# and a question that closely matches a known FAQ is answered straight from
+# the index.
+
+KNOWLEDGE_DIR = Path(__file__).resolve().parent / "knowledge"
+CORPUS_PATH = KNOWLEDGE_DIR / "corpus.json"
+INDEX_PATH = KNOWLEDGE_DIR / "index.db"
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def _corpus_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def build_index(corpus_path: Path = CORPUS_PATH, index_path: Path = INDEX_PATH) -> None:
+    """(Re)build the on-disk inverted index from the corpus."""
+    with open(corpus_path) as f:
+        corpus = json.load(f)
+
+    docs = [("passage", p["id"], p["topic"], p["title"], p["text"], f"{p['title']} {p['text']}")
+            for p in corpus["passages"]]
+    docs += [("faq", q["id"], "faq", q["question"], q["answer"], q["question"]) for q in corpus["faqs"]]
+
+    # A temp file of our own: replicas starting together may all be building the index
+    fd, tmp_name = tempfile.mkstemp(dir=index_path.parent, prefix=f"{index_path.name}.", suffix=".tmp")
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+    try:
+        _write_index(tmp_path, docs, _corpus_hash(corpus_path))
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _write_index(path: Path, docs: List[Tuple], corpus_hash: str) -> None:
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executescript('''
+            CREATE TABLE docs (id INTEGER PRIMARY KEY, kind TEXT, key TEXT, topic TEXT,
+                               title TEXT, body TEXT, length INTEGER);
+            CREATE TABLE postings (term TEXT, doc_id INTEGER, tf INTEGER);
+            CREATE TABLE terms (term TEXT, kind TEXT, df INTEGER, PRIMARY KEY (term, kind));
+            CREATE TABLE meta (kind TEXT PRIMARY KEY, docs INTEGER, avg_length REAL);
+            CREATE TABLE info (key TEXT PRIMARY KEY, value TEXT);
+        ''')
+        lengths: Dict[str, List[int]] = {}
+        df: Counter = Counter()
+        for doc_id, (kind, key, topic, title, body, indexed) in enumerate(docs, 1):
+            terms = Counter(tokenize(indexed))
+            length = sum(terms.values())
+            lengths.setdefault(kind, []).append(length)
+            conn.execute("INSERT INTO docs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (doc_id, kind, key, topic, title, body, length))
+            conn.executemany("INSERT INTO postings VALUES (?, ?, ?)",
+                             ((term, doc_id, tf) for term, tf in terms.items()))
+            df.update((term, kind) for term in terms)
+        conn.executemany("INSERT INTO terms VALUES (?, ?, ?)", ((term, kind, n) for (term, kind), n in df.items()))
+        conn.executemany("INSERT INTO meta VALUES (?, ?, ?)",
+                         ((kind, len(values), sum(values) / len(values)) for kind, values in lengths.items()))
+        conn.execute("INSERT INTO info VALUES ('corpus_hash', ?)", (corpus_hash,))
+        conn.execute("CREATE INDEX idx_postings_term ON postings(term)")
+    conn.close()
+
+
+class KnowledgeBase:
+    """BM25 search over passages and FAQs of the knowledge corpus."""
+
+    def __init__(self, corpus_path: Path = CORPUS_PATH, index_path: Path = INDEX_PATH):
+        self.corpus_path = Path(corpus_path)
+        self.index_path = Path(index_path)
+        self._local = threading.local()
+        self._ensure_index()
+        conn = self._conn()
+        self._meta = {row[0]: (row[1], row[2]) for row in conn.execute("SELECT kind, docs, avg_length FROM meta")}
+
+    def _ensure_index(self) -> None:
+        if self.index_path.exists():
+            conn = sqlite3.connect(self.index_path)
+            try:
+                row = conn.execute("SELECT value FROM info WHERE key = 'corpus_hash'").fetchone()
+            except sqlite3.DatabaseError:
+                row = None
+            finally:
+                conn.close()
+            if row and row[0] == _corpus_hash(self.corpus_path):
+                return
+        build_index(self.corpus_path, self.index_path)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True)
+        return conn
+
+    def _idf(self, kind: str, df: int) -> float:
+        n = self._meta.get(kind, (0, 0.0))[0]
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _term_weight(self, kind: str, df: int, tf: int, length: int) -> float:
+        avg_length = self._meta[kind][1] or 1.0
+        return self._idf(kind, df) * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+
+    def search(self, query: str, kind: str = "passage", k: int = 3) -> List[Tuple[float, Dict[str, Any]]]:
+        """Return up to `k` (score, doc) pairs for the documents of `kind` best matching `query`."""
+        terms = Counter(tokenize(query))
+        if not terms or kind not in self._meta:
+            return []
+        conn = self._conn()
+        placeholders = ",".join("?" * len(terms))
+        rows = conn.execute(
+            f"""SELECT p.term, p.doc_id, p.tf, d.length, t.df
+                FROM postings p
+                JOIN docs d ON d.id = p.doc_id
+                JOIN terms t ON t.term = p.term AND t.kind = d.kind
+                WHERE p.term IN ({placeholders}) AND d.kind = ?""",
+            (*terms, kind)).fetchall()
+
+        scores: Dict[int, float] = Counter()
+        for term, doc_id, tf, length, df in rows:
+            scores[doc_id] += terms[term] * self._term_weight(kind, df, tf, length)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        results = []
+        for doc_id, score in best:
+            key, topic, title, body = conn.execute(
+                "SELECT key, topic, title, body FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            results.append((score, {"id": key, "topic": topic, "title": title, "text": body}))
+        return results
+
+    def _self_score(self, text: str, kind: str) -> float:
+        # Score a text would get against a document made of exactly its own terms
+        terms = Counter(tokenize(text))
+        placeholders = ",".join("?" * len(terms))
+        df = dict(self._conn().execute(
+            f"SELECT term, df FROM terms WHERE kind = ? AND term IN ({placeholders})", (kind, *terms)))
+        length = sum(terms.values())
+        # Terms missing from the index score as if they appeared in a single document
+        return sum(tf * self._term_weight(kind, df.get(term, 1), tf, length) for term, tf in terms.items())
+
+    def answer_faq(self, question: str, threshold: float = 0.75) -> Optional[Tuple[str, float]]:
+        """
+        Return (answer, confidence) when `question` closely matches a known FAQ.
+
+        Confidence is the BM25 score against the best FAQ divided by the
+        larger of the two texts' scores against themselves, so it is near 1
+        only when the question and the FAQ share nearly all of their terms.
+        """
+        results = self.search(question, kind="faq", k=1)
+        if not results:
+            metrics.inc("knowledge_faq_total", result="miss")
+            return None
+        score, doc = results[0]
+        confidence = score / max(self._self_score(question, "faq"), self._self_score(doc["title"], "faq"), 1e-9)
+        if confidence < threshold:
+            metrics.inc("knowledge_faq_total", result="miss")
+            return None
+        metrics.inc("knowledge_faq_total", result="hit")
+        return doc["text"], confidence
+
+
+_kb: Optional[KnowledgeBase] = None
+_kb_lock = threading.Lock()
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """Process-wide knowledge base, building the index on first use if needed."""
+    global _kb
+    if _kb is None:
+        with _kb_lock:
+            if _kb is None:
+                _kb = KnowledgeBase()
+    return _kb
+
+
+def faq_threshold() -> float:
+    return float(os.getenv("NUTRIOMEN_FAQ_THRESHOLD", "0.75"))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build or query the nutrition knowledge index.")
+    parser.add_argument("query", nargs="?", help="question to search for")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the index from the corpus")
+    parser.add_argument("-k", type=int, default=3, help="passages to show")
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        build_index()
+        print(f"Index written to {INDEX_PATH}")
+    if args.query:
+        kb = get_knowledge_base()
+        faq = kb.answer_faq(args.query, faq_threshold())
+        if faq:
+            print(f"FAQ answer (confidence {faq[1]:.2f}):\n{faq[0]}\n")
+        for score, doc in kb.search(args.query, k=args.k):
+            print(f"{score:6.2f}  [{doc['topic']}] {doc['title']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
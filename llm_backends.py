@@ -0,0 +1,269 @@
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from typing import Callable, Dict, Iterator, Optional
+
+# Pluggable LLM providers.
+#
+# Every provider implements Backend.stream(), yielding Chunks of text; the last
+# chunk may carry token usage. Backends are selected by name, by default from
+# $NUTRIOMEN_LLM_BACKEND, so the whole app can be pointed at the local "stub"
+# provider to run and benchmark offline.
+
+DEFAULT_BACKEND = "groq"
+
+Chunk = namedtuple("Chunk", ["text", "prompt_tokens", "completion_tokens"], defaults=(None, None))
+Completion = namedtuple("Completion", ["content", "prompt_tokens", "completion_tokens"])
+
+
+class BackendError(Exception):
+    """An upstream LLM call failed."""
+
+
+class RateLimitError(BackendError):
+    """The provider answered 429 Too Many Requests."""
+
+    def __init__(self, message="rate limited", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Backend:
+    """Interface implemented by every LLM provider."""
+    name = "base"
+    model = ""
+
+    def stream(self, prompt: str) -> Iterator[Chunk]:
+        raise NotImplementedError
+
+    def invoke(self, prompt: str) -> Completion:
+        """Run the prompt to completion and return the whole response."""
+        parts = []
+        prompt_tokens = completion_tokens = None
+        for chunk in self.stream(prompt):
+            parts.append(chunk.text)
+            if chunk.prompt_tokens is not None:
+                prompt_tokens = chunk.prompt_tokens
+            if chunk.completion_tokens is not None:
+                completion_tokens = chunk.completion_tokens
+        return Completion("".join(parts), prompt_tokens, completion_tokens)
+
+
+def _raise_mapped(e: Exception):
+    # Provider SDKs each have their own exception hierarchy; map rate limiting
+    # onto ours so retry policies don't need to know which SDK is in use.
+    if type(e).__name__ == "RateLimitError" or getattr(e, "status_code", None) == 429:
+        raise RateLimitError(str(e)) from e
+    raise BackendError(f"{type(e).__name__}: {e}") from e
+
+
+class GroqBackend(Backend):
+    """Llama 3 on Groq through LangChain's ChatGroq."""
+    name = "groq"
+
+    def __init__(self, model="llama3-8b-8192"):
+        from langchain_groq import ChatGroq
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        self.model = model
+        self.llm = ChatGroq(groq_api_key=os.getenv("GROQ_API_KEY"), model_name=model)
+
+    def stream(self, prompt):
+        try:
+            for chunk in self.llm.stream(prompt):
+                usage = getattr(chunk, "usage_metadata", None) or {}
+                yield Chunk(chunk.content, usage.get("input_tokens"), usage.get("output_tokens"))
+        except BackendError:
+            raise
+        except Exception as e:
+            _raise_mapped(e)
+
+
+class OpenAIBackend(Backend):
+    """OpenAI chat completions, with a fixed system message."""
+    name = "openai"
+
+    def __init__(self, model="gpt-4", system="You are an expert nutritionist giving diet advice for women."):
+        import openai
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+        self.openai = openai
+        self.model = model
+        self.system = system
+
+    def stream(self, prompt):
+        try:
+            response = self.openai.ChatCompletion.create(
+                model=self.model,
+                messages=[{"role": "system", "content": self.system},
+                          {"role": "user", "content": prompt}],
+                stream=True,
+            )
+            for event in response:
+                text = event["choices"][0].get("delta", {}).get("content")
+                if text:
+                    yield Chunk(text)
+        except BackendError:
+            raise
+        except Exception as e:
+            _raise_mapped(e)
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a latency distribution in milliseconds into a sampler returning seconds.
+
+    Accepted forms: "200" or "fixed:200", "uniform:100-400" and
+    "lognormal:300:0.5" (median 300 ms, sigma 0.5), which gives the long
+    right tail real providers have.
+    """
+    kind, _, args = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+    if kind == "fixed":
+        value = float(args) / 1000
+        return lambda rng: value
+    if kind == "uniform":
+        low, high = (float(x) / 1000 for x in args.split("-"))
+        return lambda rng: rng.uniform(low, high)
+    if kind == "lognormal":
+        median, sigma = args.split(":")
+        mu = math.log(float(median) / 1000)
+        return lambda rng: rng.lognormvariate(mu, float(sigma))
+    raise ValueError(f"unknown latency distribution {spec!r}")
+
+
+STUB_TEMPLATES = {
+    "tips": (
+        "- 🥬 Prioritise iron and folate: leafy greens, lentils and fortified cereals.\n"
+        "- 🥛 Get 3 servings of calcium-rich foods such as yogurt, milk or tofu.\n"
+        "- 🐟 Eat oily fish twice a week for omega-3 fats.\n"
+        "- 🍊 Pair plant iron with vitamin C to improve absorption.\n"
+        "- 💧 Drink water steadily through the day.\n"
+    ),
+    "meal_plan": (
+        "🍳 **Breakfast:** Oats with berries, seeds and yogurt\n\n"
+        "🥗 **Lunch:** Lentil and quinoa salad with spinach and lemon\n\n"
+        "🍲 **Dinner:** Baked salmon with sweet potato and broccoli\n\n"
+        "🍎 **Snacks:** Apple with almond butter; hummus with carrots\n\n"
+        "✨ **Focus nutrients:** iron, folate, calcium, vitamin D\n\n"
+        "🚶 **Lifestyle:** 30 minutes of movement and 7-9 hours of sleep\n"
+    ),
+    "chat": (
+        "Great question about \"{question}\". 🥗 Build meals around vegetables, lean protein "
+        "and whole grains, include iron-rich foods with a source of vitamin C, and stay hydrated. "
+        "Please check with your healthcare provider for advice specific to you."
+    ),
+}
+
+
+class StubBackend(Backend):
+    """
+    Deterministic local stand-in for a real provider.
+
+    Responses are canned templates picked from the prompt, so the same prompt
+    always gets the same text. Latency before the first token, streaming
+    token rate, error rate and 429 rate are configurable, and every random
+    draw comes from one seeded generator, so a run can be replayed exactly.
+    """
+    name = "stub"
+
+    def __init__(self, model="stub-1", latency="fixed:200", tokens_per_second=200.0,
+                 error_rate=0.0, rate_limit_rate=0.0, seed=0, sleep=time.sleep):
+        self.model = model
+        self.latency_spec = latency
+        self._sample_latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sleep = sleep
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency=os.getenv("NUTRIOMEN_STUB_LATENCY", "fixed:200"),
+            tokens_per_second=float(os.getenv("NUTRIOMEN_STUB_TOKEN_RATE", "200")),
+            error_rate=float(os.getenv("NUTRIOMEN_STUB_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("NUTRIOMEN_STUB_429_RATE", "0")),
+            seed=int(os.getenv("NUTRIOMEN_STUB_SEED", "0")),
+        )
+
+    def respond(self, prompt: str) -> str:
+        """The canned response for a prompt."""
+        question = re.search(r"User's current question:\s*(.+?)\s*\n", prompt)
+        if question:
+            return STUB_TEMPLATES["chat"].format(question=question.group(1))
+        if "meal suggestions" in prompt:
+            return STUB_TEMPLATES["meal_plan"]
+        return STUB_TEMPLATES["tips"]
+
+    def stream(self, prompt):
+        with self._lock:
+            delay = self._sample_latency(self._rng)
+            fault = self._rng.random()
+        self._sleep(delay)
+        if fault < self.rate_limit_rate:
+            raise RateLimitError("stub: 429 Too Many Requests", retry_after=1.0)
+        if fault < self.rate_limit_rate + self.error_rate:
+            raise BackendError("stub: 500 Internal Server Error")
+
+        tokens = re.findall(r"\S+\s*", self.respond(prompt))
+        interval = 1 / self.tokens_per_second if self.tokens_per_second else 0
+        prompt_tokens = max(1, len(prompt) // 4)
+        for i, token in enumerate(tokens):
+            if i and interval:
+                self._sleep(interval)
+            last = i == len(tokens) - 1
+            yield Chunk(token, prompt_tokens if last else None, len(tokens) if last else None)
+
+
+def _router() -> Backend:
+    # Imported lazily: the router builds on the other registered backends
+    from llm_router import RouterBackend
+    return RouterBackend.from_env()
+
+
+BACKENDS: Dict[str, Callable[[], Backend]] = {
+    "groq": GroqBackend,
+    "openai": OpenAIBackend,
+    "stub": StubBackend.from_env,
+    "router": _router,
+}
+
+_instances: Dict[str, Backend] = {}
+# Reentrant, as composite backends like the router create their providers while it's held
+_instances_lock = threading.RLock()
+
+
+def register_backend(name: str, factory: Callable[[], Backend]) -> None:
+    """Make a provider available to get_backend() under `name`."""
+    BACKENDS[name] = factory
+    with _instances_lock:
+        _instances.pop(name, None)
+
+
+def get_backend(name: Optional[str] = None) -> Backend:
+    """
+    Return the process-wide instance of a backend, creating it on first use.
+
+    With no name, $NUTRIOMEN_LLM_BACKEND picks the provider (default "groq").
+    Instances are shared so provider clients and their connection pools are
+    reused across pages and sessions.
+    """
+    name = name or os.getenv("NUTRIOMEN_LLM_BACKEND", DEFAULT_BACKEND)
+    backend = _instances.get(name)
+    if backend is None:
+        if name not in BACKENDS:
+            raise ValueError(f"unknown LLM backend {name!r}, choose from {sorted(BACKENDS)}")
+        with _instances_lock:
+            backend = _instances.get(name)
+            if backend is None:
+                backend = _instances[name] = BACKENDS[name]()
+    return backend
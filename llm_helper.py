@@ -1,16 +1,84 @@
-import os
-from langchain_groq import ChatGroq
-from dotenv import load_dotenv
+import hashlib
+import time
+import llm_log
+import metrics
+import resilience
+import semantic_cache
+from llm_backends import get_backend
+from singleflight import SingleFlight
 
-# Load environment variables from .env file
-load_dotenv()
+# Identical prompts sent at the same moment (e.g. many users with near-identical
+# profiles opening the nutrition page after a notification) share one upstream call
+_inflight = SingleFlight()
 
 class LLMHelper:
-    """Helper class to interact with ChatGroq's Llama3 model."""
-    def __init__(self):
-        self.llm = ChatGroq(groq_api_key=os.getenv("GROQ_API_KEY"), model_name="llama3-8b-8192")
+    """Helper class to send prompts to the configured LLM backend (ChatGroq's Llama3 by default)."""
+    def __init__(self, backend=None):
+        # A backend name ("groq", "openai", "stub") or instance; None uses $NUTRIOMEN_LLM_BACKEND
+        self.backend = backend if hasattr(backend, "stream") else get_backend(backend)
+        self.model_name = self.backend.model
 
+    @metrics.timed("llm")
     def get_response(self, prompt):
-        """Send the prompt to ChatGroq and return the response."""
-        response = self.llm.invoke(prompt)
-        return response.content  # Extract and return the response content
\ No newline at end of file
+        """Send the prompt to the backend and return the response, logging the call."""
+        record = {"page": metrics.current_page(), "backend": self.backend.name, "model": self.model_name,
+                  "prompt_hash": llm_log.prompt_hash(prompt)}
+        key = (self.backend.name, self.model_name, hashlib.sha256(prompt.encode()).digest())
+        start = time.perf_counter()
+        try:
+            # Only the leader calls upstream, under its deadline, retries and the provider's breaker
+            response, shared = _inflight.do(
+                key, lambda: resilience.call(self.backend.name, lambda: self._stream(prompt, record, start)))
+        except Exception as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            # Callers that waited on another session's identical call never reach _stream
+            record.setdefault("cache", "coalesced")
+            record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            llm_log.get_log().record(**record)
+        metrics.inc("llm_singleflight_total", outcome="coalesced" if shared else "leader")
+        return response
+
+    def get_chat_response(self, prompt, question, bucket):
+        """
+        Answer a chat question, reusing the answer to a near-duplicate question
+        asked earlier from the same profile bucket instead of calling the LLM.
+        """
+        cache = semantic_cache.get_cache()
+        start = time.perf_counter()
+        cached = cache.lookup(bucket, question)
+        if cached is not None:
+            answer, similarity = cached
+            self.log_local_answer(prompt, "hit", start, similarity=round(similarity, 3))
+            return answer
+        response = self.get_response(prompt)
+        cache.store(bucket, question, response)
+        return response
+
+    def log_local_answer(self, prompt, source, start, **fields):
+        """Log an answer served without calling the backend, e.g. from a cache ("hit") or the FAQ index ("faq")."""
+        llm_log.get_log().record(
+            page=metrics.current_page(), backend=self.backend.name, model=self.model_name,
+            prompt_hash=llm_log.prompt_hash(prompt), cache=source,
+            latency_ms=round((time.perf_counter() - start) * 1000, 1), **fields)
+
+    def _stream(self, prompt, record, start):
+        # Only the leading call of a coalesced group gets here, so only it
+        # carries time-to-first-token and token counts in the call log
+        record["cache"] = "miss"
+        parts = []
+        # Stream so the time to the first token can be measured
+        for chunk in self.backend.stream(prompt):
+            if not parts:
+                record["ttft_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            parts.append(chunk.text)
+            if chunk.prompt_tokens is not None:
+                record["prompt_tokens"] = chunk.prompt_tokens
+            if chunk.completion_tokens is not None:
+                record["completion_tokens"] = chunk.completion_tokens
+        # Composite backends such as the router report which provider answered
+        served = getattr(self.backend, "last_served", None)
+        if served is not None:
+            record["provider"], record["model"] = served.name, served.model
+        return "".join(parts)  # Return the full response content
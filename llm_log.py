@@ -0,0 +1,188 @@
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+# Append-only JSONL log of every LLM call.
+#
+# Records are handed to a background writer thread through a bounded queue, so
+# logging never blocks a Streamlit script thread on disk I/O. If the writer
+# falls behind and the queue fills up, records are dropped and counted rather
+# than stalling the page.
+
+DEFAULT_LOG_PATH = "llm_calls.jsonl"
+
+# USD per million tokens (prompt, completion)
+PRICES = {
+    "llama3-8b-8192": (0.05, 0.08),
+    "gpt-4": (30.0, 60.0),
+}
+
+
+def prompt_hash(prompt: str) -> str:
+    """Stable short hash identifying a prompt without storing its text."""
+    return hashlib.sha256(prompt.encode()).hexdigest()[:16]
+
+
+class LLMCallLog:
+    """Buffered, non-blocking JSONL writer for LLM call records."""
+
+    def __init__(self, path: str, max_queue: int = 10000, batch_size: int = 100, flush_interval: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="llm-call-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, **fields: Any) -> None:
+        """Queue one call record. Never blocks; drops the record if the buffer is full."""
+        now = datetime.now(timezone.utc)
+        fields.setdefault("ts", now.isoformat(timespec="milliseconds"))
+        fields.setdefault("day", now.date().isoformat())
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = False
+            if item is None:
+                self._write(batch)
+                return
+            if item:
+                batch.append(item)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in batch))
+
+    def close(self) -> None:
+        """Flush everything queued so far and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+_log: Optional[LLMCallLog] = None
+_log_lock = threading.Lock()
+
+
+def get_log() -> LLMCallLog:
+    """Process-wide call log, written to $NUTRIOMEN_LLM_LOG (default llm_calls.jsonl)."""
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = LLMCallLog(os.getenv("NUTRIOMEN_LLM_LOG", DEFAULT_LOG_PATH))
+    return _log
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def call_cost(record: Dict[str, Any]) -> float:
+    """Estimated USD cost of one call, 0.0 for unknown models, cache hits, FAQ answers and coalesced calls."""
+    if record.get("cache") in ("hit", "faq", "coalesced"):
+        return 0.0
+    prompt_price, completion_price = PRICES.get(record.get("model"), (0.0, 0.0))
+    return ((record.get("prompt_tokens") or 0) * prompt_price
+            + (record.get("completion_tokens") or 0) * completion_price) / 1_000_000
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(records, by=("page", "day")) -> List[Dict[str, Any]]:
+    """Aggregate call count, errors, cache hits, tokens, cost and latency per group."""
+    groups: Dict[tuple, Dict[str, Any]] = defaultdict(lambda: {
+        "calls": 0, "errors": 0, "cache_hits": 0, "coalesced": 0, "prompt_tokens": 0,
+        "completion_tokens": 0, "cost_usd": 0.0, "latencies": [], "ttfts": [],
+    })
+    for record in records:
+        group = groups[tuple(record.get(field) or "-" for field in by)]
+        group["calls"] += 1
+        group["errors"] += 1 if record.get("error") else 0
+        group["cache_hits"] += 1 if record.get("cache") in ("hit", "faq") else 0
+        group["coalesced"] += 1 if record.get("cache") == "coalesced" else 0
+        group["prompt_tokens"] += record.get("prompt_tokens") or 0
+        group["completion_tokens"] += record.get("completion_tokens") or 0
+        group["cost_usd"] += call_cost(record)
+        if record.get("latency_ms") is not None:
+            group["latencies"].append(record["latency_ms"])
+        if record.get("ttft_ms") is not None:
+            group["ttfts"].append(record["ttft_ms"])
+
+    rows = []
+    for key, group in sorted(groups.items()):
+        latencies = group.pop("latencies")
+        ttfts = group.pop("ttfts")
+        row = dict(zip(by, key))
+        row.update(group)
+        row["p50_ms"] = _percentile(latencies, 50)
+        row["p95_ms"] = _percentile(latencies, 95)
+        row["ttft_p50_ms"] = _percentile(ttfts, 50)
+        rows.append(row)
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Aggregate LLM cost and latency from the call log.")
+    parser.add_argument("--log", default=os.getenv("NUTRIOMEN_LLM_LOG", DEFAULT_LOG_PATH))
+    parser.add_argument("--by", choices=["page", "day", "model", "page,day", "day,page"], default="page,day")
+    parser.add_argument("--json", action="store_true", help="print rows as JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.log):
+        print(f"No LLM call log at {args.log}", file=sys.stderr)
+        return 1
+
+    by = tuple(args.by.split(","))
+    rows = summarize(read_records(args.log), by=by)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return 0
+
+    header = [*by, "calls", "errors", "hits", "coalesced", "in_tok", "out_tok", "cost_usd", "p50_ms", "p95_ms", "ttft_p50"]
+    print("".join(f"{h:>12}" for h in header))
+    for row in rows:
+        values = [*(row[field] for field in by), row["calls"], row["errors"], row["cache_hits"], row["coalesced"],
+                  row["prompt_tokens"], row["completion_tokens"], f"{row['cost_usd']:.4f}",
+                  f"{row['p50_ms']:.0f}", f"{row['p95_ms']:.0f}", f"{row['ttft_p50_ms']:.0f}"]
+        print("".join(f"{str(v):>12}" for v in values))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import List, Optional, Sequence
+
+import metrics
+from llm_backends import Backend, BackendError, get_backend
+from metrics import Histogram
+
+# Multi-provider routing with failover and hedged requests.
+#
+# RouterBackend wraps several providers behind the Backend interface. Each
+# request goes to the healthiest provider first. If it hasn't produced a first
+# token within the hedge delay (the p95 of its recent time to first token),
+# the same request is also sent to the next provider and whichever starts
+# streaming first is used; the other attempt is abandoned. A provider that
+# fails before its first token fails over to the next one immediately.
+
+logger = logging.getLogger("llm_router")
+
+DEFAULT_PROVIDERS = "groq,openai"
+
+
+class ProviderHealth:
+    """Recent time-to-first-token distribution and error rate of one provider."""
+
+    def __init__(self, window: float = 300.0, alpha: float = 0.1, clock=time.monotonic):
+        self.window = window
+        self.alpha = alpha
+        self._clock = clock
+        # Two rotating windows, so the hedge delay tracks recent behaviour
+        # without ever starting from an empty histogram
+        self._current = Histogram()
+        self._previous = Histogram()
+        self._rotated_at = clock()
+        self._lock = threading.Lock()
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+
+    def _rotate(self) -> None:
+        if self._clock() - self._rotated_at >= self.window:
+            self._previous, self._current = self._current, Histogram()
+            self._rotated_at = self._clock()
+
+    def record_ttft(self, seconds: float) -> None:
+        with self._lock:
+            self._rotate()
+            self._current.record(seconds)
+
+    def record_result(self, ok: bool) -> None:
+        with self._lock:
+            self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+            self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+
+    def ttft_percentile(self, quantile: float, min_samples: int) -> Optional[float]:
+        """The quantile over the most recent window with enough samples, else None."""
+        with self._lock:
+            self._rotate()
+            for hist in (self._current, self._previous):
+                if hist.count >= min_samples:
+                    return hist.percentile(quantile)
+        return None
+
+    @property
+    def healthy(self) -> bool:
+        return self.error_rate < 0.5 and self.consecutive_failures < 3
+
+
+class _Attempt:
+    """One provider streaming a prompt on its own thread into a queue shared by all attempts."""
+
+    def __init__(self, provider: Backend, prompt: str, health: ProviderHealth, events: "queue.Queue"):
+        self.provider = provider
+        self.health = health
+        self.events = events
+        self.cancelled = threading.Event()
+        self.started = time.perf_counter()
+        threading.Thread(target=self._run, args=(prompt,), name=f"llm-{provider.name}", daemon=True).start()
+
+    def _run(self, prompt: str) -> None:
+        stream = self.provider.stream(prompt)
+        first = True
+        try:
+            for chunk in stream:
+                # Recorded even when this attempt lost a hedge, or the hedge
+                # delay would only ever see the fast providers' first tokens
+                if first:
+                    ttft = time.perf_counter() - self.started
+                    self.health.record_ttft(ttft)
+                    metrics.observe("llm_ttft", self.provider.name, ttft)
+                    first = False
+                if self.cancelled.is_set():
+                    return
+                self.events.put((self, "chunk", chunk))
+            self.health.record_result(True)
+            self.events.put((self, "done", None))
+        except Exception as e:
+            self.health.record_result(False)
+            self.events.put((self, "error", e))
+        finally:
+            stream.close()
+
+
+class RouterBackend(Backend):
+    """
+    Route prompts across providers, hedging slow first tokens and failing over on errors.
+
+    `hedge_quantile` of a provider's recent time to first token becomes its
+    hedge delay once `min_samples` have been seen; until then
+    `default_hedge_delay` is used. The delay is clamped to
+    [`min_hedge_delay`, `max_hedge_delay`] seconds.
+    """
+    name = "router"
+
+    def __init__(self, providers: Sequence[Backend], hedge_quantile: float = 0.95,
+                 default_hedge_delay: float = 1.0, min_hedge_delay: float = 0.05,
+                 max_hedge_delay: float = 5.0, min_samples: int = 20):
+        if not providers:
+            raise ValueError("RouterBackend needs at least one provider")
+        self.providers: List[Backend] = list(providers)
+        self.health = {p.name: ProviderHealth() for p in self.providers}
+        self.hedge_quantile = hedge_quantile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.min_samples = min_samples
+        self.model = "+".join(p.model for p in self.providers)
+        self._served = threading.local()
+
+    @classmethod
+    def from_env(cls):
+        names = [n.strip() for n in os.getenv("NUTRIOMEN_ROUTER_PROVIDERS", DEFAULT_PROVIDERS).split(",") if n.strip()]
+        return cls([get_backend(name) for name in names],
+                   default_hedge_delay=float(os.getenv("NUTRIOMEN_HEDGE_DELAY_MS", "1000")) / 1000)
+
+    @property
+    def last_served(self) -> Optional[Backend]:
+        """The provider that answered the last request streamed on this thread."""
+        return getattr(self._served, "provider", None)
+
+    def hedge_delay(self, provider: Backend) -> float:
+        ttft = self.health[provider.name].ttft_percentile(self.hedge_quantile, self.min_samples)
+        delay = self.default_hedge_delay if ttft is None else ttft
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, delay))
+
+    def ranked(self) -> List[Backend]:
+        """Providers in configured order, healthy ones first."""
+        return sorted(self.providers, key=lambda p: not self.health[p.name].healthy)
+
+    def stream(self, prompt):
+        waiting = self.ranked()
+        events: "queue.Queue" = queue.Queue()
+        attempts: List[_Attempt] = []
+        errors = []
+
+        def launch():
+            provider = waiting.pop(0)
+            attempts.append(_Attempt(provider, prompt, self.health[provider.name], events))
+            return time.perf_counter() + self.hedge_delay(provider)
+
+        # Wait for some attempt to produce a first token, hedging when the
+        # current one is slow and failing over when one errors
+        hedge_at = launch()
+        while True:
+            timeout = max(0.0, hedge_at - time.perf_counter()) if waiting else None
+            try:
+                attempt, kind, value = events.get(timeout=timeout)
+            except queue.Empty:
+                metrics.inc("llm_router_hedges_total", provider=attempts[-1].provider.name)
+                hedge_at = launch()
+                continue
+            if kind == "chunk":
+                break
+            attempts.remove(attempt)
+            errors.append(f"{attempt.provider.name}: {value}" if kind == "error" else f"{attempt.provider.name}: empty response")
+            metrics.inc("llm_router_failovers_total", provider=attempt.provider.name)
+            logger.warning(f"Provider {errors[-1]}, failing over")
+            if not attempts:
+                if not waiting:
+                    raise BackendError("all providers failed: " + "; ".join(errors))
+                hedge_at = launch()
+
+        winner = attempt
+        for other in attempts:
+            if other is not winner:
+                other.cancelled.set()
+        self._served.provider = winner.provider
+        metrics.inc("llm_router_requests_total", provider=winner.provider.name,
+                    hedged="yes" if len(attempts) > 1 else "no")
+
+        try:
+            while True:
+                if attempt is winner:
+                    if kind == "chunk":
+                        yield value
+                    elif kind == "done":
+                        return
+                    else:
+                        # Tokens were already streamed, so the request can't move to another provider
+                        raise value if isinstance(value, BackendError) else BackendError(str(value))
+                attempt, kind, value = events.get()
+        finally:
+            winner.cancelled.set()
@@ -0,0 +1,251 @@
+import contextvars
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# In-process latency instrumentation.
+#
+# Every timed stage ("page", "db", "llm", ...) gets a histogram per name. The
+# histograms live for the whole Streamlit server process (modules are imported
+# once and shared by every session), so they aggregate across reruns and users.
+# Stages nest: a page timing includes the DB and LLM calls made while rendering,
+# and those calls are labelled with the page they were made from so the time a
+# page spends in SQLite and in the LLM can be told apart.
+
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_PREFIX = "nutriomen"
+
+
+class Histogram:
+    """
+    HDR-style latency histogram.
+
+    Values are counted in logarithmic buckets whose width grows by a fixed
+    ratio, so any recorded value can be recovered with a bounded relative
+    error (1% by default) using constant memory per bucket actually hit.
+    """
+
+    def __init__(self, min_value: float = 1e-6, relative_error: float = 0.01):
+        self.min_value = min_value
+        self._log_base = math.log1p(2 * relative_error)
+        self._buckets: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return int(math.log(value / self.min_value) / self._log_base) + 1
+
+    def _value(self, index: int) -> float:
+        # Midpoint of the bucket, which keeps the relative error symmetric
+        if index == 0:
+            return self.min_value
+        return self.min_value * math.exp((index - 0.5) * self._log_base)
+
+    def record(self, value: float) -> None:
+        index = self._index(value)
+        with self._lock:
+            self._buckets[index] = self._buckets.get(index, 0) + 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, quantile: float) -> float:
+        """Return the value at the given quantile (0.0 - 1.0), or 0.0 when empty."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, math.ceil(quantile * self.count))
+            seen = 0
+            for index in sorted(self._buckets):
+                seen += self._buckets[index]
+                if seen >= rank:
+                    return min(self._value(index), self.max)
+        return self.max
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+
+_lock = threading.Lock()
+_histograms: Dict[Tuple[str, str, str], Histogram] = {}
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_server: Optional[ThreadingHTTPServer] = None
+_current_page: contextvars.ContextVar = contextvars.ContextVar("current_page", default="")
+
+
+def histogram(stage: str, name: str, page: str = "") -> Histogram:
+    """Return the histogram for a stage/name/page, creating it on first use."""
+    key = (stage, name, page)
+    hist = _histograms.get(key)
+    if hist is None:
+        with _lock:
+            hist = _histograms.setdefault(key, Histogram())
+    return hist
+
+
+def current_page() -> str:
+    """Name of the page currently being rendered on this thread, or "" outside a page."""
+    return _current_page.get()
+
+
+def observe(stage: str, name: str, seconds: float, page: Optional[str] = None) -> None:
+    """Record one latency sample in seconds, attributed to the current page by default."""
+    histogram(stage, name, _current_page.get() if page is None else page).record(seconds)
+
+
+@contextmanager
+def timer(stage: str, name: str) -> Iterator[None]:
+    """
+    Time the enclosed block, recording the sample even if it raises.
+
+    Timing the "page" stage also makes that page the current page for every
+    stage timed inside the block.
+    """
+    token = _current_page.set(name) if stage == "page" else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if token is not None:
+            _current_page.reset(token)
+        observe(stage, name, elapsed)
+
+
+def timed(stage: str, name: Optional[str] = None) -> Callable:
+    """Decorator that records the latency of every call to the wrapped function."""
+    def decorator(func: Callable) -> Callable:
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage, label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(metric: str, amount: float = 1, **labels: str) -> None:
+    """Increment a monotonically increasing counter."""
+    key = (metric, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(metric: str, value: float, **labels: str) -> None:
+    """Set a gauge to its current value."""
+    with _lock:
+        _gauges[(metric, _label_key(labels))] = value
+
+
+def snapshot() -> List[Dict[str, Any]]:
+    """Return one row of {stage, name, page, count, sum, max, p50, p95, p99} per histogram."""
+    with _lock:
+        items = sorted(_histograms.items())
+    rows = []
+    for (stage, name, page), hist in items:
+        row = {"stage": stage, "name": name, "page": page,
+               "count": hist.count, "sum": hist.total, "max": hist.max}
+        for quantile in QUANTILES:
+            row[f"p{int(quantile * 100)}"] = hist.percentile(quantile)
+        rows.append(row)
+    return rows
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def render_prometheus() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = []
+    latency = f"{METRIC_PREFIX}_stage_latency_seconds"
+    lines.append(f"# HELP {latency} Latency of instrumented pages, DB calls and LLM calls.")
+    lines.append(f"# TYPE {latency} summary")
+    for row in snapshot():
+        base = (("stage", row["stage"]), ("name", row["name"]), ("page", row["page"]))
+        for quantile in QUANTILES:
+            labels = _format_labels(base + (("quantile", str(quantile)),))
+            lines.append(f"{latency}{labels} {row[f'p{int(quantile * 100)}']:.6f}")
+        lines.append(f"{latency}_sum{_format_labels(base)} {row['sum']:.6f}")
+        lines.append(f"{latency}_count{_format_labels(base)} {row['count']}")
+
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+    for kind, series in (("counter", counters), ("gauge", gauges)):
+        declared = set()
+        for (metric, labels), value in series:
+            full_name = f"{METRIC_PREFIX}_{metric}"
+            if full_name not in declared:
+                lines.append(f"# TYPE {full_name} {kind}")
+                declared.add(full_name)
+            lines.append(f"{full_name}{_format_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str) -> None:
+    """Atomically write the current metrics to a file (for node_exporter's textfile collector)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> None:
+    """Serve /metrics on a background thread. Safe to call on every rerun."""
+    global _server
+    with _lock:
+        if _server is not None:
+            return
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+
+
+def reset() -> None:
+    """Drop every recorded sample and counter."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+from typing import Dict
+
+import events
+import jobs
+import metrics
+from dashboard import generate_nutrition_prompt
+from nutrition_advise import advice_activity_level, generate_advice_prompt
+from profile_page import get_profile
+
+# Regenerate a user's advice in the background after their profile changes.
+#
+# save_profile publishes PROFILE_CHANGED. Each change (re)starts a per-user
+# timer, so a burst of edits results in a single regeneration once the user
+# has stopped editing. When the timer fires while every job worker is busy
+# with on-demand generations, the precompute is pushed back rather than
+# competing with users who are waiting, up to a maximum delay.
+
+logger = logging.getLogger("precompute")
+
+DEBOUNCE_SECONDS = float(os.getenv("NUTRIOMEN_PRECOMPUTE_DELAY", "5"))
+MAX_DEFER_SECONDS = float(os.getenv("NUTRIOMEN_PRECOMPUTE_MAX_DEFER", "60"))
+
+
+class Debouncer:
+    """Run `callback(key)` once `delay` seconds have passed without another trigger for `key`."""
+
+    def __init__(self, callback, delay: float):
+        self.callback = callback
+        self.delay = delay
+        self._timers: Dict[object, threading.Timer] = {}
+        self._lock = threading.Lock()
+
+    def trigger(self, key) -> None:
+        with self._lock:
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+                metrics.inc("precompute_debounced_total")
+            self._schedule(key, self.delay)
+
+    def defer(self, key, delay: float) -> None:
+        """Re-arm a key's timer unless a newer trigger already did."""
+        with self._lock:
+            if key not in self._timers:
+                self._schedule(key, delay)
+
+    def _schedule(self, key, delay: float) -> None:
+        timer = threading.Timer(delay, self._fire)
+        timer.args = (key, timer)
+        timer.daemon = True
+        self._timers[key] = timer
+        timer.start()
+
+    def _fire(self, key, timer) -> None:
+        with self._lock:
+            # A newer trigger replaced this timer after it had already started firing
+            if self._timers.get(key) is not timer:
+                return
+            del self._timers[key]
+        try:
+            self.callback(key)
+        except Exception as e:
+            logger.error(f"Precompute for {key} failed: {e}")
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._timers)
+
+
+def regenerate(user_id: int, waited: float = 0.0) -> None:
+    """Queue fresh dashboard tips and nutrition advice for a user's current profile."""
+    queue = jobs.get_queue()
+    if queue.busy() and waited < MAX_DEFER_SECONDS:
+        _deferred[user_id] = waited + DEBOUNCE_SECONDS
+        _debouncer.defer(user_id, DEBOUNCE_SECONDS)
+        metrics.inc("precompute_deferred_total")
+        return
+
+    profile = get_profile(queue.store, user_id)
+    if not profile:
+        return
+    # The page doesn't save the activity level; keep the one the last advice was generated for
+    latest = queue.latest(user_id, "nutrition_advice")
+    activity_level = advice_activity_level(latest["prompt"] if latest else None)
+    # Not forced: an unchanged profile reuses the advice already stored
+    queue.enqueue(user_id, "dashboard_tips", generate_nutrition_prompt(profile))
+    queue.enqueue(user_id, "nutrition_advice", generate_advice_prompt(profile, activity_level))
+    metrics.inc("precompute_scheduled_total")
+
+
+# user_id -> seconds already spent deferring the current precompute
+_deferred: Dict[int, float] = {}
+
+
+def _run(user_id: int) -> None:
+    regenerate(user_id, _deferred.pop(user_id, 0.0))
+
+
+_debouncer = Debouncer(_run, DEBOUNCE_SECONDS)
+
+
+def on_profile_changed(user_id: int, **_) -> None:
+    _deferred.pop(user_id, None)
+    _debouncer.trigger(user_id)
+
+
+events.subscribe(events.PROFILE_CHANGED, on_profile_changed)
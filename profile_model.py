@@ -0,0 +1,165 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# Profiles as compact records.
+#
+# A Profile holds one row of the profiles table in __slots__ instead of a
+# dict: storage builds it straight from the cursor (sqlite3 row_factory), the
+# cache pickles just its column values, and pages read it with profile['age']
+# or profile.get('age') as before. Derived metrics (BMI, its category, days
+# since the last period, calorie and macro targets, water) are computed on
+# first access and kept on the instance, so a render computes each of them once
+# however many sections use it.
+
+COLUMNS = ("id", "user_id", "full_name", "age", "education", "height", "weight", "menstruation_date",
+           "is_regular_cycle", "diseases", "food_allergies", "is_pregnant", "pregnancy_week", "last_updated")
+
+# Extra calories per day by trimester (weeks 1-13, 14-26, 27+)
+PREGNANCY_CALORIES = (0, 340, 450)
+
+
+def calculate_calories(age, bmi):
+    """Calculate recommended daily calorie intake based on age and BMI."""
+    if age <= 3:
+        return 1000
+    elif 4 <= age <= 8:
+        return 1400
+    elif 9 <= age <= 18:
+        return 1800 if bmi < 25 else 2000
+    elif 19 <= age <= 30:
+        return 2000 if bmi < 25 else 2200
+    elif 31 <= age <= 50:
+        return 1800 if bmi < 25 else 2000
+    else:
+        return 1600 if bmi < 25 else 1800
+
+def calculate_macros(calories):
+    """Calculate macronutrient distribution based on total calories."""
+    return {
+        "Carbohydrates": (calories * 0.55) / 4,
+        "Proteins": (calories * 0.2) / 4,
+        "Fats": (calories * 0.25) / 9
+    }
+
+def water_intake(weight):
+    """Calculate recommended daily water intake in mL."""
+    return weight * 35
+
+
+_UNSET = object()
+
+
+class _memoized:
+    """functools.cached_property for a class with __slots__: the value is kept in the slot `_<name>`."""
+
+    def __init__(self, func):
+        self.func = func
+        self.slot = "_" + func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot, _UNSET)
+        if value is _UNSET:
+            value = self.func(obj)
+            setattr(obj, self.slot, value)
+        return value
+
+
+class Profile:
+    """One user's profile row, with derived metrics computed once on first use."""
+
+    __slots__ = COLUMNS + ("_bmi", "_bmi_category", "_days_since_period", "_calorie_target", "_macros",
+                           "_water", "_base_calories")
+
+    def __init__(self, *values, **fields):
+        for column, value in zip(COLUMNS, values):
+            setattr(self, column, value)
+        for column in COLUMNS[len(values):]:
+            setattr(self, column, fields.get(column))
+
+    @classmethod
+    def from_row(cls, cursor, row) -> "Profile":
+        """sqlite3 row_factory for queries selecting COLUMNS, in order."""
+        return cls(*row)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Profile":
+        return cls(**{column: data.get(column) for column in COLUMNS})
+
+    def __reduce__(self):
+        # Pickle the column values only; derived metrics are recomputed after loading
+        return (self.__class__, tuple(getattr(self, column) for column in COLUMNS))
+
+    # Mapping access, as when profiles were dicts
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in COLUMNS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in COLUMNS
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in COLUMNS else default
+
+    def keys(self):
+        return COLUMNS
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {column: getattr(self, column) for column in COLUMNS}
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Profile) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"Profile(user_id={self.user_id!r}, full_name={self.full_name!r})"
+
+    # Derived metrics
+
+    @_memoized
+    def bmi(self) -> float:
+        return self.weight / ((self.height / 100) ** 2)
+
+    @_memoized
+    def bmi_category(self) -> str:
+        bmi = self.bmi
+        return "Underweight" if bmi < 18.5 else "Normal weight" if bmi < 25 else "Overweight" if bmi < 30 else "Obese"
+
+    @_memoized
+    def days_since_period(self) -> Optional[int]:
+        """Days since the last menstruation started, or None if no date was given."""
+        if not self.menstruation_date:
+            return None
+        # Stored as YYYY-MM-DD; fromisoformat parses it much faster than strptime
+        return (datetime.now() - datetime.fromisoformat(self.menstruation_date)).days
+
+    @_memoized
+    def calorie_target(self) -> int:
+        """Recommended daily calories from the age and BMI table."""
+        return calculate_calories(self.age, self.bmi)
+
+    @_memoized
+    def macros(self) -> Dict[str, float]:
+        """Grams of carbohydrates, proteins and fats for calorie_target."""
+        return calculate_macros(self.calorie_target)
+
+    @_memoized
+    def water(self) -> float:
+        """Recommended daily water in mL."""
+        return water_intake(self.weight)
+
+    @_memoized
+    def base_calories(self) -> float:
+        """Resting energy expenditure (Harris-Benedict for women)."""
+        return 655 + (9.6 * self.weight) + (1.8 * self.height) - (4.7 * self.age)
+
+    def calorie_needs(self, activity_multiplier: float) -> float:
+        """Estimated daily calories at an activity level, plus the extra needed in pregnancy."""
+        calories = self.base_calories * activity_multiplier
+        if self.is_pregnant:
+            week = self.pregnancy_week or 0
+            calories += PREGNANCY_CALORIES[0 if week <= 13 else 1 if week <= 26 else 2]
+        return calories
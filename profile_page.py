@@ -1,73 +1,40 @@
 import streamlit as st
 
 from datetime import datetime
+import events
+import metrics
+from cache_backend import get_cache
+from profile_model import Profile
+
+# Profiles are read on every page; saves invalidate the cached copy
+PROFILE_TTL = 300
 
 # Function to save user profile
-def save_profile(conn, profile_data):
+@metrics.timed("db")
+def save_profile(store, profile_data):
     try:
-        c = conn.cursor()
-        
-        # Check if profile already exists
-        c.execute("SELECT id FROM profiles WHERE user_id = ?", (profile_data['user_id'],))
-        existing_profile = c.fetchone()
-        
-        if existing_profile:
-            # Update existing profile
-            query = '''
-            UPDATE profiles SET 
-                full_name = ?, age = ?, education = ?, height = ?, weight = ?,
-                menstruation_date = ?, is_regular_cycle = ?, diseases = ?,
-                food_allergies = ?, is_pregnant = ?, pregnancy_week = ?,
-                last_updated = CURRENT_TIMESTAMP
-            WHERE user_id = ?
-            '''
-            c.execute(query, (
-                profile_data['full_name'], profile_data['age'], profile_data['education'],
-                profile_data['height'], profile_data['weight'], profile_data['menstruation_date'],
-                profile_data['is_regular_cycle'], profile_data['diseases'], profile_data['food_allergies'],
-                profile_data['is_pregnant'], profile_data['pregnancy_week'], profile_data['user_id']
-            ))
-        else:
-            # Insert new profile
-            query = '''
-            INSERT INTO profiles (
-                user_id, full_name, age, education, height, weight,
-                menstruation_date, is_regular_cycle, diseases,
-                food_allergies, is_pregnant, pregnancy_week
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            '''
-            c.execute(query, (
-                profile_data['user_id'], profile_data['full_name'], profile_data['age'], 
-                profile_data['education'], profile_data['height'], profile_data['weight'],
-                profile_data['menstruation_date'], profile_data['is_regular_cycle'], 
-                profile_data['diseases'], profile_data['food_allergies'],
-                profile_data['is_pregnant'], profile_data['pregnancy_week']
-            ))
-        
-        conn.commit()
+        store.save_profile(profile_data)
+        get_cache().delete("profile", str(profile_data['user_id']))
+        events.publish(events.PROFILE_CHANGED, user_id=profile_data['user_id'])
         return True
     except Exception as e:
         st.error(f"Error saving profile: {e}")
         return False
 
 # Function to get user profile
-def get_profile(conn, user_id):
-    c = conn.cursor()
-    c.execute("SELECT * FROM profiles WHERE user_id = ?", (user_id,))
-    result = c.fetchone()
-    
-    if result:
-        columns = [desc[0] for desc in c.description]
-        profile = {columns[i]: result[i] for i in range(len(columns))}
-        return profile
-    return None
+@metrics.timed("db")
+def get_profile(store, user_id):
+    profile = get_cache().get_or_set("profile", str(user_id), lambda: store.get_profile(user_id), ttl=PROFILE_TTL)
+    # Entries cached before profiles were Profile records are plain dicts
+    return Profile.from_dict(profile) if isinstance(profile, dict) else profile
 
-def profile_page(conn):
+@metrics.timed("page", "profile")
+def profile_page(store):
     st.title("My Nutrition Profile")
     st.write("Please provide your details for personalized nutrition recommendations.")
 
     # Get existing profile if available
-    existing_profile = get_profile(conn, st.session_state.user_id)
+    existing_profile = get_profile(store, st.session_state.user_id)
 
     # Create form for profile information
     with st.form("profile_form"):
@@ -110,7 +77,7 @@ def profile_page(conn):
                 'pregnancy_week': pregnancy_week
             }
 
-            if save_profile(conn, profile_data):
+            if save_profile(store, profile_data):
                 st.success("Profile saved successfully!")
                 st.session_state.page = "dashboard"
                 st.experimental_rerun()
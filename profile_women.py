@@ -1,3 +1,4 @@
+import os
 import streamlit as st
 import sqlite3
 import pandas as pd
@@ -8,6 +9,9 @@ from auth import auth_page
 from dashboard import dashboard_page
 from profile_page import profile_page
 from nutrition_advise import show_nutrition_page
+import metrics
+import precompute  # noqa: F401  (regenerates advice when a profile changes)
+from storage import get_storage
 
 # Page configuration
 st.set_page_config(
@@ -17,46 +21,6 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize connection to SQLite database
-def init_db():
-    conn = sqlite3.connect('nutrition_database.db')
-    c = conn.cursor()
-    
-    # Create users table if it doesn't exist
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create profile table if it doesn't exist
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS profiles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            full_name TEXT NOT NULL,
-            age INTEGER NOT NULL,
-            education TEXT,
-            height REAL NOT NULL,
-            weight REAL NOT NULL,
-            menstruation_date TEXT,
-            is_regular_cycle BOOLEAN,
-            diseases TEXT,
-            food_allergies TEXT,
-            is_pregnant BOOLEAN,
-            pregnancy_week INTEGER,
-            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.commit()
-    return conn
-
 # Function to hash passwords
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
@@ -146,8 +110,13 @@ def get_profile(conn, user_id):
         return profile
     return None
 
-# Initialize database connection
-conn = init_db()
+# Expose page, DB and LLM latency histograms in Prometheus text format, either
+# on a local /metrics endpoint or as a file for node_exporter's textfile collector
+if os.getenv("NUTRIOMEN_METRICS_PORT"):
+    metrics.start_http_server(int(os.getenv("NUTRIOMEN_METRICS_PORT")))
+
+# Users, profiles and jobs live in the configured storage ($NUTRIOMEN_DATABASE_URL)
+store = get_storage()
 
 # Initialize session state variables
 if 'logged_in' not in st.session_state:
@@ -182,18 +151,18 @@ if st.session_state.logged_in:
 
 # Main application
 if not st.session_state.logged_in:
-    auth_page(conn)
+    auth_page(store)
 
 else:
     # User is logged in - show the appropriate page
     if st.session_state.page == "dashboard":
-        dashboard_page(conn)
+        dashboard_page(store)
     
     elif st.session_state.page == "profile":
-        profile_page(conn)
+        profile_page(store)
     
     elif st.session_state.page == "nutrition":
-        show_nutrition_page(conn)
+        show_nutrition_page(store)
 
-# Close the database connection when the app is done
-conn.close()
\ No newline at end of file
+if os.getenv("NUTRIOMEN_METRICS_FILE"):
+    metrics.write_prometheus(os.getenv("NUTRIOMEN_METRICS_FILE"))
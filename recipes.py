@@ -0,0 +1,269 @@
+import argparse
+import random
+import re
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import metrics
+from storage import Storage, get_storage
+
+# Recipe catalog.
+#
+# Recipes are rows of the recipes table with their per-serving nutrients in
+# columns. Search goes through an inverted index, recipe_terms: one
+# (term, recipe_id) row per ingredient ("ing:spinach"), tag ("tag:breakfast")
+# and diet ("diet:vegan") of each recipe, keyed on (term, recipe_id). A search
+# walks the postings of its rarest term (recipe_term_counts keeps each term's
+# recipe count) newest first, joins the other terms' postings and the recipe
+# row on primary keys, and applies the nutrient ranges to the rows it meets,
+# stopping as soon as a page is full.
+#
+# Pages are keyset-paginated on the recipe id: the cursor for the next page is
+# the last id shown, so every page costs the same however deep it is.
+
+DIETS = ["Balanced", "Vegan", "Vegetarian", "Keto", "Low-Carb", "High-Protein", "Mediterranean"]
+TAGS = ["breakfast", "lunch", "dinner", "snack", "quick", "pregnancy-friendly", "iron-rich", "high-fiber",
+        "bone-health", "budget"]
+# Per-serving nutrient columns, with labels for the page
+NUTRIENTS = {"calories": ("Calories", "kcal"), "protein_g": ("Protein", "g"), "carbs_g": ("Carbohydrates", "g"),
+             "fat_g": ("Fat", "g"), "fiber_g": ("Fiber", "g"), "iron_mg": ("Iron", "mg"),
+             "calcium_mg": ("Calcium", "mg"), "folate_ug": ("Folate", "µg"), "vitamin_c_mg": ("Vitamin C", "mg")}
+COLUMNS = ["title", "diet", "servings", "minutes", "ingredients", "tags", "instructions", "image_query", *NUTRIENTS]
+PAGE_SIZE = 20
+
+STARTER_RECIPES = [
+    {"title": "Spinach and Lentil Dal", "diet": "Vegan", "servings": 4, "minutes": 35,
+     "ingredients": ["red lentils", "spinach", "tomatoes", "onion", "garlic", "ginger", "cumin", "lemon"],
+     "tags": ["dinner", "iron-rich", "high-fiber", "budget"],
+     "instructions": "Simmer the lentils with onion, garlic, ginger and cumin, stir in tomatoes and spinach, "
+                     "finish with lemon juice.", "image_query": "lentil dal",
+     "calories": 380, "protein_g": 21, "carbs_g": 58, "fat_g": 6, "fiber_g": 15, "iron_mg": 7.1,
+     "calcium_mg": 120, "folate_ug": 410, "vitamin_c_mg": 32},
+    {"title": "Salmon, Quinoa and Broccoli Bowl", "diet": "Balanced", "servings": 2, "minutes": 25,
+     "ingredients": ["salmon", "quinoa", "broccoli", "olive oil", "lemon"],
+     "tags": ["lunch", "dinner", "pregnancy-friendly", "bone-health"],
+     "instructions": "Roast the salmon and broccoli, serve over quinoa with olive oil and lemon.",
+     "image_query": "salmon quinoa bowl",
+     "calories": 520, "protein_g": 36, "carbs_g": 38, "fat_g": 24, "fiber_g": 7, "iron_mg": 3.4,
+     "calcium_mg": 110, "folate_ug": 150, "vitamin_c_mg": 95},
+    {"title": "Greek Yogurt Berry Parfait", "diet": "Vegetarian", "servings": 1, "minutes": 5,
+     "ingredients": ["greek yogurt", "berries", "oats", "chia seeds", "honey"],
+     "tags": ["breakfast", "snack", "quick", "bone-health"],
+     "instructions": "Layer yogurt, berries, oats and chia seeds; drizzle with honey.",
+     "image_query": "yogurt parfait",
+     "calories": 320, "protein_g": 22, "carbs_g": 42, "fat_g": 8, "fiber_g": 8, "iron_mg": 2.1,
+     "calcium_mg": 310, "folate_ug": 40, "vitamin_c_mg": 25},
+    {"title": "Chicken and Chickpea Power Salad", "diet": "High-Protein", "servings": 2, "minutes": 20,
+     "ingredients": ["chicken breast", "chickpeas", "spinach", "cucumber", "feta", "olive oil"],
+     "tags": ["lunch", "quick", "iron-rich"],
+     "instructions": "Grill the chicken, toss with chickpeas, spinach, cucumber and feta, dress with olive oil.",
+     "image_query": "chicken chickpea salad",
+     "calories": 480, "protein_g": 42, "carbs_g": 28, "fat_g": 20, "fiber_g": 9, "iron_mg": 5.2,
+     "calcium_mg": 180, "folate_ug": 210, "vitamin_c_mg": 18},
+    {"title": "Avocado Egg Breakfast Plate", "diet": "Keto", "servings": 1, "minutes": 10,
+     "ingredients": ["eggs", "avocado", "spinach", "cheddar"],
+     "tags": ["breakfast", "quick"],
+     "instructions": "Scramble the eggs with spinach and cheddar, serve with sliced avocado.",
+     "image_query": "avocado eggs breakfast",
+     "calories": 450, "protein_g": 24, "carbs_g": 9, "fat_g": 36, "fiber_g": 7, "iron_mg": 3.0,
+     "calcium_mg": 260, "folate_ug": 190, "vitamin_c_mg": 12},
+    {"title": "Tofu and Edamame Stir Fry", "diet": "Vegan", "servings": 3, "minutes": 25,
+     "ingredients": ["tofu", "edamame", "bell pepper", "broccoli", "soy sauce", "sesame seeds", "brown rice"],
+     "tags": ["dinner", "iron-rich", "bone-health", "pregnancy-friendly"],
+     "instructions": "Stir fry the tofu until golden, add vegetables and edamame, season with soy sauce and "
+                     "sesame, serve with brown rice.", "image_query": "tofu stir fry",
+     "calories": 440, "protein_g": 27, "carbs_g": 48, "fat_g": 15, "fiber_g": 9, "iron_mg": 6.3,
+     "calcium_mg": 420, "folate_ug": 280, "vitamin_c_mg": 88},
+]
+
+
+def normalize(word: str) -> str:
+    """Index form of an ingredient, tag or diet: lower case, single spaces, simple plurals made singular."""
+    word = re.sub(r"\s+", " ", word.strip().lower())
+    if word.endswith("oes"):
+        return word[:-2]
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith(("ss", "us")) and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def recipe_terms(recipe: Dict[str, Any]) -> List[str]:
+    terms = {f"ing:{normalize(i)}" for i in recipe["ingredients"]}
+    terms |= {f"tag:{normalize(t)}" for t in recipe["tags"]}
+    terms.add(f"diet:{normalize(recipe['diet'])}")
+    return sorted(terms)
+
+
+def query_terms(ingredients: Iterable[str] = (), tags: Iterable[str] = (), diets: Iterable[str] = ()) -> List[str]:
+    terms = [f"ing:{normalize(i)}" for i in ingredients if i.strip()]
+    terms += [f"tag:{normalize(t)}" for t in tags]
+    terms += [f"diet:{normalize(d)}" for d in diets]
+    return list(dict.fromkeys(terms))
+
+
+class RecipeStore:
+    """Recipes and their inverted index in the app database."""
+
+    def __init__(self, store: Optional[Storage] = None):
+        self.store = store or get_storage()
+
+    def add_recipes(self, recipes: Sequence[Dict[str, Any]]) -> List[int]:
+        """Insert recipes and index them, in one transaction; returns their ids."""
+        insert = f"INSERT INTO recipes ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        ids, postings, counts = [], [], {}
+        with self.store.connection() as conn:
+            cursor = conn.cursor()
+            for recipe in recipes:
+                values = dict(recipe, ingredients="\n".join(recipe["ingredients"]), tags=",".join(recipe["tags"]))
+                recipe_id = self.store._insert(cursor, insert, [values.get(column) for column in COLUMNS])
+                ids.append(recipe_id)
+                for term in recipe_terms(recipe):
+                    postings.append((term, recipe_id))
+                    counts[term] = counts.get(term, 0) + 1
+            cursor.executemany(self.store._sql("INSERT INTO recipe_terms (term, recipe_id) VALUES (?, ?)"), postings)
+            cursor.executemany(self.store._sql("""
+                INSERT INTO recipe_term_counts (term, recipes) VALUES (?, ?)
+                ON CONFLICT (term) DO UPDATE SET recipes = recipe_term_counts.recipes + excluded.recipes"""),
+                list(counts.items()))
+        return ids
+
+    def count(self) -> int:
+        return self.store.query_one("SELECT COUNT(*) AS n FROM recipes")["n"]
+
+    def get(self, recipe_id: int) -> Optional[Dict[str, Any]]:
+        row = self.store.query_one("SELECT * FROM recipes WHERE id = ?", (recipe_id,))
+        return _unpack(row) if row else None
+
+    def term_counts(self, terms: Sequence[str]) -> Dict[str, int]:
+        rows = self.store.query(f"SELECT term, recipes FROM recipe_term_counts WHERE term IN ({', '.join('?' * len(terms))})",
+                                terms)
+        return {row["term"]: row["recipes"] for row in rows}
+
+    @metrics.timed("db", "recipe_search")
+    def search(self, ingredients: Iterable[str] = (), tags: Iterable[str] = (), diets: Iterable[str] = (),
+               min_nutrients: Optional[Dict[str, float]] = None, max_nutrients: Optional[Dict[str, float]] = None,
+               after: Optional[int] = None, limit: int = PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Recipes with every given ingredient, tag and diet whose per-serving
+        nutrients are within the ranges, newest first. Returns the page and
+        the cursor for the next one (None on the last page); pass it as `after`.
+        Several diets mean any of them.
+        """
+        where, params = [], []
+        for bound, ranges in ((">=", min_nutrients), ("<=", max_nutrients)):
+            for column, value in (ranges or {}).items():
+                if column not in NUTRIENTS:
+                    raise ValueError(f"unknown nutrient {column!r}")
+                where.append(f"r.{column} {bound} ?")
+                params.append(value)
+
+        terms = query_terms(ingredients, tags)
+        diet_terms = query_terms(diets=diets)
+        if len(diet_terms) == 1:
+            terms += diet_terms
+        if terms:
+            counts = self.term_counts(terms)
+            if len(counts) < len(terms):
+                return [], None  # a term no recipe has
+            # Walk the shortest posting list; check the others by primary key
+            terms.sort(key=counts.get)
+            joins = [f"JOIN recipe_terms t{i} ON t{i}.term = ? AND t{i}.recipe_id = t0.recipe_id"
+                     for i in range(1, len(terms))]
+            sql = (f"SELECT r.* FROM recipe_terms t0 {' '.join(joins)} JOIN recipes r ON r.id = t0.recipe_id "
+                   f"WHERE t0.term = ?")
+            params = terms[1:] + [terms[0]] + params
+            key = "t0.recipe_id"
+        else:
+            sql, key = "SELECT r.* FROM recipes r WHERE 1 = 1", "r.id"
+        if len(diet_terms) > 1:
+            # Any of the diets: one of their postings for the recipe, matched the way a single diet is
+            where.append(f"EXISTS (SELECT 1 FROM recipe_terms d WHERE d.term IN ({', '.join('?' * len(diet_terms))}) "
+                         f"AND d.recipe_id = {key})")
+            params += diet_terms
+        if where:
+            sql += " AND " + " AND ".join(where)
+        if after is not None:
+            sql += f" AND {key} < ?"
+            params.append(after)
+        sql += f" ORDER BY {key} DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = [_unpack(row) for row in self.store.query(sql, params)]
+        return rows[:limit], rows[limit - 1]["id"] if len(rows) > limit else None
+
+    def seed_starters(self) -> int:
+        """Add the starter recipes to an empty catalog; returns how many were added."""
+        if self.store.query_one("SELECT id FROM recipes LIMIT 1"):
+            return 0
+        return len(self.add_recipes(STARTER_RECIPES))
+
+
+def _unpack(row: Dict[str, Any]) -> Dict[str, Any]:
+    row["ingredients"] = row["ingredients"].split("\n") if row["ingredients"] else []
+    row["tags"] = row["tags"].split(",") if row["tags"] else []
+    return row
+
+
+def synthetic_recipes(count: int, seed: int = 0) -> Iterable[Dict[str, Any]]:
+    """Plausible random recipes, for load testing the catalog."""
+    rng = random.Random(seed)
+    pantry = sorted({normalize(i) for r in STARTER_RECIPES for i in r["ingredients"]} |
+                    {f"ingredient {i}" for i in range(400)})
+    for n in range(count):
+        protein = round(rng.lognormvariate(2.8, 0.5), 1)
+        yield {
+            "title": f"Recipe {n}", "diet": rng.choice(DIETS), "servings": rng.randint(1, 6),
+            "minutes": rng.randint(5, 90), "ingredients": rng.sample(pantry, rng.randint(4, 12)),
+            "tags": rng.sample(TAGS, rng.randint(1, 4)), "instructions": "Combine and cook.",
+            "image_query": "healthy food", "calories": round(rng.uniform(150, 900)), "protein_g": protein,
+            "carbs_g": round(rng.uniform(5, 90), 1), "fat_g": round(rng.uniform(2, 45), 1),
+            "fiber_g": round(rng.uniform(0, 18), 1), "iron_mg": round(rng.lognormvariate(0.9, 0.6), 1),
+            "calcium_mg": round(rng.uniform(20, 500)), "folate_ug": round(rng.uniform(10, 450)),
+            "vitamin_c_mg": round(rng.uniform(0, 120)),
+        }
+
+
+_recipes: Optional[RecipeStore] = None
+_recipes_lock = threading.Lock()
+
+
+def get_recipe_store() -> RecipeStore:
+    global _recipes
+    if _recipes is None:
+        with _recipes_lock:
+            if _recipes is None:
+                _recipes = RecipeStore()
+                _recipes.seed_starters()
+    return _recipes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recipe catalog tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("seed", help="add the starter recipes to an empty catalog")
+    generate = sub.add_parser("generate", help="add synthetic recipes (for load testing)")
+    generate.add_argument("--count", type=int, default=100_000)
+    generate.add_argument("--batch-size", type=int, default=5_000)
+    args = parser.parse_args(argv)
+
+    recipes = RecipeStore()
+    if args.command == "seed":
+        print(f"{recipes.seed_starters()} recipes added")
+    else:
+        batch = []
+        for recipe in synthetic_recipes(args.count, seed=recipes.count()):
+            batch.append(recipe)
+            if len(batch) == args.batch_size:
+                recipes.add_recipes(batch)
+                batch = []
+        if batch:
+            recipes.add_recipes(batch)
+        print(f"{args.count} recipes added, {recipes.count()} in the catalog")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
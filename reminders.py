@@ -0,0 +1,418 @@
+import argparse
+import heapq
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+import events
+import metrics
+from storage import Storage, get_storage
+
+# Hydration and meal reminders.
+#
+# A schedule is a daily window and an interval in the user's local time (water
+# every 2 hours from 08:00 to 20:00, say, in Europe/Berlin), stored in
+# reminder_schedules with the time it next fires. Schedules with a time zone
+# follow its DST changes; ones with only a UTC offset keep that offset. One
+# worker thread keeps every schedule in a heap ordered by that time and
+# sleeps until the earliest is due, or until a new schedule comes due sooner.
+# Due reminders are delivered in batches: one transaction writes them to
+# reminder_inbox and saves the next fire times. Pages poll the inbox by
+# primary key. It holds only the latest undismissed reminder of each kind per
+# user, so a user who is away doesn't return to a pile of stale reminders,
+# and the table never grows past one row per schedule.
+#
+# Changing or cancelling a schedule doesn't search the heap. The new fire time
+# is pushed, and any entry that no longer matches its schedule is dropped when
+# it reaches the top. On startup the heap is rebuilt from the table. Slots
+# missed while the process was down are delivered once, not once per slot.
+# With shared storage (PostgreSQL), run the worker on a single replica: set
+# NUTRIOMEN_REMINDER_WORKER=0 on the others, or on all of them and run
+# `python reminders.py run`. Every write stamps the row's updated_at, and a
+# cancelled schedule keeps its row with no next_fire_at. The worker re-reads
+# rows changed since its last sync every SYNC_INTERVAL seconds, so changes and
+# cancellations made on other replicas reach its heap.
+
+logger = logging.getLogger("reminders")
+
+# kind -> (interval_minutes, start "HH:MM", end "HH:MM")
+DEFAULTS = {
+    "water": (120, "08:00", "20:00"),
+    "meal": (300, "08:00", "18:00"),
+}
+BATCH_SIZE = 5000
+# Longest sleep between heap checks, so a stopped worker exits promptly
+MAX_SLEEP = 60.0
+RUN_WORKER = os.getenv("NUTRIOMEN_REMINDER_WORKER", "1") != "0"
+SYNC_INTERVAL = float(os.getenv("NUTRIOMEN_REMINDER_SYNC", "5"))
+# Each sync re-reads a little before the last one, for writes that committed late or on a skewed clock
+SYNC_OVERLAP = 60
+
+Schedule = namedtuple("Schedule", ["interval_minutes", "start_minute", "end_minute", "utc_offset_minutes",
+                                   "timezone", "amount_ml", "next_fire_at"])
+SCHEDULE_COLUMNS = "user_id, kind, " + ", ".join(Schedule._fields)
+SCHEDULE_INSERT = (f"INSERT INTO reminder_schedules ({SCHEDULE_COLUMNS}, updated_at) "
+                   f"VALUES ({', '.join('?' * (len(Schedule._fields) + 3))})")
+
+
+def minutes(clock_time: str) -> int:
+    """'HH:MM' as minutes after midnight."""
+    hours, mins = clock_time.split(":")
+    return int(hours) * 60 + int(mins)
+
+
+def local_utc_offset() -> int:
+    """This server's UTC offset in minutes."""
+    return int(datetime.now().astimezone().utcoffset().total_seconds()) // 60
+
+
+def local_timezone() -> Optional[str]:
+    """This server's time zone name ($TZ or /etc/localtime), the default for new schedules."""
+    name = os.getenv("TZ", "").lstrip(":")
+    if not name and os.path.islink("/etc/localtime"):
+        name = os.path.realpath("/etc/localtime").partition("zoneinfo/")[2]
+    return name if name in timezones() else None
+
+
+@lru_cache(maxsize=1)
+def timezones() -> List[str]:
+    """Every time zone name known to this system, sorted."""
+    return sorted(available_timezones())
+
+
+def utc_offset(schedule: Schedule, at: float) -> int:
+    """The schedule's UTC offset in minutes at `at`: its time zone's, DST included, if it has one."""
+    if not schedule.timezone:
+        return schedule.utc_offset_minutes
+    return int(datetime.fromtimestamp(at, ZoneInfo(schedule.timezone)).utcoffset().total_seconds()) // 60
+
+
+def daily_slots(schedule: Schedule) -> int:
+    return (schedule.end_minute - schedule.start_minute) // schedule.interval_minutes + 1
+
+
+def next_fire(schedule: Schedule, after: float) -> int:
+    """The first reminder time of `schedule` strictly after `after` (Unix seconds)."""
+    offset = utc_offset(schedule, after)
+    fire = _next_fire(schedule, after, offset)
+    if schedule.timezone:
+        # Across a DST change the slot keeps its local time, in the offset in force then
+        actual = utc_offset(schedule, fire)
+        if actual != offset and _next_fire(schedule, after, actual) > after:
+            fire = _next_fire(schedule, after, actual)
+    return fire
+
+
+def _next_fire(schedule: Schedule, after: float, offset_minutes: int) -> int:
+    offset = offset_minutes * 60
+    local = int(after) + offset
+    day = local - local % 86400
+    start, interval = schedule.start_minute * 60, schedule.interval_minutes * 60
+    since = local - day
+    if since < start:
+        slot = start
+    else:
+        slot = start + ((since - start) // interval + 1) * interval
+        if slot > schedule.end_minute * 60:
+            slot = 86400 + start
+    return day + slot - offset
+
+
+def message(kind: str, schedule: Schedule) -> str:
+    if kind == "water":
+        if schedule.amount_ml:
+            target = schedule.amount_ml * daily_slots(schedule) / 1000
+            return (f"Time for a glass of water: about {schedule.amount_ml} mL keeps you on track "
+                    f"for {target:.1f} L today.")
+        return "Time for a glass of water."
+    return "Time for a balanced meal: protein, whole grains and plenty of vegetables."
+
+
+def _schedule_entry(cursor, row) -> Tuple[Tuple[int, str], Schedule]:
+    # Every row would otherwise get its own copy of the kind and time zone strings
+    timezone = row[6] and sys.intern(row[6])
+    return (row[0], sys.intern(row[1])), Schedule._make((*row[2:6], timezone, *row[7:]))
+
+
+class ReminderService:
+    """Reminder schedules, the worker that delivers them, and each user's inbox."""
+
+    def __init__(self, store: Optional[Storage] = None, clock=time.time, batch_size: int = BATCH_SIZE):
+        self.store = store or get_storage()
+        self.batch_size = batch_size
+        self._clock = clock
+        # (user_id, kind) -> Schedule; the heap holds (next_fire_at, user_id, kind)
+        self._schedules: Dict[Tuple[int, str], Schedule] = {}
+        self._heap: List[Tuple[int, int, str]] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._synced_at = clock()
+
+    # Schedules
+
+    def load(self) -> int:
+        """Rebuild the heap from the stored schedules."""
+        self._synced_at = self._clock()
+        rows = self.store.query_as(_schedule_entry, f"SELECT {SCHEDULE_COLUMNS} FROM reminder_schedules "
+                                                    f"WHERE next_fire_at IS NOT NULL")
+        with self._lock:
+            self._schedules = dict(rows)
+            self._heap = [(s.next_fire_at, user_id, kind) for (user_id, kind), s in self._schedules.items()]
+            heapq.heapify(self._heap)
+            metrics.set_gauge("reminder_schedules", len(self._schedules))
+            self._wakeup.notify()
+        return len(rows)
+
+    def sync(self) -> int:
+        """Apply schedules changed since the last sync, here or on another replica; returns how many changed."""
+        since, self._synced_at = self._synced_at, self._clock()
+        rows = self.store.query_as(_schedule_entry, f"SELECT {SCHEDULE_COLUMNS} FROM reminder_schedules "
+                                                    f"WHERE updated_at >= ?", (int(since - SYNC_OVERLAP),))
+        changed = 0
+        with self._lock:
+            for key, schedule in rows:
+                if schedule.next_fire_at is None:
+                    changed += self._schedules.pop(key, None) is not None
+                elif self._schedules.get(key) != schedule:
+                    self._schedules[key] = schedule
+                    heapq.heappush(self._heap, (schedule.next_fire_at, *key))
+                    changed += 1
+            if changed:
+                metrics.set_gauge("reminder_schedules", len(self._schedules))
+        metrics.inc("reminder_syncs_total")
+        return changed
+
+    def schedule(self, user_id: int, kind: str, interval_minutes: Optional[int] = None, start: Optional[str] = None,
+                 end: Optional[str] = None, utc_offset_minutes: Optional[int] = None, timezone: Optional[str] = None,
+                 amount_ml: Optional[int] = None) -> Schedule:
+        """
+        Create or replace a user's reminders of `kind`; unset arguments take
+        the kind's defaults. The window is in `timezone` if given, else at
+        `utc_offset_minutes`, else in this server's time zone.
+        """
+        if kind not in DEFAULTS:
+            raise ValueError(f"unknown reminder kind {kind!r}")
+        if timezone is None and utc_offset_minutes is None:
+            timezone = local_timezone()
+            utc_offset_minutes = local_utc_offset()
+        if timezone is not None:
+            try:
+                ZoneInfo(timezone)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise ValueError(f"unknown time zone {timezone!r}") from None
+        default_interval, default_start, default_end = DEFAULTS[kind]
+        schedule = Schedule(interval_minutes or default_interval, minutes(start or default_start),
+                            minutes(end or default_end), utc_offset_minutes or 0, timezone, amount_ml, 0)
+        if schedule.interval_minutes <= 0 or not 0 <= schedule.start_minute <= schedule.end_minute < 1440:
+            raise ValueError("reminders need a positive interval and a window within one day")
+        now = self._clock()
+        # The offset is kept as of now, for reference; the time zone is what counts
+        schedule = schedule._replace(utc_offset_minutes=utc_offset(schedule, now))
+        schedule = schedule._replace(next_fire_at=next_fire(schedule, now))
+        self.store.execute(f"""
+            {SCHEDULE_INSERT}
+            ON CONFLICT (user_id, kind) DO UPDATE SET interval_minutes = excluded.interval_minutes,
+                start_minute = excluded.start_minute, end_minute = excluded.end_minute,
+                utc_offset_minutes = excluded.utc_offset_minutes, timezone = excluded.timezone,
+                amount_ml = excluded.amount_ml, next_fire_at = excluded.next_fire_at,
+                updated_at = excluded.updated_at""", (user_id, kind, *schedule, int(now)))
+        with self._lock:
+            self._schedules[(user_id, kind)] = schedule
+            heapq.heappush(self._heap, (schedule.next_fire_at, user_id, kind))
+            metrics.set_gauge("reminder_schedules", len(self._schedules))
+            if self._heap[0][1:] == (user_id, kind):
+                self._wakeup.notify()
+        return schedule
+
+    def schedule_water(self, user_id: int, daily_ml: float, **kwargs) -> Schedule:
+        """Water reminders that together add up to `daily_ml` (see profile_model.water_intake)."""
+        interval, start, end = DEFAULTS["water"]
+        slots = daily_slots(Schedule(kwargs.get("interval_minutes") or interval, minutes(kwargs.get("start") or start),
+                                     minutes(kwargs.get("end") or end), 0, None, None, 0))
+        return self.schedule(user_id, "water", amount_ml=int(round(daily_ml / slots, -1)), **kwargs)
+
+    def cancel(self, user_id: int, kind: str) -> None:
+        # The row stays, without a fire time, so the worker's next sync sees the cancellation
+        self.store.execute("UPDATE reminder_schedules SET next_fire_at = NULL, updated_at = ? "
+                           "WHERE user_id = ? AND kind = ?", (int(self._clock()), user_id, kind))
+        with self._lock:
+            # Its heap entry is skipped when it comes due
+            self._schedules.pop((user_id, kind), None)
+            metrics.set_gauge("reminder_schedules", len(self._schedules))
+
+    def schedules(self, user_id: int) -> Dict[str, Schedule]:
+        """The user's active schedules, from the table: the heap may be on another replica."""
+        rows = self.store.query_as(_schedule_entry, f"SELECT {SCHEDULE_COLUMNS} FROM reminder_schedules "
+                                                    f"WHERE user_id = ? AND next_fire_at IS NOT NULL", (user_id,))
+        return {kind: schedule for (_, kind), schedule in rows}
+
+    def refresh_water(self, user_id: int) -> None:
+        """Recompute the water amounts from the user's current profile, if they have water reminders."""
+        current = self.schedules(user_id).get("water")
+        profile = current and self.store.get_profile(user_id)
+        if not profile:
+            return
+        self.schedule_water(user_id, profile.water, interval_minutes=current.interval_minutes,
+                            start=f"{current.start_minute // 60:02d}:{current.start_minute % 60:02d}",
+                            end=f"{current.end_minute // 60:02d}:{current.end_minute % 60:02d}",
+                            utc_offset_minutes=current.utc_offset_minutes, timezone=current.timezone)
+
+    # Delivery
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """Deliver up to one batch of due reminders; returns how many were delivered."""
+        now = self._clock() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                fire_at, user_id, kind = heapq.heappop(self._heap)
+                schedule = self._schedules.get((user_id, kind))
+                if schedule is None or schedule.next_fire_at != fire_at:
+                    continue
+                # From now rather than from fire_at: missed slots are delivered once
+                schedule = self._schedules[(user_id, kind)] = schedule._replace(next_fire_at=next_fire(schedule, now))
+                heapq.heappush(self._heap, (schedule.next_fire_at, user_id, kind))
+                due.append((user_id, kind, fire_at, schedule))
+        if not due:
+            return 0
+        with metrics.timer("reminders", "deliver"), self.store.connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(self.store._sql("""
+                INSERT INTO reminder_inbox (user_id, kind, message, fire_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id, kind) DO UPDATE SET message = excluded.message, fire_at = excluded.fire_at"""),
+                [(user_id, kind, message(kind, schedule), fire_at) for user_id, kind, fire_at, schedule in due])
+            # Only rows still at the fire time just delivered: one changed or cancelled elsewhere is left alone
+            cursor.executemany(self.store._sql(
+                "UPDATE reminder_schedules SET next_fire_at = ? WHERE user_id = ? AND kind = ? AND next_fire_at = ?"),
+                [(schedule.next_fire_at, user_id, kind, fire_at) for user_id, kind, fire_at, schedule in due])
+        metrics.inc("reminders_delivered_total", len(due))
+        return len(due)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        with self._lock:
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                if self._clock() - self._synced_at >= SYNC_INTERVAL:
+                    self.sync()
+                delivered = self.run_due()
+            except Exception as e:
+                logger.error(f"Delivering reminders failed: {e}")
+                metrics.inc("reminder_errors_total")
+                delivered = 0
+            if delivered == self.batch_size:
+                continue
+            with self._lock:
+                delay = self._heap[0][0] - self._clock() if self._heap else MAX_SLEEP
+                if delay > 0 and not self._stopped.is_set():
+                    self._wakeup.wait(min(delay, MAX_SLEEP, SYNC_INTERVAL))
+
+    # Inbox
+
+    def inbox(self, user_id: int) -> List[Dict]:
+        """The user's undismissed reminders, newest first."""
+        return self.store.query("SELECT kind, message, fire_at FROM reminder_inbox WHERE user_id = ? "
+                                "ORDER BY fire_at DESC", (user_id,))
+
+    def dismiss(self, user_id: int, kind: Optional[str] = None) -> None:
+        if kind is None:
+            self.store.execute("DELETE FROM reminder_inbox WHERE user_id = ?", (user_id,))
+        else:
+            self.store.execute("DELETE FROM reminder_inbox WHERE user_id = ? AND kind = ?", (user_id, kind))
+
+
+_service: Optional[ReminderService] = None
+_service_lock = threading.Lock()
+
+
+def get_reminders() -> ReminderService:
+    """
+    Process-wide reminder service. Unless the worker is disabled it loads the
+    schedules and starts delivering on first use; without it, nothing is held
+    in memory and only the table is written.
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                service = ReminderService()
+                if RUN_WORKER:
+                    loaded = service.load()
+                    service.start()
+                    logger.info(f"Delivering reminders for {loaded} schedules")
+                _service = service
+    return _service
+
+
+def on_profile_changed(user_id: int, **_) -> None:
+    # Only users with water reminders get their amounts recomputed (refresh_water checks)
+    if _service is not None:
+        _service.refresh_water(user_id)
+
+
+events.subscribe(events.PROFILE_CHANGED, on_profile_changed)
+
+
+def generate_schedules(service: ReminderService, users: int, first_user_id: int = 1, seed: int = 0) -> None:
+    """Water and meal schedules for `users` consecutive user ids, with staggered windows (for load testing)."""
+    rng = random.Random(seed)
+    now = service._clock()
+    rows = []
+    for user_id in range(first_user_id, first_user_id + users):
+        offset = rng.choice((-300, -240, 0, 60, 120, 330, 480))
+        for kind, (interval, start, end) in DEFAULTS.items():
+            schedule = Schedule(rng.choice((interval // 2, interval)), minutes(start) + rng.randrange(0, 120, 15),
+                                minutes(end), offset, None, 250 if kind == "water" else None, 0)
+            rows.append((user_id, kind, *schedule._replace(next_fire_at=next_fire(schedule, now)), int(now)))
+    service.store.executemany(SCHEDULE_INSERT, rows)
+    service.load()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reminder tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("run", help="deliver reminders in the foreground")
+    generate = sub.add_parser("generate", help="add synthetic schedules (for load testing)")
+    generate.add_argument("--users", type=int, default=100_000)
+    generate.add_argument("--first-user-id", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    service = ReminderService()
+    if args.command == "generate":
+        generate_schedules(service, args.users, args.first_user_id)
+        print(f"{2 * args.users} schedules added")
+        return 0
+    logger.info(f"Delivering reminders for {service.load()} schedules")
+    service.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        service.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+import contextvars
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, TypeVar
+
+import metrics
+from llm_backends import BackendError, RateLimitError
+
+# Deadlines, retries and circuit breaking for upstream LLM calls.
+#
+# A page (or background job) sets a time budget with budget(); every LLM call
+# made inside it gets a deadline of whatever is left of that budget, capped
+# per call. Retryable errors are retried with jittered exponential backoff
+# while time remains, and a circuit breaker per provider stops sending
+# requests to a provider that keeps failing, so callers fail fast and fall
+# back to rule-based advice instead of piling onto a struggling upstream.
+
+logger = logging.getLogger("resilience")
+
+T = TypeVar("T")
+
+# Seconds a page (or a background job) may spend waiting on the LLM
+BUDGETS = {"chat": 20.0, "job": 60.0}
+DEFAULT_BUDGET = 30.0
+# No single upstream call may take longer than this, whatever the budget
+MAX_CALL_SECONDS = float(os.getenv("NUTRIOMEN_LLM_CALL_TIMEOUT", "20"))
+
+
+class DeadlineExceeded(BackendError):
+    """The call's time budget ran out."""
+
+
+class CircuitOpenError(BackendError):
+    """The provider's circuit breaker is open; the call was not attempted."""
+
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar("deadline", default=None)
+
+
+@contextmanager
+def budget(seconds: float):
+    """Limit the LLM calls made inside the block to `seconds` in total. Nested budgets only shrink."""
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def budget_seconds(name: str) -> float:
+    """The budget for a page or "job"; $NUTRIOMEN_BUDGET_<NAME> overrides the default."""
+    return float(os.getenv(f"NUTRIOMEN_BUDGET_{name.upper()}", BUDGETS.get(name, DEFAULT_BUDGET)))
+
+
+def page_budget(page: str):
+    """Decorator running a page under its LLM budget."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with budget(budget_seconds(page)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def remaining() -> float:
+    """Seconds left for the current call: the budget's remainder, capped at MAX_CALL_SECONDS."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return MAX_CALL_SECONDS
+    return min(MAX_CALL_SECONDS, deadline - time.monotonic())
+
+
+# Calls run here so the caller can stop waiting at the deadline. A timed-out
+# call keeps its worker until the provider returns, so the pool is sized for
+# that rather than for throughput.
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("NUTRIOMEN_LLM_CALL_THREADS", "32")),
+                               thread_name_prefix="llm-call")
+
+
+def call_with_deadline(fn: Callable[[], T], timeout: float) -> T:
+    if timeout <= 0:
+        raise DeadlineExceeded("no time left in the budget")
+    # Copy the context so metrics labels (current page) follow the call
+    future = _executor.submit(contextvars.copy_context().run, fn)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        future.cancel()
+        raise DeadlineExceeded(f"no response within {timeout:.1f}s") from None
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+
+    Closed: calls pass through. After `failure_threshold` consecutive
+    failures the breaker opens and calls fail immediately for
+    `reset_timeout` seconds. It then goes half-open and lets one trial call
+    through: success closes it, failure opens it again.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._export()
+
+    def _export(self) -> None:
+        metrics.set_gauge("llm_circuit_state", self.STATE_VALUES[self.state], provider=self.name)
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logger.info(f"Circuit for {self.name}: {self.state} -> {state}")
+            self.state = state
+            self._export()
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if self._clock() - self.opened_at < self.reset_timeout:
+                    metrics.inc("llm_circuit_rejected_total", provider=self.name)
+                    raise CircuitOpenError(f"{self.name} circuit open")
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self._trial_running:
+                    metrics.inc("llm_circuit_rejected_total", provider=self.name)
+                    raise CircuitOpenError(f"{self.name} circuit half-open, trial in progress")
+                self._trial_running = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._trial_running = False
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    metrics.inc("llm_circuit_trips_total", provider=self.name)
+                self.opened_at = self._clock()
+                self._set_state(self.OPEN)
+
+    def record_ignored(self) -> None:
+        """End a call that says nothing about the provider's health, such as one cut short by the caller's budget."""
+        with self._lock:
+            self._trial_running = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = _breakers[provider] = CircuitBreaker(
+                provider,
+                failure_threshold=int(os.getenv("NUTRIOMEN_CIRCUIT_FAILURES", "5")),
+                reset_timeout=float(os.getenv("NUTRIOMEN_CIRCUIT_RESET", "30")),
+            )
+        return breaker
+
+
+def backoff(attempt: int, base: float = 0.25, cap: float = 4.0, rng: Optional[random.Random] = None) -> float:
+    """Full-jitter exponential backoff: a random delay up to base * 2**attempt, capped."""
+    return (rng or random).uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_retryable(error: Exception) -> bool:
+    # Deadline and open-circuit errors mean there's no point trying again now
+    return isinstance(error, BackendError) and not isinstance(error, (DeadlineExceeded, CircuitOpenError))
+
+
+def call(provider: str, fn: Callable[[], T], attempts: int = 3) -> T:
+    """
+    Run `fn` against `provider` with a deadline, retries and the provider's circuit breaker.
+
+    Each attempt gets what is left of the current budget. Retryable errors
+    are retried up to `attempts` times in total, sleeping with jittered
+    backoff (or the provider's Retry-After) only while the budget allows.
+    An attempt that times out at MAX_CALL_SECONDS counts against the
+    breaker; one cut short by the caller's budget doesn't.
+    """
+    breaker = get_breaker(provider)
+    attempt = 0
+    while True:
+        timeout = remaining()
+        # The caller's budget running out is not the provider's fault, so it
+        # must not trip the breaker or take the half-open trial
+        if timeout <= 0:
+            metrics.inc("llm_call_failures_total", provider=provider, error="DeadlineExceeded")
+            raise DeadlineExceeded("no time left in the budget")
+        # Whether the per-call cap, not the caller's budget, bounds this attempt
+        capped = timeout >= MAX_CALL_SECONDS
+        breaker.before_call()
+        try:
+            result = call_with_deadline(fn, timeout)
+        except Exception as e:
+            # A provider that doesn't answer within the cap is failing, hung or not
+            if is_retryable(e) or (capped and isinstance(e, DeadlineExceeded)):
+                breaker.record_failure()
+            else:
+                breaker.record_ignored()
+            if not is_retryable(e) or attempt == attempts - 1:
+                metrics.inc("llm_call_failures_total", provider=provider, error=type(e).__name__)
+                raise
+            delay = backoff(attempt)
+            if isinstance(e, RateLimitError) and e.retry_after:
+                delay = max(delay, e.retry_after)
+            if delay >= remaining():
+                metrics.inc("llm_call_failures_total", provider=provider, error=type(e).__name__)
+                raise
+            metrics.inc("llm_retries_total", provider=provider, error=type(e).__name__)
+            time.sleep(delay)
+            attempt += 1
+        else:
+            breaker.record_success()
+            return result
@@ -0,0 +1,238 @@
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict, defaultdict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import metrics
+from profile_model import Profile
+
+# Semantic answer cache for chat questions.
+#
+# Questions are embedded as hashed TF-IDF vectors: words and word pairs are
+# hashed into a fixed number of features, weighted by log term frequency and an
+# IDF learned from the questions seen so far. Answers are only reused between
+# users in the same profile bucket (pregnancy, BMI class, age band, conditions,
+# allergies), since the answer was written for that profile. Candidates are
+# found through an inverted index over the hashed features and ranked by
+# cosine similarity; a candidate above the threshold is a hit. Follow-up
+# questions ("and for dinner?") depend on the conversation, so the turns the
+# prompt includes are part of the bucket as well (see conversation_key).
+
+DIMENSIONS = 1 << 18
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can could do does for from how i if in is it me my of on or
+should so that the this to was what when which who why will with would you your am im
+while during much many any some there get please
+""".split())
+
+Vector = Dict[int, float]
+
+
+def tokenize(text: str):
+    words = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        # Crude stemming so "foods" matches "food" and "eating" matches "eat"
+        for suffix in ("ing", "es", "s"):
+            if len(word) > len(suffix) + 2 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        words.append(word)
+    return words
+
+
+def features(text: str) -> Counter:
+    """Hashed unigram and bigram counts of a question."""
+    words = tokenize(text)
+    # Pairs are unordered so "iron rich foods" and "foods rich in iron" match
+    terms = words + [" ".join(sorted(pair)) for pair in zip(words, words[1:])]
+    return Counter(zlib.crc32(term.encode()) % DIMENSIONS for term in terms)
+
+
+def profile_bucket(profile: Optional[Profile]) -> Tuple:
+    """Coarse profile attributes that change what a good answer looks like."""
+    if not profile:
+        return ("anonymous",)
+    bmi = profile.bmi
+    bmi_class = "under" if bmi < 18.5 else "normal" if bmi < 25 else "over" if bmi < 30 else "obese"
+    if profile['is_pregnant']:
+        status = f"pregnant_t{min(3, (profile['pregnancy_week'] or 0) // 14 + 1)}"
+    else:
+        status = "cycle_regular" if profile['is_regular_cycle'] else "cycle_irregular"
+    normalize = lambda text: ",".join(sorted(p.strip().lower() for p in (text or "").split(",") if p.strip()))
+    return (status, bmi_class, (profile['age'] or 0) // 10 * 10,
+            normalize(profile['diseases']), normalize(profile['food_allergies']))
+
+
+def conversation_key(history: Sequence[Dict[str, str]], turns: int = 4) -> str:
+    """Digest of the last `turns` chat turns; empty for the first question of a conversation."""
+    if not history:
+        return ""
+    digest = hashlib.sha1()
+    for message in history[-turns:]:
+        digest.update(f"{message['role']}\0{message['content']}\0".encode())
+    return digest.hexdigest()[:16]
+
+
+class _Entry:
+    __slots__ = ("bucket", "question", "answer", "terms", "created")
+
+    def __init__(self, bucket, question, answer, terms, created):
+        self.bucket = bucket
+        self.question = question
+        self.answer = answer
+        self.terms = terms
+        self.created = created
+
+
+class SemanticCache:
+    """
+    In-memory near-duplicate question cache.
+
+    `threshold` is the minimum cosine similarity for a hit, `max_entries`
+    bounds the cache (least recently used entries are evicted first) and
+    `ttl` expires answers after that many seconds. Questions with fewer
+    than `min_terms` meaningful words are too vague to match and bypass the
+    cache.
+    """
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 5000, ttl: float = 24 * 3600,
+                 min_terms: int = 2, clock=time.monotonic):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_terms = min_terms
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        # bucket -> feature -> ids of entries containing it
+        self._postings: Dict[Tuple, Dict[int, set]] = defaultdict(lambda: defaultdict(set))
+        # feature -> number of cached questions containing it, for IDF
+        self._df: Counter = Counter()
+        self._next_id = 0
+        self._last_expiry = clock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _idf(self, feature: int) -> float:
+        return math.log((1 + len(self._entries)) / (1 + self._df[feature])) + 1
+
+    def _vector(self, terms: Counter) -> Vector:
+        vector = {f: (1 + math.log(tf)) * self._idf(f) for f, tf in terms.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {f: w / norm for f, w in vector.items()}
+
+    def lookup(self, bucket: Tuple, question: str) -> Optional[Tuple[str, float]]:
+        """Return (answer, similarity) of the closest cached question, or None below the threshold."""
+        terms = features(question)
+        if len(tokenize(question)) < self.min_terms:
+            metrics.inc("semantic_cache_requests_total", result="bypass")
+            return None
+        with self._lock:
+            self._expire()
+            postings = self._postings.get(bucket, {})
+            candidates = set()
+            for feature in terms:
+                candidates.update(postings.get(feature, ()))
+
+            best, best_score = None, 0.0
+            if candidates:
+                query = self._vector(terms)
+                cutoff = self._clock() - self.ttl
+                for entry_id in candidates:
+                    entry = self._entries[entry_id]
+                    if entry.created < cutoff:
+                        continue
+                    score = sum(query.get(f, 0.0) * w for f, w in self._vector(entry.terms).items())
+                    if score > best_score:
+                        best, best_score = entry_id, score
+
+            if best is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best)
+                self.hits += 1
+                answer = self._entries[best].answer
+            else:
+                self.misses += 1
+                answer = None
+        metrics.inc("semantic_cache_requests_total", result="hit" if answer is not None else "miss")
+        return (answer, best_score) if answer is not None else None
+
+    def store(self, bucket: Tuple, question: str, answer: str) -> None:
+        terms = features(question)
+        if len(tokenize(question)) < self.min_terms:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(bucket, question, answer, terms, self._clock())
+            for feature in terms:
+                self._postings[bucket][feature].add(entry_id)
+                self._df[feature] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            metrics.set_gauge("semantic_cache_entries", len(self._entries))
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        postings = self._postings[entry.bucket]
+        for feature in entry.terms:
+            postings[feature].discard(entry_id)
+            if not postings[feature]:
+                del postings[feature]
+            self._df[feature] -= 1
+            if not self._df[feature]:
+                del self._df[feature]
+        if not postings:
+            del self._postings[entry.bucket]
+
+    def _expire(self) -> None:
+        # A full scan, so run it at most once a minute; lookups skip entries
+        # that expired in between
+        now = self._clock()
+        if now - self._last_expiry < min(60.0, self.ttl):
+            return
+        self._last_expiry = now
+        cutoff = now - self.ttl
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry.created < cutoff]
+        for entry_id in expired:
+            self._remove(entry_id)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "buckets": len(self._postings),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+_cache: Optional[SemanticCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> SemanticCache:
+    """Process-wide cache, tuned with $NUTRIOMEN_SEMANTIC_CACHE_THRESHOLD, _SIZE and _TTL."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache(
+                    threshold=float(os.getenv("NUTRIOMEN_SEMANTIC_CACHE_THRESHOLD", "0.85")),
+                    max_entries=int(os.getenv("NUTRIOMEN_SEMANTIC_CACHE_SIZE", "5000")),
+                    ttl=float(os.getenv("NUTRIOMEN_SEMANTIC_CACHE_TTL", str(24 * 3600))),
+                )
+    return _cache
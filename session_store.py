@@ -0,0 +1,237 @@
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+import streamlit as st
+
+import metrics
+from cache_backend import get_cache
+from storage import Storage, get_storage
+
+# Bounded per-session chat state.
+#
+# Each session's conversation lives in a ChatHistory: a ring buffer of the
+# last MAX_TURNS turns kept as (seq, role, text) tuples instead of dicts.
+# Turns pushed out of the ring are written to the chat_messages table and can
+# be reloaded on demand ("Show earlier messages"). Long answers are written to
+# the database as soon as they arrive and the ring keeps only their sequence
+# number; the text is read back (through the cache) when the turn is shown.
+#
+# Histories are held by a process-wide SessionStore rather than in
+# st.session_state (which only keeps the session's key), so sessions idle for
+# IDLE_SECONDS can be flushed to the database and dropped; a session that
+# comes back reloads its recent turns.
+
+logger = logging.getLogger("session_store")
+
+MAX_TURNS = int(os.getenv("NUTRIOMEN_CHAT_TURNS", "50"))
+# Turns longer than this (in characters) are kept in the database, not in memory
+LARGE_TURN_CHARS = int(os.getenv("NUTRIOMEN_CHAT_LARGE_TURN", "2000"))
+IDLE_SECONDS = float(os.getenv("NUTRIOMEN_SESSION_IDLE", "1800"))
+SWEEP_INTERVAL = 60.0
+
+
+class ChatHistory:
+    """One session's conversation: a capped ring of recent turns, older ones in the database."""
+
+    def __init__(self, store: Storage, session_id: str, user_id: int, max_turns: int = MAX_TURNS,
+                 large_chars: int = LARGE_TURN_CHARS):
+        self.store = store
+        self.session_id = session_id
+        self.user_id = user_id
+        self.large_chars = large_chars
+        # (seq, role, text); text is None when it is only in the database
+        self._turns: deque = deque(maxlen=max_turns)
+        # Turns in the ring not yet written to the database
+        self._unsaved = set()
+        self._next_seq = 0
+        self.has_older = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def restore(cls, store: Storage, session_id: str, user_id: int, **kwargs) -> "ChatHistory":
+        """Reload the latest turns of a session that was evicted."""
+        history = cls(store, session_id, user_id, **kwargs)
+        rows = store.chat_messages(session_id, limit=history._turns.maxlen + 1)
+        history.has_older = len(rows) > history._turns.maxlen
+        for row in rows[-history._turns.maxlen:]:
+            large = len(row["content"]) > history.large_chars
+            history._turns.append((row["seq"], row["role"], None if large else row["content"]))
+            history._next_seq = row["seq"] + 1
+        return history
+
+    def append(self, role: str, content: str) -> None:
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            if len(self._turns) == self._turns.maxlen:
+                self._spill(self._turns[0])
+            if len(content) > self.large_chars:
+                self.store.add_chat_messages([(self.user_id, self.session_id, seq, role, content)])
+                self._turns.append((seq, role, None))
+            else:
+                self._turns.append((seq, role, content))
+                self._unsaved.add(seq)
+
+    def _spill(self, turn) -> None:
+        seq, role, text = turn
+        if seq in self._unsaved:
+            self.store.add_chat_messages([(self.user_id, self.session_id, seq, role, text)])
+            self._unsaved.discard(seq)
+        self.has_older = True
+        metrics.inc("session_turns_spilled_total")
+
+    def flush(self) -> int:
+        """Write every unsaved turn to the database; returns how many were written."""
+        with self._lock:
+            rows = [(self.user_id, self.session_id, seq, role, text)
+                    for seq, role, text in self._turns if seq in self._unsaved]
+            if rows:
+                self.store.add_chat_messages(rows)
+            self._unsaved.clear()
+            return len(rows)
+
+    def _text(self, seq: int, text: Optional[str]) -> str:
+        if text is not None:
+            return text
+        return get_cache().get_or_set("chat", f"{self.session_id}:{seq}",
+                                      lambda: self.store.chat_message(self.session_id, seq), ttl=300) or ""
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        """Turns in the ring, oldest first, as {"role", "content"} dicts."""
+        for seq, role, text in list(self._turns):
+            yield {"role": role, "content": self._text(seq, text)}
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def recent(self, n: int) -> List[Dict[str, str]]:
+        return list(self)[-n:] if n else []
+
+    def older(self, limit: int = 20) -> List[Dict[str, str]]:
+        """Up to `limit` turns from before the ring, loaded from the database."""
+        turns = list(self._turns)
+        before = turns[0][0] if turns else self._next_seq
+        return [{"role": row["role"], "content": row["content"]}
+                for row in self.store.chat_messages(self.session_id, before_seq=before, limit=limit)]
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the ring: the deque, the tuples and their texts."""
+        size = sys.getsizeof(self._turns) + sys.getsizeof(self._unsaved)
+        for turn in list(self._turns):
+            size += sys.getsizeof(turn) + (sys.getsizeof(turn[2]) if turn[2] is not None else 0)
+        return size
+
+
+class SessionStore:
+    """Process-wide registry of ChatHistory objects, evicting idle sessions."""
+
+    def __init__(self, store: Optional[Storage] = None, idle_seconds: float = IDLE_SECONDS,
+                 clock=time.monotonic, **history_kwargs):
+        self.store = store or get_storage()
+        self.idle_seconds = idle_seconds
+        self.history_kwargs = history_kwargs
+        self._clock = clock
+        self._histories: Dict[str, ChatHistory] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._last_sweep = clock()
+        self._lock = threading.Lock()
+
+    def history(self, session_id: str, user_id: int) -> ChatHistory:
+        now = self._clock()
+        with self._lock:
+            history = self._histories.get(session_id)
+            if history is None:
+                # A session evicted earlier (or seen before a restart) gets its turns back
+                history = ChatHistory.restore(self.store, session_id, user_id, **self.history_kwargs)
+                if len(history):
+                    metrics.inc("session_restores_total")
+                self._histories[session_id] = history
+            self._last_seen[session_id] = now
+            sweep = now - self._last_sweep >= SWEEP_INTERVAL
+            if sweep:
+                self._last_sweep = now
+        if sweep:
+            self.evict_idle()
+        return history
+
+    def evict_idle(self) -> int:
+        """Flush and drop sessions not seen for idle_seconds; returns how many were evicted."""
+        cutoff = self._clock() - self.idle_seconds
+        with self._lock:
+            idle = [(sid, self._histories[sid]) for sid, seen in self._last_seen.items() if seen < cutoff]
+        evicted = 0
+        for sid, history in idle:
+            # Flush while the history is still registered: a session coming back meanwhile gets
+            # this object, not a restore from a table that is missing its latest turns
+            try:
+                history.flush()
+            except Exception as e:
+                logger.error(f"Could not flush chat history of session {sid}: {e}")
+                continue
+            with self._lock:
+                if self._last_seen.get(sid, cutoff) < cutoff and self._histories.get(sid) is history:
+                    del self._histories[sid]
+                    del self._last_seen[sid]
+                    evicted += 1
+        if evicted:
+            metrics.inc("session_evictions_total", evicted)
+        self._export()
+        return evicted
+
+    def _export(self) -> None:
+        metrics.set_gauge("sessions_active", len(self._histories))
+        metrics.set_gauge("session_bytes", sum(h.nbytes() for h in list(self._histories.values())))
+
+    def memory_report(self, top: int = 10) -> Dict[str, Any]:
+        """
+        Per-session memory: the estimated size of each history, largest first,
+        plus, when tracemalloc is tracing, what it attributes to this module.
+        """
+        now = self._clock()
+        with self._lock:
+            sessions = [{"session": sid, "user_id": h.user_id, "turns": len(h), "bytes": h.nbytes(),
+                         "idle_seconds": round(now - self._last_seen.get(sid, now), 1)}
+                        for sid, h in self._histories.items()]
+        sessions.sort(key=lambda s: s["bytes"], reverse=True)
+        report = {"sessions": len(sessions), "total_bytes": sum(s["bytes"] for s in sessions), "largest": sessions[:top]}
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, __file__)])
+            stats = snapshot.statistics("lineno")
+            report["traced_bytes"] = sum(stat.size for stat in stats)
+            report["traced_per_session"] = report["traced_bytes"] // max(1, len(sessions))
+            report["traced_top"] = [f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} {stat.size} B"
+                                    for stat in stats[:top]]
+        self._export()
+        return report
+
+
+_sessions: Optional[SessionStore] = None
+_sessions_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    global _sessions
+    if _sessions is None:
+        with _sessions_lock:
+            if _sessions is None:
+                if os.getenv("NUTRIOMEN_TRACEMALLOC") and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                _sessions = SessionStore()
+    return _sessions
+
+
+def chat_history() -> ChatHistory:
+    """The current Streamlit session's chat history."""
+    user_id = st.session_state.user_id
+    if not st.session_state.get("chat_session") or st.session_state.get("chat_session_user") != user_id:
+        # New session, or another user logged in on this browser tab
+        st.session_state.chat_session = uuid.uuid4().hex
+        st.session_state.chat_session_user = user_id
+    return get_session_store().history(st.session_state.chat_session, user_id)
@@ -0,0 +1,521 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from database import DB_PATH, init_db
+from profile_model import COLUMNS as PROFILE_COLUMNS, Profile
+
+try:
+    import psycopg2
+    import psycopg2.extras
+    import psycopg2.pool
+except ImportError:  # optional dependency, only needed for PostgreSQL
+    psycopg2 = None
+
+# Storage backends.
+#
+# Pages, the job queue and precompute read and write users, profiles, invites
+# and jobs through a Storage instead of a raw sqlite3 connection. SQLiteStorage
+# keeps the single-node nutrition_database.db; PostgresStorage puts the same
+# tables in PostgreSQL behind a connection pool, so several app replicas
+# behind a load balancer share users, profiles and the job queue.
+#
+# The backend comes from $NUTRIOMEN_DATABASE_URL: a postgresql:// URL, or a
+# SQLite path (default nutrition_database.db).
+
+logger = logging.getLogger("storage")
+
+PROFILE_FIELDS = ["full_name", "age", "education", "height", "weight", "menstruation_date",
+                  "is_regular_cycle", "diseases", "food_allergies", "is_pregnant", "pregnancy_week"]
+# BOOLEAN in PostgreSQL, 0/1 in SQLite; PostgreSQL rejects integers for them
+BOOLEAN_FIELDS = ("is_regular_cycle", "is_pregnant")
+
+POSTGRES_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS profiles (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        full_name TEXT NOT NULL,
+        age INTEGER NOT NULL,
+        education TEXT,
+        height REAL NOT NULL,
+        weight REAL NOT NULL,
+        menstruation_date TEXT,
+        is_regular_cycle BOOLEAN,
+        diseases TEXT,
+        food_allergies TEXT,
+        is_pregnant BOOLEAN,
+        pregnancy_week INTEGER,
+        last_updated TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_profiles_user ON profiles (user_id)",
+    """CREATE TABLE IF NOT EXISTS jobs (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        kind TEXT NOT NULL,
+        prompt TEXT NOT NULL,
+        prompt_hash TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        result TEXT,
+        error TEXT,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMPTZ,
+        finished_at TIMESTAMPTZ
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_user_kind ON jobs (user_id, kind, id)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)",
+    """CREATE TABLE IF NOT EXISTS invites (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        token_hash TEXT UNIQUE NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMPTZ,
+        used_at TIMESTAMPTZ
+    )""",
+    """CREATE TABLE IF NOT EXISTS chat_messages (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        session_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (session_id, seq)
+    )""",
+    """CREATE TABLE IF NOT EXISTS recipes (
+        id SERIAL PRIMARY KEY,
+        title TEXT NOT NULL,
+        diet TEXT NOT NULL,
+        servings INTEGER NOT NULL,
+        minutes INTEGER,
+        ingredients TEXT NOT NULL,
+        tags TEXT NOT NULL,
+        instructions TEXT,
+        image_query TEXT,
+        calories REAL,
+        protein_g REAL,
+        carbs_g REAL,
+        fat_g REAL,
+        fiber_g REAL,
+        iron_mg REAL,
+        calcium_mg REAL,
+        folate_ug REAL,
+        vitamin_c_mg REAL,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS recipe_terms (
+        term TEXT NOT NULL,
+        recipe_id INTEGER NOT NULL,
+        PRIMARY KEY (term, recipe_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS recipe_term_counts (
+        term TEXT PRIMARY KEY,
+        recipes INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS community_posts (
+        id SERIAL PRIMARY KEY,
+        user_key TEXT NOT NULL,
+        author TEXT NOT NULL,
+        life_stage TEXT NOT NULL,
+        title TEXT NOT NULL,
+        body TEXT NOT NULL,
+        like_count INTEGER NOT NULL DEFAULT 0,
+        comment_count INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_community_posts_stage ON community_posts (life_stage, id)",
+    """CREATE TABLE IF NOT EXISTS community_comments (
+        id SERIAL PRIMARY KEY,
+        post_id INTEGER NOT NULL REFERENCES community_posts (id),
+        user_key TEXT NOT NULL,
+        author TEXT NOT NULL,
+        body TEXT NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_community_comments_post ON community_comments (post_id, id)",
+    """CREATE TABLE IF NOT EXISTS community_reactions (
+        post_id INTEGER NOT NULL REFERENCES community_posts (id),
+        user_key TEXT NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (post_id, user_key)
+    )""",
+    """CREATE TABLE IF NOT EXISTS reminder_schedules (
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        kind TEXT NOT NULL,
+        interval_minutes INTEGER NOT NULL,
+        start_minute INTEGER NOT NULL,
+        end_minute INTEGER NOT NULL,
+        utc_offset_minutes INTEGER NOT NULL DEFAULT 0,
+        timezone TEXT,
+        amount_ml INTEGER,
+        next_fire_at BIGINT,
+        updated_at BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, kind)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_reminder_schedules_updated ON reminder_schedules (updated_at)",
+    """CREATE TABLE IF NOT EXISTS reminder_inbox (
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        kind TEXT NOT NULL,
+        message TEXT NOT NULL,
+        fire_at BIGINT NOT NULL,
+        PRIMARY KEY (user_id, kind)
+    )""",
+]
+
+# Tables copied by `python storage.py migrate`, parents first
+TABLES = ["users", "profiles", "invites", "jobs", "chat_messages", "recipes", "recipe_terms", "recipe_term_counts",
+          "community_posts", "community_comments", "community_reactions", "reminder_schedules", "reminder_inbox"]
+
+
+class Storage:
+    """
+    Users, profiles, invites, jobs and chat turns, whatever database holds them.
+
+    Queries are written once, with ? placeholders, against the columns both
+    backends share; each backend provides connections, placeholder style,
+    inserted ids and timestamps.
+    """
+    name = "base"
+    # Whether other processes (replicas) may be using the same database
+    shared = False
+    placeholder = "?"
+
+    @contextmanager
+    def connection(self):
+        """A connection for one transaction: committed on success, rolled back on error."""
+        raise NotImplementedError
+
+    def _is_integrity_error(self, error: Exception) -> bool:
+        raise NotImplementedError
+
+    def _insert(self, cursor, sql: str, params: Sequence) -> int:
+        """Run an INSERT and return the new row's id."""
+        raise NotImplementedError
+
+    def _timestamp(self, value: datetime):
+        """A UTC datetime as the backend compares it with CURRENT_TIMESTAMP columns."""
+        raise NotImplementedError
+
+    def _sql(self, sql: str) -> str:
+        return sql if self.placeholder == "?" else sql.replace("?", self.placeholder)
+
+    def _execute(self, cursor, sql: str, params: Sequence = ()):
+        cursor.execute(self._sql(sql), tuple(params))
+        return cursor
+
+    def query(self, sql: str, params: Sequence = ()) -> List[Dict[str, Any]]:
+        with self.connection() as conn:
+            cursor = self._execute(conn.cursor(), sql, params)
+            columns = [d[0] for d in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def query_as(self, row_factory, sql: str, params: Sequence = ()) -> List[Any]:
+        """Rows built by `row_factory(cursor, row)`, as with a sqlite3 row_factory."""
+        with self.connection() as conn:
+            cursor = self._execute(conn.cursor(), sql, params)
+            return [row_factory(cursor, row) for row in cursor.fetchall()]
+
+    def query_one(self, sql: str, params: Sequence = ()) -> Optional[Dict[str, Any]]:
+        rows = self.query(sql, params)
+        return rows[0] if rows else None
+
+    def executemany(self, sql: str, rows: Iterable[Sequence]) -> None:
+        with self.connection() as conn:
+            conn.cursor().executemany(self._sql(sql), [tuple(row) for row in rows])
+
+    def execute(self, sql: str, params: Sequence = ()) -> int:
+        """Run a statement in its own transaction and return the affected row count."""
+        with self.connection() as conn:
+            return self._execute(conn.cursor(), sql, params).rowcount
+
+    def close(self) -> None:
+        pass
+
+    # Users
+
+    def create_user(self, username: str, password_hash: str, email: str) -> Optional[int]:
+        """Insert a user and return its id, or None if the username or email is taken."""
+        try:
+            with self.connection() as conn:
+                return self._insert(conn.cursor(), "INSERT INTO users (username, password, email) VALUES (?, ?, ?)",
+                                    (username, password_hash, email))
+        except Exception as e:
+            if self._is_integrity_error(e):
+                return None
+            raise
+
+    def find_user(self, username: str, password_hash: str) -> Optional[int]:
+        row = self.query_one("SELECT id FROM users WHERE username = ? AND password = ?", (username, password_hash))
+        return row["id"] if row else None
+
+    def redeem_invite(self, token_hash: str, password_hash: str) -> Optional[int]:
+        """Set the password of an unused, unexpired invite's user and mark the invite used."""
+        with self.connection() as conn:
+            cursor = self._execute(conn.cursor(), """
+                UPDATE invites SET used_at = CURRENT_TIMESTAMP
+                WHERE token_hash = ? AND used_at IS NULL AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
+                RETURNING user_id""", (token_hash,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            self._execute(cursor, "UPDATE users SET password = ? WHERE id = ?", (password_hash, row[0]))
+            return row[0]
+
+    # Profiles
+
+    def get_profile(self, user_id: int) -> Optional[Profile]:
+        rows = self.query_as(Profile.from_row, f"SELECT {', '.join(PROFILE_COLUMNS)} FROM profiles WHERE user_id = ?",
+                             (user_id,))
+        return rows[0] if rows else None
+
+    def save_profile(self, profile_data: Dict[str, Any]) -> None:
+        """Update the user's profile, or insert it if they don't have one yet."""
+        values = [bool(profile_data[field]) if field in BOOLEAN_FIELDS and profile_data[field] is not None
+                  else profile_data[field] for field in PROFILE_FIELDS]
+        with self.connection() as conn:
+            cursor = self._execute(conn.cursor(), f"""
+                UPDATE profiles SET {", ".join(f"{field} = ?" for field in PROFILE_FIELDS)},
+                    last_updated = CURRENT_TIMESTAMP
+                WHERE user_id = ?""", (*values, profile_data["user_id"]))
+            if cursor.rowcount == 0:
+                self._execute(cursor, f"""
+                    INSERT INTO profiles (user_id, {", ".join(PROFILE_FIELDS)})
+                    VALUES ({", ".join("?" * (len(PROFILE_FIELDS) + 1))})""", (profile_data["user_id"], *values))
+
+    # Jobs (see jobs.py)
+
+    def find_job(self, user_id: int, kind: str, prompt_hash: str, statuses: Iterable[str]) -> Optional[int]:
+        statuses = list(statuses)
+        row = self.query_one(
+            f"""SELECT id FROM jobs WHERE user_id = ? AND kind = ? AND prompt_hash = ?
+                AND status IN ({",".join("?" * len(statuses))}) ORDER BY id DESC LIMIT 1""",
+            (user_id, kind, prompt_hash, *statuses))
+        return row["id"] if row else None
+
+    def create_job(self, user_id: int, kind: str, prompt: str, prompt_hash: str) -> int:
+        with self.connection() as conn:
+            return self._insert(conn.cursor(), "INSERT INTO jobs (user_id, kind, prompt, prompt_hash) VALUES (?, ?, ?, ?)",
+                                (user_id, kind, prompt, prompt_hash))
+
+    def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        return self.query_one("SELECT * FROM jobs WHERE id = ?", (job_id,))
+
+    def latest_job(self, user_id: int, kind: str, status: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if status is None:
+            return self.query_one("SELECT * FROM jobs WHERE user_id = ? AND kind = ? ORDER BY id DESC LIMIT 1",
+                                  (user_id, kind))
+        return self.query_one("SELECT * FROM jobs WHERE user_id = ? AND kind = ? AND status = ? ORDER BY id DESC LIMIT 1",
+                              (user_id, kind, status))
+
+    def requeue_running(self, started_before: Optional[datetime] = None) -> int:
+        """Put running jobs (only those started before `started_before`, if given) back in the queue."""
+        if started_before is None:
+            return self.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+        return self.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running' AND started_at < ?",
+                            (self._timestamp(started_before),))
+
+    def queued_job_ids(self) -> List[int]:
+        return [row["id"] for row in self.query("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id")]
+
+    def claim_job(self, job_id: int) -> bool:
+        """Mark a queued job running; False if another worker (or replica) got it first."""
+        return self.execute("UPDATE jobs SET status = 'running', started_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'queued'",
+                            (job_id,)) > 0
+
+    def finish_job(self, job_id: int, status: str, result: Optional[str] = None, error: Optional[str] = None) -> None:
+        self.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+                     (status, result, error, job_id))
+
+    # Chat turns (see session_store.py)
+
+    def add_chat_messages(self, rows: Iterable[Sequence]) -> None:
+        """Save (user_id, session_id, seq, role, content) rows; turns already saved are skipped."""
+        self.executemany("""INSERT INTO chat_messages (user_id, session_id, seq, role, content) VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT (session_id, seq) DO NOTHING""", rows)
+
+    def chat_message(self, session_id: str, seq: int) -> Optional[str]:
+        row = self.query_one("SELECT content FROM chat_messages WHERE session_id = ? AND seq = ?", (session_id, seq))
+        return row["content"] if row else None
+
+    def chat_messages(self, session_id: str, before_seq: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """The `limit` latest turns of a session before `before_seq`, oldest first."""
+        rows = self.query("""SELECT seq, role, content FROM chat_messages WHERE session_id = ? AND seq < ?
+                             ORDER BY seq DESC LIMIT ?""",
+                          (session_id, before_seq if before_seq is not None else 2 ** 62, limit))
+        return rows[::-1]
+
+
+class SQLiteStorage(Storage):
+    """The local SQLite database, with one connection per thread."""
+    name = "sqlite"
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        init_db(path).close()
+
+    @contextmanager
+    def connection(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+        with conn:
+            yield conn
+
+    def query_as(self, row_factory, sql, params=()):
+        # sqlite3 builds each row with the factory as it fetches it
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = row_factory
+            return self._execute(cursor, sql, params).fetchall()
+
+    def _is_integrity_error(self, error):
+        return isinstance(error, sqlite3.IntegrityError)
+
+    def _insert(self, cursor, sql, params):
+        return self._execute(cursor, sql, params).lastrowid
+
+    def _timestamp(self, value):
+        # CURRENT_TIMESTAMP in SQLite is UTC text
+        return value.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class PostgresStorage(Storage):
+    """
+    PostgreSQL through a thread-safe psycopg2 connection pool.
+
+    At most `max_connections` connections are open per process; callers
+    beyond that wait for one to be returned rather than failing.
+    """
+    name = "postgres"
+    shared = True
+    placeholder = "%s"
+
+    def __init__(self, dsn: str, min_connections: int = 1, max_connections: int = 10):
+        if psycopg2 is None:
+            raise RuntimeError("PostgreSQL storage needs psycopg2: pip install psycopg2-binary")
+        self.dsn = dsn
+        self._pool = psycopg2.pool.ThreadedConnectionPool(min_connections, max_connections, dsn)
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self.create_schema()
+
+    def create_schema(self) -> None:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for statement in POSTGRES_SCHEMA:
+                cursor.execute(statement)
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            conn = self._pool.getconn()
+            try:
+                with conn:
+                    yield conn
+            finally:
+                # A connection left broken (server restart, network error) is discarded, not reused
+                self._pool.putconn(conn, close=bool(conn.closed))
+
+    def _is_integrity_error(self, error):
+        return isinstance(error, psycopg2.IntegrityError)
+
+    def _insert(self, cursor, sql, params):
+        return self._execute(cursor, sql + " RETURNING id", params).fetchone()[0]
+
+    def _timestamp(self, value):
+        return value.astimezone(timezone.utc)
+
+    def close(self):
+        self._pool.closeall()
+
+
+def storage_from_url(url: Optional[str] = None) -> Storage:
+    """A Storage for a postgresql:// URL or a SQLite path (sqlite:/// prefix optional)."""
+    url = url or os.getenv("NUTRIOMEN_DATABASE_URL", DB_PATH)
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresStorage(url, max_connections=int(os.getenv("NUTRIOMEN_DB_POOL_SIZE", "10")))
+    return SQLiteStorage(url[len("sqlite:///"):] if url.startswith("sqlite:///") else url)
+
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """Process-wide storage, from $NUTRIOMEN_DATABASE_URL."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = storage_from_url()
+                logger.info(f"Using {_storage.name} storage")
+    return _storage
+
+
+def stale_before(seconds: float) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=seconds)
+
+
+def migrate(source: Storage, target: Storage, batch_size: int = 1000) -> Dict[str, int]:
+    """Copy every row of TABLES from `source` into an empty `target`, keeping ids."""
+    copied = {}
+    with source.connection() as src, target.connection() as dst:
+        for table in TABLES:
+            read = src.cursor()
+            # Tables without an id column (the recipe index) are copied in primary key order
+            read.execute(f"SELECT * FROM {table} ORDER BY 1")
+            columns = [d[0] for d in read.description]
+            insert = target._sql(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})")
+            write = dst.cursor()
+            copied[table] = 0
+            while True:
+                rows = read.fetchmany(batch_size)
+                if not rows:
+                    break
+                if target.name == "postgres":
+                    # SQLite keeps booleans as 0/1
+                    rows = [tuple(bool(v) if c in BOOLEAN_FIELDS and v is not None else v
+                                  for c, v in zip(columns, row)) for row in rows]
+                write.executemany(insert, rows)
+                copied[table] += len(rows)
+            if target.name == "postgres" and "id" in columns:
+                # Explicit ids don't advance the SERIAL sequence
+                write.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}")
+    return copied
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Storage tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    schema = sub.add_parser("init", help="create the tables")
+    schema.add_argument("url", nargs="?", default=None, help="database URL (default: $NUTRIOMEN_DATABASE_URL)")
+    copy = sub.add_parser("migrate", help="copy every app table into another database")
+    copy.add_argument("--from", dest="source", default=DB_PATH)
+    copy.add_argument("--to", dest="target", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "init":
+        storage = storage_from_url(args.url)
+        print(f"{storage.name} schema ready")
+    else:
+        copied = migrate(storage_from_url(args.source), storage_from_url(args.target))
+        for table, rows in copied.items():
+            print(f"{table}: {rows} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,14 @@
+import streamlit as st
+
+# Streamlit renamed a few APIs between the releases this app runs on.
+
+# Partial reruns: st.fragment (1.37+), st.experimental_fragment (1.33 - 1.36)
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+# Full-app rerun: st.rerun (1.27+), st.experimental_rerun before that
+rerun = getattr(st, "rerun", None) or st.experimental_rerun
+
+
+def partial_rerun(func):
+    """Make `func` a fragment where supported, so its widgets only rerun it; otherwise leave it as is."""
+    return fragment(func) if fragment else func
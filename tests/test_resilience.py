@@ -0,0 +1,62 @@
+"""
+Deadline and circuit breaker tests for resilience.call, with a provider
+that never answers.
+
+Usage:
+    python -m pytest tests/test_resilience.py
+"""
+import sys
+import threading
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import resilience  # noqa: E402
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded  # noqa: E402
+
+
+@pytest.fixture
+def hanging():
+    """A provider call that blocks until the test ends, then its worker thread is released."""
+    release = threading.Event()
+    yield lambda: release.wait(10)
+    release.set()
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    monkeypatch.setattr(resilience, "MAX_CALL_SECONDS", 0.05)
+    provider = f"test-{uuid.uuid4().hex[:8]}"
+    breaker = resilience._breakers[provider] = CircuitBreaker(provider, failure_threshold=3, reset_timeout=60)
+    yield breaker
+    del resilience._breakers[provider]
+
+
+def test_hung_provider_opens_the_breaker(breaker, hanging):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(DeadlineExceeded):
+            resilience.call(breaker.name, hanging)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        resilience.call(breaker.name, hanging)
+
+
+def test_hung_half_open_trial_reopens_the_breaker(breaker, hanging):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(DeadlineExceeded):
+            resilience.call(breaker.name, hanging)
+    breaker.reset_timeout = 0
+    with pytest.raises(DeadlineExceeded):
+        resilience.call(breaker.name, hanging)
+    assert breaker.state == CircuitBreaker.OPEN and not breaker._trial_running
+
+
+def test_budget_running_out_does_not_count(breaker, hanging):
+    for _ in range(breaker.failure_threshold + 1):
+        # The caller's budget, shorter than the per-call cap, is what runs out
+        with resilience.budget(0.01), pytest.raises(DeadlineExceeded):
+            resilience.call(breaker.name, hanging)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0